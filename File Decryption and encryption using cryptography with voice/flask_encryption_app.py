@@ -2,12 +2,16 @@
 Flask Encryption/Decryption App with Menu Navigation, Background, Centered Layout, Filename Preservation, and Fixed Exit
 """
 
-from flask import Flask, request, render_template_string, send_file, redirect, url_for, flash
+from flask import Flask, Response, request, render_template_string, send_file, redirect, url_for, flash
 from io import BytesIO
+from urllib.parse import quote
 from Crypto.Cipher import AES
 from Crypto.Protocol.KDF import PBKDF2
 from Crypto.Random import get_random_bytes
+import itertools
 import os
+import tempfile
+import unicodedata
 
 app = Flask(__name__)
 app.secret_key = os.urandom(16)
@@ -17,6 +21,12 @@ SALT_SIZE = 16
 NONCE_SIZE = 12
 KEY_LEN = 32
 PBKDF2_ITERS = 100_000
+TAG_SIZE = 16
+MAGIC = b"FEA\x00"
+FORMAT_VERSION = 2
+NONCE_PREFIX_SIZE = 7
+CHUNK_SIZE = 64 * 1024
+MAX_CHUNK_SIZE = 16 * 1024 * 1024
 
 # --- Utilities ---
 
@@ -26,38 +36,161 @@ def derive_key(password: str, salt: bytes = None):
     key = PBKDF2(password, salt, dkLen=KEY_LEN, count=PBKDF2_ITERS)
     return key, salt
 
-def encrypt_bytes(key: bytes, plaintext: bytes) -> bytes:
-    nonce = get_random_bytes(NONCE_SIZE)
-    cipher = AES.new(key, AES.MODE_GCM, nonce=nonce)
-    ciphertext, tag = cipher.encrypt_and_digest(plaintext)
-    return nonce + tag + ciphertext
-
-def decrypt_bytes(key: bytes, data: bytes) -> bytes:
-    nonce = data[:NONCE_SIZE]
-    tag = data[NONCE_SIZE:NONCE_SIZE+16]
-    ciphertext = data[NONCE_SIZE+16:]
-    cipher = AES.new(key, AES.MODE_GCM, nonce=nonce)
-    plaintext = cipher.decrypt_and_verify(ciphertext, tag)
-    return plaintext
-
-# --- New: Include filename in encrypted payload ---
-def encrypt_with_password_and_filename(password: str, plaintext: bytes, filename: str) -> bytes:
+# --- Streaming format (v2) ---
+# Header: MAGIC | version | salt | chunk size | nonce prefix | name len | name,
+# then segments of ciphertext + tag. Segment i is sealed with the nonce
+# prefix | i | final flag and the whole header as associated data, so segments
+# cannot be reordered, dropped or moved between files, and a file cut off
+# before its final segment does not decrypt. Every segment but the last holds
+# exactly chunk-size bytes of plaintext; the last holds fewer (possibly none).
+# Files in the old salt|len|name|nonce|tag|ct layout still decrypt.
+
+def _read_exactly(src, size: int) -> bytes:
+    """Read `size` bytes from `src`, fewer only at the end of the stream."""
+    parts = []
+    while size:
+        block = src.read(size)
+        if not block:
+            break
+        parts.append(block)
+        size -= len(block)
+    return b"".join(parts)
+
+def _segment_nonce(prefix: bytes, index: int, final: bool) -> bytes:
+    if index >= 1 << 32:
+        raise ValueError("File has too many segments")
+    return prefix + index.to_bytes(4, "big") + (b"\x01" if final else b"\x00")
+
+def _segment_cipher(key: bytes, header: bytes, prefix: bytes, index: int, final: bool):
+    cipher = AES.new(key, AES.MODE_GCM, nonce=_segment_nonce(prefix, index, final))
+    cipher.update(header)
+    return cipher
+
+def encrypt_stream(password: str, src, filename: str, chunk_size: int = CHUNK_SIZE):
+    """Yield the encrypted form of file-like `src`, header first, then one segment per chunk."""
     key, salt = derive_key(password)
-    payload = encrypt_bytes(key, plaintext)
+    prefix = get_random_bytes(NONCE_PREFIX_SIZE)
     fname_bytes = filename.encode("utf-8")
-    fname_len = len(fname_bytes).to_bytes(2, "big")
-    return salt + fname_len + fname_bytes + payload
+    header = (MAGIC + bytes([FORMAT_VERSION]) + salt + chunk_size.to_bytes(4, "big") + prefix
+              + len(fname_bytes).to_bytes(2, "big") + fname_bytes)
+    yield header
+    index = 0
+    while True:
+        chunk = _read_exactly(src, chunk_size)
+        final = len(chunk) < chunk_size
+        ciphertext, tag = _segment_cipher(key, header, prefix, index, final).encrypt_and_digest(chunk)
+        yield ciphertext + tag
+        if final:
+            return
+        index += 1
+
+def decrypt_stream(password: str, src):
+    """
+    Open the encrypted file-like `src`, in either format.
+
+    Returns (filename, chunks). The password is checked before returning, so a
+    wrong password raises ValueError here; `chunks` yields plaintext one
+    authenticated segment at a time and raises ValueError on a corrupt or
+    truncated file.
+    """
+    start = _read_exactly(src, len(MAGIC) + 1)
+    if start == MAGIC + bytes([FORMAT_VERSION]):
+        return _decrypt_segments(password, start, src)
+    return _decrypt_legacy(password, start, src)
+
+def _decrypt_segments(password: str, start: bytes, src):
+    fixed = _read_exactly(src, SALT_SIZE + 4 + NONCE_PREFIX_SIZE + 2)
+    if len(fixed) < SALT_SIZE + 4 + NONCE_PREFIX_SIZE + 2:
+        raise ValueError("File is truncated")
+    salt = fixed[:SALT_SIZE]
+    chunk_size = int.from_bytes(fixed[SALT_SIZE:SALT_SIZE+4], "big")
+    prefix = fixed[SALT_SIZE+4:SALT_SIZE+4+NONCE_PREFIX_SIZE]
+    fname_len = int.from_bytes(fixed[-2:], "big")
+    if not 0 < chunk_size <= MAX_CHUNK_SIZE:
+        raise ValueError(f"Unsupported chunk size {chunk_size}")
+    fname_bytes = _read_exactly(src, fname_len)
+    if len(fname_bytes) < fname_len:
+        raise ValueError("File is truncated")
+    header = start + fixed + fname_bytes
+    key, _ = derive_key(password, salt)
+
+    def segments():
+        index = 0
+        while True:
+            sealed = _read_exactly(src, chunk_size + TAG_SIZE)
+            if len(sealed) < TAG_SIZE:
+                raise ValueError("File is truncated")
+            final = len(sealed) < chunk_size + TAG_SIZE
+            cipher = _segment_cipher(key, header, prefix, index, final)
+            yield cipher.decrypt_and_verify(sealed[:-TAG_SIZE], sealed[-TAG_SIZE:])
+            if final:
+                return
+            index += 1
+
+    chunks = segments()
+    first = next(chunks)
+    return fname_bytes.decode("utf-8"), itertools.chain([first], chunks)
+
+def _decrypt_legacy(password: str, start: bytes, src):
+    # Version 1 layout: salt | name len (2) | name | nonce | tag | ciphertext,
+    # one GCM message. The tag comes before the ciphertext, so decrypt into a
+    # spooled file and verify before releasing any plaintext
+    head = start + _read_exactly(src, SALT_SIZE + 2 - len(start))
+    fname_len = int.from_bytes(head[SALT_SIZE:SALT_SIZE+2], "big")
+    fname_bytes = _read_exactly(src, fname_len)
+    nonce_tag = _read_exactly(src, NONCE_SIZE + TAG_SIZE)
+    if len(head) < SALT_SIZE + 2 or len(nonce_tag) < NONCE_SIZE + TAG_SIZE:
+        raise ValueError("File is truncated")
+    key, _ = derive_key(password, head[:SALT_SIZE])
+    cipher = AES.new(key, AES.MODE_GCM, nonce=nonce_tag[:NONCE_SIZE])
+    plain = tempfile.SpooledTemporaryFile(max_size=CHUNK_SIZE)
+    try:
+        for block in iter(lambda: src.read(CHUNK_SIZE), b""):
+            plain.write(cipher.decrypt(block))
+        cipher.verify(nonce_tag[NONCE_SIZE:])
+        filename = fname_bytes.decode("utf-8")
+    except Exception:
+        plain.close()
+        raise
+    plain.seek(0)
+
+    def chunks():
+        with plain:
+            yield from iter(lambda: plain.read(CHUNK_SIZE), b"")
+
+    return filename, chunks()
+
+# --- Byte helpers, for small payloads such as text ---
+def encrypt_with_password_and_filename(password: str, plaintext: bytes, filename: str) -> bytes:
+    return b"".join(encrypt_stream(password, BytesIO(plaintext), filename))
 
 def decrypt_with_password_and_filename(password: str, data: bytes):
-    salt = data[:SALT_SIZE]
-    fname_len = int.from_bytes(data[SALT_SIZE:SALT_SIZE+2], "big")
-    fname_start = SALT_SIZE + 2
-    fname_end = fname_start + fname_len
-    filename = data[fname_start:fname_end].decode("utf-8")
-    payload = data[fname_end:]
-    key, _ = derive_key(password, salt)
-    plaintext = decrypt_bytes(key, payload)
-    return filename, plaintext
+    filename, chunks = decrypt_stream(password, BytesIO(data))
+    return filename, b"".join(chunks)
+
+def take_upload(up):
+    """
+    Detach the spooled file behind upload `up` from the request.
+
+    The request closes its files as soon as the view returns, before a
+    streamed response is read; the caller closes the returned file instead.
+    """
+    src, up.stream = up.stream, BytesIO()
+    return src
+
+def stream_download(chunks, filename: str, source=None):
+    """Response streaming `chunks` as an attachment, closing `source` when done."""
+    try:
+        filename.encode("ascii")
+        names = {"filename": filename}
+    except UnicodeEncodeError:
+        simple = unicodedata.normalize("NFKD", filename).encode("ascii", "ignore").decode("ascii")
+        names = {"filename": simple, "filename*": "UTF-8''" + quote(filename, safe="!#$&+-.^_`|~")}
+    response = Response(chunks, mimetype="application/octet-stream")
+    response.headers.set("Content-Disposition", "attachment", **names)
+    if source is not None:
+        response.call_on_close(source.close)
+    return response
 
 # --- Shared CSS template ---
 STYLE = """
@@ -359,12 +492,9 @@ def encrypt_file():
     if not password or not up:
         flash('Password and file are required.')
         return redirect(url_for('encrypt_file_page'))
-    plaintext = up.read()
-    data = encrypt_with_password_and_filename(password, plaintext, up.filename)
-    out_name = f"{up.filename}.enc"
-    buf = BytesIO(data)
-    buf.seek(0)
-    return send_file(buf, as_attachment=True, download_name=out_name)
+    # Werkzeug spools uploads to disk; read and encrypt them a chunk at a time
+    src = take_upload(up)
+    return stream_download(encrypt_stream(password, src, up.filename), f"{up.filename}.enc", src)
 
 @app.route("/decrypt", methods=['POST'])
 def decrypt():
@@ -374,15 +504,15 @@ def decrypt():
         flash('Password and file are required.')
         return redirect(url_for('decryption_menu'))
 
-    data = up.read()
+    src = take_upload(up)
     try:
-        filename, plaintext = decrypt_with_password_and_filename(password, data)
-        buf = BytesIO(plaintext)
-        buf.seek(0)
-        return send_file(buf, as_attachment=True, download_name=filename)
+        filename, chunks = decrypt_stream(password, src)
     except Exception as e:
+        src.close()
         flash(f"Decryption failed: {str(e)}")
         return redirect(url_for('decryption_menu'))
+    # A segment that fails to verify from here on aborts the download
+    return stream_download(chunks, filename, src)
 @app.route("/exit", methods=["POST"])
 def exit_app():
     shutdown = request.environ.get("werkzeug.server.shutdown")
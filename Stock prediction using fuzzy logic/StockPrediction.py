@@ -1,290 +1,603 @@
+"""
+Fuzzy logic expert system for stock price variation (125-rule base).
+
+Importing this module has no side effects: the fuzzy variables and rules are
+built on first use by ``get_model()``, and the compiled inference engine is
+cached on disk so later runs (e.g. ``cli_stock_predict.py``) skip both
+scikit-fuzzy and rule construction.  Run it as a script for the backtest or
+the membership-function plots::
+
+    python StockPrediction.py backtest [--data sorted_final.csv]
+    python StockPrediction.py plot
+
+A tuned model file (see ``optimizer.py``) replaces the built-in breakpoints
+and rule table via ``--model FILE`` or the ``STOCK_MODEL_FILE`` variable.
+"""
+import argparse
+import functools
+import hashlib
+import os
+import pickle
+import threading
+from importlib import metadata
 
-    import pandas as pd
-    def get_ticker_from_company(company_name):
-        df = pd.read_csv("sorted_final.csv")
-        match = df[df['Company'].str.lower() == company_name.lower()]
-        if not match.empty:
-            return match['Ticker'].iloc[0]
-        raise ValueError("Company name not found in dataset")
-    
 import numpy as np
-import pandas as pd
-import skfuzzy as fuzz
-from skfuzzy import control as ctrl
-import matplotlib.pyplot as plt
-from sklearn.metrics import mean_absolute_error, mean_squared_error
 
+DATA_FILE = 'sorted_final.csv'
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache')
 
-#fuzzy variables
-profit_margin_fuzz = ctrl.Antecedent(np.arange(-200, 201, 1), 'Profit Margin')
-debt_ratio_fuzz = ctrl.Antecedent(np.arange(0, 101, 1), 'Debt Ratio')
-roa_fuzz = ctrl.Antecedent(np.arange(-100, 101, 1), 'ROA')
-price_var_fuzz = ctrl.Consequent(np.arange(-100, 201, 1), 'PRICE VAR [%]')
 
-##TRIANGLUAR
-# profit_margin_fuzz['very low'] = fuzz.trimf(profit_margin_fuzz.universe, [-200, -200, 0])
-# profit_margin_fuzz['low'] = fuzz.trimf(profit_margin_fuzz.universe, [-50, 0, 50])
-# profit_margin_fuzz['medium'] = fuzz.trimf(profit_margin_fuzz.universe, [0, 50, 100])
-# profit_margin_fuzz['high'] = fuzz.trimf(profit_margin_fuzz.universe, [50, 100, 150])
-# profit_margin_fuzz['very high'] = fuzz.trimf(profit_margin_fuzz.universe, [100, 200, 200])
-
-
-# debt_ratio_fuzz['very low'] = fuzz.trimf(debt_ratio_fuzz.universe, [0, 0, 20])
-# debt_ratio_fuzz['low'] = fuzz.trimf(debt_ratio_fuzz.universe, [10, 30, 50])
-# debt_ratio_fuzz['medium'] = fuzz.trimf(debt_ratio_fuzz.universe, [30, 50, 70])
-# debt_ratio_fuzz['high'] = fuzz.trimf(debt_ratio_fuzz.universe, [50, 70, 90])
-# debt_ratio_fuzz['very high'] = fuzz.trimf(debt_ratio_fuzz.universe, [70, 100, 100])
+def get_ticker_from_company(company_name):
+    from ticker_index import load_index
+    ticker = load_index(DATA_FILE).lookup(company_name)
+    if ticker is not None:
+        return ticker
+    raise ValueError("Company name not found in dataset")
 
 
-# roa_fuzz['very low'] = fuzz.trimf(roa_fuzz.universe, [-100, -100, -25])
-# roa_fuzz['low'] = fuzz.trimf(roa_fuzz.universe, [-50, -25, 0])
-# roa_fuzz['medium'] = fuzz.trimf(roa_fuzz.universe, [-25, 0, 25])
-# roa_fuzz['high'] = fuzz.trimf(roa_fuzz.universe, [0, 25, 50])
-# roa_fuzz['very high'] = fuzz.trimf(roa_fuzz.universe, [25, 50, 100])
+# ------------ Model configuration ------------
+# Universes (integer steps), term breakpoints (3 points: trimf, 4: trapmf) and
+# the rule table as plain data, so tuned variants can be saved as model files
+MODEL_FORMAT = 'stock-fuzzy-model'
+MODEL_VERSION = 1
+INPUT_LABELS = ('Profit Margin', 'Debt Ratio', 'ROA')
+OUTPUT_LABEL = 'PRICE VAR [%]'
 
-
-# price_var_fuzz['big decrease'] = fuzz.trimf(price_var_fuzz.universe, [-200, -140, -80])
-# price_var_fuzz['decrease'] = fuzz.trimf(price_var_fuzz.universe, [-100, -50, 0])
-# price_var_fuzz['stable'] = fuzz.trimf(price_var_fuzz.universe, [-20, 0, 20])
-# price_var_fuzz['increase'] = fuzz.trimf(price_var_fuzz.universe, [0, 50, 100])
-# price_var_fuzz['big increase'] = fuzz.trimf(price_var_fuzz.universe, [80, 140, 200])
+##TRIANGLUAR
+# 'Profit Margin': {
+#     'very low': [-200, -200, 0],
+#     'low': [-50, 0, 50],
+#     'medium': [0, 50, 100],
+#     'high': [50, 100, 150],
+#     'very high': [100, 200, 200],
+# },
+# 'Debt Ratio': {
+#     'very low': [0, 0, 20],
+#     'low': [10, 30, 50],
+#     'medium': [30, 50, 70],
+#     'high': [50, 70, 90],
+#     'very high': [70, 100, 100],
+# },
+# 'ROA': {
+#     'very low': [-100, -100, -25],
+#     'low': [-50, -25, 0],
+#     'medium': [-25, 0, 25],
+#     'high': [0, 25, 50],
+#     'very high': [25, 50, 100],
+# },
+# 'PRICE VAR [%]': {
+#     'big decrease': [-200, -140, -80],
+#     'decrease': [-100, -50, 0],
+#     'stable': [-20, 0, 20],
+#     'increase': [0, 50, 100],
+#     'big increase': [80, 140, 200],
+# },
 
 ##TRAPEZOIDAL
-profit_margin_fuzz['very low'] = fuzz.trapmf(profit_margin_fuzz.universe, [-200, -200, -150, -50])
-profit_margin_fuzz['low'] = fuzz.trapmf(profit_margin_fuzz.universe, [-100, -50, 0, 50])
-profit_margin_fuzz['medium'] = fuzz.trapmf(profit_margin_fuzz.universe, [0, 25, 75, 100])
-profit_margin_fuzz['high'] = fuzz.trapmf(profit_margin_fuzz.universe, [50, 100, 150, 200])
-profit_margin_fuzz['very high'] = fuzz.trapmf(profit_margin_fuzz.universe, [150, 200, 200, 200])
-
-debt_ratio_fuzz['very low'] = fuzz.trapmf(debt_ratio_fuzz.universe, [0, 0, 10, 20])
-debt_ratio_fuzz['low'] = fuzz.trapmf(debt_ratio_fuzz.universe, [10, 20, 40, 50])
-debt_ratio_fuzz['medium'] = fuzz.trapmf(debt_ratio_fuzz.universe, [30, 40, 60, 70])
-debt_ratio_fuzz['high'] = fuzz.trapmf(debt_ratio_fuzz.universe, [50, 60, 80, 90])
-debt_ratio_fuzz['very high'] = fuzz.trapmf(debt_ratio_fuzz.universe, [80, 90, 100, 100])
-
-roa_fuzz['very low'] = fuzz.trapmf(roa_fuzz.universe, [-100, -100, -75, -25])
-roa_fuzz['low'] = fuzz.trapmf(roa_fuzz.universe, [-50, -25, 0, 25])
-roa_fuzz['medium'] = fuzz.trapmf(roa_fuzz.universe, [0, 10, 30, 40])
-roa_fuzz['high'] = fuzz.trapmf(roa_fuzz.universe, [20, 30, 50, 60])
-roa_fuzz['very high'] = fuzz.trapmf(roa_fuzz.universe, [50, 60, 100, 100])
-
-price_var_fuzz['big decrease'] = fuzz.trapmf(price_var_fuzz.universe, [-100, -100, -75, -75])
-price_var_fuzz['decrease'] = fuzz.trapmf(price_var_fuzz.universe, [-75, -60, -40, -10])
-price_var_fuzz['stable'] = fuzz.trapmf(price_var_fuzz.universe, [-10, -10, 10, 10])
-price_var_fuzz['increase'] = fuzz.trapmf(price_var_fuzz.universe, [10, 40, 60, 80])
-price_var_fuzz['big increase'] = fuzz.trapmf(price_var_fuzz.universe, [80, 120, 200, 200])
-
-# Plotting membership functions for each variable
-profit_margin_fuzz.view()
-plt.title('Profit Margin Membership Functions')
-plt.show()
-
-debt_ratio_fuzz.view()
-plt.title('Debt Ratio Membership Functions')
-plt.show()
-
-roa_fuzz.view()
-plt.title('ROA Membership Functions')
-plt.show()
-
-price_var_fuzz.view()
-plt.title('PRICE VAR [%] Membership Functions')
-plt.show()
-
-rules = [
-
-    # Profit Margin: Very Low
-    ctrl.Rule(profit_margin_fuzz['very low'] & debt_ratio_fuzz['very low'] & roa_fuzz['very low'], price_var_fuzz['big decrease']),
-    ctrl.Rule(profit_margin_fuzz['very low'] & debt_ratio_fuzz['very low'] & roa_fuzz['low'], price_var_fuzz['big decrease']),
-    ctrl.Rule(profit_margin_fuzz['very low'] & debt_ratio_fuzz['very low'] & roa_fuzz['medium'], price_var_fuzz['big decrease']),
-    ctrl.Rule(profit_margin_fuzz['very low'] & debt_ratio_fuzz['very low'] & roa_fuzz['high'], price_var_fuzz['big decrease']),
-    ctrl.Rule(profit_margin_fuzz['very low'] & debt_ratio_fuzz['very low'] & roa_fuzz['very high'], price_var_fuzz['decrease']),
-    
-    ctrl.Rule(profit_margin_fuzz['very low'] & debt_ratio_fuzz['low'] & roa_fuzz['very low'], price_var_fuzz['big decrease']),
-    ctrl.Rule(profit_margin_fuzz['very low'] & debt_ratio_fuzz['low'] & roa_fuzz['low'], price_var_fuzz['big decrease']),
-    ctrl.Rule(profit_margin_fuzz['very low'] & debt_ratio_fuzz['low'] & roa_fuzz['medium'], price_var_fuzz['big decrease']),
-    ctrl.Rule(profit_margin_fuzz['very low'] & debt_ratio_fuzz['low'] & roa_fuzz['high'], price_var_fuzz['big decrease']),
-    ctrl.Rule(profit_margin_fuzz['very low'] & debt_ratio_fuzz['low'] & roa_fuzz['very high'], price_var_fuzz['decrease']),
-    
-    ctrl.Rule(profit_margin_fuzz['very low'] & debt_ratio_fuzz['medium'] & roa_fuzz['very low'], price_var_fuzz['big decrease']),
-    ctrl.Rule(profit_margin_fuzz['very low'] & debt_ratio_fuzz['medium'] & roa_fuzz['low'], price_var_fuzz['big decrease']),
-    ctrl.Rule(profit_margin_fuzz['very low'] & debt_ratio_fuzz['medium'] & roa_fuzz['medium'], price_var_fuzz['big decrease']),
-    ctrl.Rule(profit_margin_fuzz['very low'] & debt_ratio_fuzz['medium'] & roa_fuzz['high'], price_var_fuzz['big decrease']),
-    ctrl.Rule(profit_margin_fuzz['very low'] & debt_ratio_fuzz['medium'] & roa_fuzz['very high'], price_var_fuzz['decrease']),
-    
-    ctrl.Rule(profit_margin_fuzz['very low'] & debt_ratio_fuzz['high'] & roa_fuzz['very low'], price_var_fuzz['big decrease']),
-    ctrl.Rule(profit_margin_fuzz['very low'] & debt_ratio_fuzz['high'] & roa_fuzz['low'], price_var_fuzz['big decrease']),
-    ctrl.Rule(profit_margin_fuzz['very low'] & debt_ratio_fuzz['high'] & roa_fuzz['medium'], price_var_fuzz['big decrease']),
-    ctrl.Rule(profit_margin_fuzz['very low'] & debt_ratio_fuzz['high'] & roa_fuzz['high'], price_var_fuzz['big decrease']),
-    ctrl.Rule(profit_margin_fuzz['very low'] & debt_ratio_fuzz['high'] & roa_fuzz['very high'], price_var_fuzz['decrease']),
-    
-    ctrl.Rule(profit_margin_fuzz['very low'] & debt_ratio_fuzz['very high'] & roa_fuzz['very low'], price_var_fuzz['big decrease']),
-    ctrl.Rule(profit_margin_fuzz['very low'] & debt_ratio_fuzz['very high'] & roa_fuzz['low'], price_var_fuzz['big decrease']),
-    ctrl.Rule(profit_margin_fuzz['very low'] & debt_ratio_fuzz['very high'] & roa_fuzz['medium'], price_var_fuzz['big decrease']),
-    ctrl.Rule(profit_margin_fuzz['very low'] & debt_ratio_fuzz['very high'] & roa_fuzz['high'], price_var_fuzz['big decrease']),
-    ctrl.Rule(profit_margin_fuzz['very low'] & debt_ratio_fuzz['very high'] & roa_fuzz['very high'], price_var_fuzz['big decrease']),
-    
-    # Profit Margin: Low
-    ctrl.Rule(profit_margin_fuzz['low'] & debt_ratio_fuzz['very low'] & roa_fuzz['very low'], price_var_fuzz['decrease']),
-    ctrl.Rule(profit_margin_fuzz['low'] & debt_ratio_fuzz['very low'] & roa_fuzz['low'], price_var_fuzz['decrease']),
-    ctrl.Rule(profit_margin_fuzz['low'] & debt_ratio_fuzz['very low'] & roa_fuzz['medium'], price_var_fuzz['decrease']),
-    ctrl.Rule(profit_margin_fuzz['low'] & debt_ratio_fuzz['very low'] & roa_fuzz['high'], price_var_fuzz['stable']),
-    ctrl.Rule(profit_margin_fuzz['low'] & debt_ratio_fuzz['very low'] & roa_fuzz['very high'], price_var_fuzz['stable']),
-    
-    ctrl.Rule(profit_margin_fuzz['low'] & debt_ratio_fuzz['low'] & roa_fuzz['very low'], price_var_fuzz['decrease']),
-    ctrl.Rule(profit_margin_fuzz['low'] & debt_ratio_fuzz['low'] & roa_fuzz['low'], price_var_fuzz['decrease']),
-    ctrl.Rule(profit_margin_fuzz['low'] & debt_ratio_fuzz['low'] & roa_fuzz['medium'], price_var_fuzz['decrease']),
-    ctrl.Rule(profit_margin_fuzz['low'] & debt_ratio_fuzz['low'] & roa_fuzz['high'], price_var_fuzz['stable']),
-    ctrl.Rule(profit_margin_fuzz['low'] & debt_ratio_fuzz['low'] & roa_fuzz['very high'], price_var_fuzz['stable']),
-    
-    ctrl.Rule(profit_margin_fuzz['low'] & debt_ratio_fuzz['medium'] & roa_fuzz['very low'], price_var_fuzz['decrease']),
-    ctrl.Rule(profit_margin_fuzz['low'] & debt_ratio_fuzz['medium'] & roa_fuzz['low'], price_var_fuzz['decrease']),
-    ctrl.Rule(profit_margin_fuzz['low'] & debt_ratio_fuzz['medium'] & roa_fuzz['medium'], price_var_fuzz['stable']),
-    ctrl.Rule(profit_margin_fuzz['low'] & debt_ratio_fuzz['medium'] & roa_fuzz['high'], price_var_fuzz['stable']),
-    ctrl.Rule(profit_margin_fuzz['low'] & debt_ratio_fuzz['medium'] & roa_fuzz['very high'], price_var_fuzz['stable']),
-    
-    ctrl.Rule(profit_margin_fuzz['low'] & debt_ratio_fuzz['high'] & roa_fuzz['very low'], price_var_fuzz['decrease']),
-    ctrl.Rule(profit_margin_fuzz['low'] & debt_ratio_fuzz['high'] & roa_fuzz['low'], price_var_fuzz['decrease']),
-    ctrl.Rule(profit_margin_fuzz['low'] & debt_ratio_fuzz['high'] & roa_fuzz['medium'], price_var_fuzz['decrease']),
-    ctrl.Rule(profit_margin_fuzz['low'] & debt_ratio_fuzz['high'] & roa_fuzz['high'], price_var_fuzz['decrease']),
-    ctrl.Rule(profit_margin_fuzz['low'] & debt_ratio_fuzz['high'] & roa_fuzz['very high'], price_var_fuzz['stable']),
-    
-    ctrl.Rule(profit_margin_fuzz['low'] & debt_ratio_fuzz['very high'] & roa_fuzz['very low'], price_var_fuzz['big decrease']),
-    ctrl.Rule(profit_margin_fuzz['low'] & debt_ratio_fuzz['very high'] & roa_fuzz['low'], price_var_fuzz['big decrease']),
-    ctrl.Rule(profit_margin_fuzz['low'] & debt_ratio_fuzz['very high'] & roa_fuzz['medium'], price_var_fuzz['big decrease']),
-    ctrl.Rule(profit_margin_fuzz['low'] & debt_ratio_fuzz['very high'] & roa_fuzz['high'], price_var_fuzz['decrease']),
-    ctrl.Rule(profit_margin_fuzz['low'] & debt_ratio_fuzz['very high'] & roa_fuzz['very high'], price_var_fuzz['stable']),
-    
-    # Profit Margin: Medium
-    ctrl.Rule(profit_margin_fuzz['medium'] & debt_ratio_fuzz['very low'] & roa_fuzz['very low'], price_var_fuzz['stable']),
-    ctrl.Rule(profit_margin_fuzz['medium'] & debt_ratio_fuzz['very low'] & roa_fuzz['low'], price_var_fuzz['stable']),
-    ctrl.Rule(profit_margin_fuzz['medium'] & debt_ratio_fuzz['very low'] & roa_fuzz['medium'], price_var_fuzz['increase']),
-    ctrl.Rule(profit_margin_fuzz['medium'] & debt_ratio_fuzz['very low'] & roa_fuzz['high'], price_var_fuzz['increase']),
-    ctrl.Rule(profit_margin_fuzz['medium'] & debt_ratio_fuzz['very low'] & roa_fuzz['very high'], price_var_fuzz['increase']),
-
-    ctrl.Rule(profit_margin_fuzz['medium'] & debt_ratio_fuzz['low'] & roa_fuzz['very low'], price_var_fuzz['decrease']),
-    ctrl.Rule(profit_margin_fuzz['medium'] & debt_ratio_fuzz['low'] & roa_fuzz['low'], price_var_fuzz['stable']),
-    ctrl.Rule(profit_margin_fuzz['medium'] & debt_ratio_fuzz['low'] & roa_fuzz['medium'], price_var_fuzz['stable']),
-    ctrl.Rule(profit_margin_fuzz['medium'] & debt_ratio_fuzz['low'] & roa_fuzz['high'], price_var_fuzz['increase']),
-    ctrl.Rule(profit_margin_fuzz['medium'] & debt_ratio_fuzz['low'] & roa_fuzz['very high'], price_var_fuzz['increase']),
-
-    ctrl.Rule(profit_margin_fuzz['medium'] & debt_ratio_fuzz['medium'] & roa_fuzz['very low'], price_var_fuzz['decrease']),
-    ctrl.Rule(profit_margin_fuzz['medium'] & debt_ratio_fuzz['medium'] & roa_fuzz['low'], price_var_fuzz['decrease']),
-    ctrl.Rule(profit_margin_fuzz['medium'] & debt_ratio_fuzz['medium'] & roa_fuzz['medium'], price_var_fuzz['stable']),
-    ctrl.Rule(profit_margin_fuzz['medium'] & debt_ratio_fuzz['medium'] & roa_fuzz['high'], price_var_fuzz['stable']),
-    ctrl.Rule(profit_margin_fuzz['medium'] & debt_ratio_fuzz['medium'] & roa_fuzz['very high'], price_var_fuzz['stable']),
-
-    ctrl.Rule(profit_margin_fuzz['medium'] & debt_ratio_fuzz['high'] & roa_fuzz['very low'], price_var_fuzz['decrease']),
-    ctrl.Rule(profit_margin_fuzz['medium'] & debt_ratio_fuzz['high'] & roa_fuzz['low'], price_var_fuzz['decrease']),
-    ctrl.Rule(profit_margin_fuzz['medium'] & debt_ratio_fuzz['high'] & roa_fuzz['medium'], price_var_fuzz['decrease']),
-    ctrl.Rule(profit_margin_fuzz['medium'] & debt_ratio_fuzz['high'] & roa_fuzz['high'], price_var_fuzz['decrease']),
-    ctrl.Rule(profit_margin_fuzz['medium'] & debt_ratio_fuzz['high'] & roa_fuzz['very high'], price_var_fuzz['decrease']),
-
-    ctrl.Rule(profit_margin_fuzz['medium'] & debt_ratio_fuzz['very high'] & roa_fuzz['very low'], price_var_fuzz['big decrease']),
-    ctrl.Rule(profit_margin_fuzz['medium'] & debt_ratio_fuzz['very high'] & roa_fuzz['low'], price_var_fuzz['big decrease']),
-    ctrl.Rule(profit_margin_fuzz['medium'] & debt_ratio_fuzz['very high'] & roa_fuzz['medium'], price_var_fuzz['big decrease']),
-    ctrl.Rule(profit_margin_fuzz['medium'] & debt_ratio_fuzz['very high'] & roa_fuzz['high'], price_var_fuzz['decrease']),
-    ctrl.Rule(profit_margin_fuzz['medium'] & debt_ratio_fuzz['very high'] & roa_fuzz['very high'], price_var_fuzz['decrease']),
-
-    # Profit Margin: High
-    ctrl.Rule(profit_margin_fuzz['high'] & debt_ratio_fuzz['very low'] & roa_fuzz['very low'], price_var_fuzz['stable']),
-    ctrl.Rule(profit_margin_fuzz['high'] & debt_ratio_fuzz['very low'] & roa_fuzz['low'], price_var_fuzz['increase']),
-    ctrl.Rule(profit_margin_fuzz['high'] & debt_ratio_fuzz['very low'] & roa_fuzz['medium'], price_var_fuzz['increase']),
-    ctrl.Rule(profit_margin_fuzz['high'] & debt_ratio_fuzz['very low'] & roa_fuzz['high'], price_var_fuzz['big increase']),
-    ctrl.Rule(profit_margin_fuzz['high'] & debt_ratio_fuzz['very low'] & roa_fuzz['very high'], price_var_fuzz['big increase']),
-
-    ctrl.Rule(profit_margin_fuzz['high'] & debt_ratio_fuzz['low'] & roa_fuzz['very low'], price_var_fuzz['stable']),
-    ctrl.Rule(profit_margin_fuzz['high'] & debt_ratio_fuzz['low'] & roa_fuzz['low'], price_var_fuzz['increase']),
-    ctrl.Rule(profit_margin_fuzz['high'] & debt_ratio_fuzz['low'] & roa_fuzz['medium'], price_var_fuzz['increase']),
-    ctrl.Rule(profit_margin_fuzz['high'] & debt_ratio_fuzz['low'] & roa_fuzz['high'], price_var_fuzz['increase']),
-    ctrl.Rule(profit_margin_fuzz['high'] & debt_ratio_fuzz['low'] & roa_fuzz['very high'], price_var_fuzz['big increase']),
-
-    ctrl.Rule(profit_margin_fuzz['high'] & debt_ratio_fuzz['medium'] & roa_fuzz['very low'], price_var_fuzz['increase']),
-    ctrl.Rule(profit_margin_fuzz['high'] & debt_ratio_fuzz['medium'] & roa_fuzz['low'], price_var_fuzz['increase']),
-    ctrl.Rule(profit_margin_fuzz['high'] & debt_ratio_fuzz['medium'] & roa_fuzz['medium'], price_var_fuzz['increase']),
-    ctrl.Rule(profit_margin_fuzz['high'] & debt_ratio_fuzz['medium'] & roa_fuzz['high'], price_var_fuzz['increase']),
-    ctrl.Rule(profit_margin_fuzz['high'] & debt_ratio_fuzz['medium'] & roa_fuzz['very high'], price_var_fuzz['increase']),
-
-    ctrl.Rule(profit_margin_fuzz['high'] & debt_ratio_fuzz['high'] & roa_fuzz['very low'], price_var_fuzz['decrease']),
-    ctrl.Rule(profit_margin_fuzz['high'] & debt_ratio_fuzz['high'] & roa_fuzz['low'], price_var_fuzz['decrease']),
-    ctrl.Rule(profit_margin_fuzz['high'] & debt_ratio_fuzz['high'] & roa_fuzz['medium'], price_var_fuzz['stable']),
-    ctrl.Rule(profit_margin_fuzz['high'] & debt_ratio_fuzz['high'] & roa_fuzz['high'], price_var_fuzz['stable']),
-    ctrl.Rule(profit_margin_fuzz['high'] & debt_ratio_fuzz['high'] & roa_fuzz['very high'], price_var_fuzz['stable']),
-
-    ctrl.Rule(profit_margin_fuzz['high'] & debt_ratio_fuzz['very high'] & roa_fuzz['very low'], price_var_fuzz['decrease']),
-    ctrl.Rule(profit_margin_fuzz['high'] & debt_ratio_fuzz['very high'] & roa_fuzz['low'], price_var_fuzz['decrease']),
-    ctrl.Rule(profit_margin_fuzz['high'] & debt_ratio_fuzz['very high'] & roa_fuzz['medium'], price_var_fuzz['stable']),
-    ctrl.Rule(profit_margin_fuzz['high'] & debt_ratio_fuzz['very high'] & roa_fuzz['high'], price_var_fuzz['stable']),
-    ctrl.Rule(profit_margin_fuzz['high'] & debt_ratio_fuzz['very high'] & roa_fuzz['very high'], price_var_fuzz['stable']),
-
-    # Profit Margin: Very High
-    ctrl.Rule(profit_margin_fuzz['very high'] & debt_ratio_fuzz['very low'] & roa_fuzz['very low'], price_var_fuzz['big increase']),
-    ctrl.Rule(profit_margin_fuzz['very high'] & debt_ratio_fuzz['very low'] & roa_fuzz['low'], price_var_fuzz['big increase']),
-    ctrl.Rule(profit_margin_fuzz['very high'] & debt_ratio_fuzz['very low'] & roa_fuzz['medium'], price_var_fuzz['big increase']),
-    ctrl.Rule(profit_margin_fuzz['very high'] & debt_ratio_fuzz['very low'] & roa_fuzz['high'], price_var_fuzz['big increase']),
-    ctrl.Rule(profit_margin_fuzz['very high'] & debt_ratio_fuzz['very low'] & roa_fuzz['very high'], price_var_fuzz['big increase']),
-
-    ctrl.Rule(profit_margin_fuzz['very high'] & debt_ratio_fuzz['low'] & roa_fuzz['very low'], price_var_fuzz['increase']),
-    ctrl.Rule(profit_margin_fuzz['very high'] & debt_ratio_fuzz['low'] & roa_fuzz['low'], price_var_fuzz['increase']),
-    ctrl.Rule(profit_margin_fuzz['very high'] & debt_ratio_fuzz['low'] & roa_fuzz['medium'], price_var_fuzz['big increase']),
-    ctrl.Rule(profit_margin_fuzz['very high'] & debt_ratio_fuzz['low'] & roa_fuzz['high'], price_var_fuzz['big increase']),
-    ctrl.Rule(profit_margin_fuzz['very high'] & debt_ratio_fuzz['low'] & roa_fuzz['very high'], price_var_fuzz['big increase']),
-
-    ctrl.Rule(profit_margin_fuzz['very high'] & debt_ratio_fuzz['medium'] & roa_fuzz['very low'], price_var_fuzz['stable']),
-    ctrl.Rule(profit_margin_fuzz['very high'] & debt_ratio_fuzz['medium'] & roa_fuzz['low'], price_var_fuzz['stable']),
-    ctrl.Rule(profit_margin_fuzz['very high'] & debt_ratio_fuzz['medium'] & roa_fuzz['medium'], price_var_fuzz['increase']),
-    ctrl.Rule(profit_margin_fuzz['very high'] & debt_ratio_fuzz['medium'] & roa_fuzz['high'], price_var_fuzz['big increase']),
-    ctrl.Rule(profit_margin_fuzz['very high'] & debt_ratio_fuzz['medium'] & roa_fuzz['very high'], price_var_fuzz['big increase']),
-
-    ctrl.Rule(profit_margin_fuzz['very high'] & debt_ratio_fuzz['high'] & roa_fuzz['very low'], price_var_fuzz['decrease']),
-    ctrl.Rule(profit_margin_fuzz['very high'] & debt_ratio_fuzz['high'] & roa_fuzz['low'], price_var_fuzz['decrease']),
-    ctrl.Rule(profit_margin_fuzz['very high'] & debt_ratio_fuzz['high'] & roa_fuzz['medium'], price_var_fuzz['decrease']),
-    ctrl.Rule(profit_margin_fuzz['very high'] & debt_ratio_fuzz['high'] & roa_fuzz['high'], price_var_fuzz['stable']),
-    ctrl.Rule(profit_margin_fuzz['very high'] & debt_ratio_fuzz['high'] & roa_fuzz['very high'], price_var_fuzz['increase']),
-
-    ctrl.Rule(profit_margin_fuzz['very high'] & debt_ratio_fuzz['very high'] & roa_fuzz['very low'], price_var_fuzz['decrease']),
-    ctrl.Rule(profit_margin_fuzz['very high'] & debt_ratio_fuzz['very high'] & roa_fuzz['low'], price_var_fuzz['decrease']),
-    ctrl.Rule(profit_margin_fuzz['very high'] & debt_ratio_fuzz['very high'] & roa_fuzz['medium'], price_var_fuzz['stable']),
-    ctrl.Rule(profit_margin_fuzz['very high'] & debt_ratio_fuzz['very high'] & roa_fuzz['high'], price_var_fuzz['increase']),
-    ctrl.Rule(profit_margin_fuzz['very high'] & debt_ratio_fuzz['very high'] & roa_fuzz['very high'], price_var_fuzz['increase']),
-
-]
-
-stock_ctrl = ctrl.ControlSystem(rules)
-stock_simulation = ctrl.ControlSystemSimulation(stock_ctrl)
-
-data = pd.read_csv('sorted_final.csv')
-
-predictions = []
-          
-
-for index, row in data.iterrows():
-
-    stock_simulation.input['Profit Margin'] = row['Profit Margin']
-    stock_simulation.input['Debt Ratio'] = row['Debt Ratio']
-    stock_simulation.input['ROA'] = row['ROA']
-    
-
-    stock_simulation.compute()
-    
-
-    predicted_price_var = stock_simulation.output['PRICE VAR [%]']
-    predictions.append(predicted_price_var)
-
-
-data['Predicted PRICE VAR [%]'] = predictions
-
-
-mae = mean_absolute_error(data['2019 PRICE VAR [%]'], data['Predicted PRICE VAR [%]'])
-print(f"Mean Absolute Error: {mae:.2f}")
-
-
-mse = mean_squared_error(data['2019 PRICE VAR [%]'], data['Predicted PRICE VAR [%]'])
-print(f"Mean Squared Error: {mse:.2f}")
-
-
-plt.figure(figsize=(10, 5))
-plt.plot(data['2019 PRICE VAR [%]'], label='Actual')
-plt.plot(data['Predicted PRICE VAR [%]'], label='Predicted')
-plt.legend()
-plt.show()
+DEFAULT_CONFIG = {
+    'variables': {
+        'Profit Margin': {'universe': [-200, 200], 'terms': {
+            'very low': [-200, -200, -150, -50],
+            'low': [-100, -50, 0, 50],
+            'medium': [0, 25, 75, 100],
+            'high': [50, 100, 150, 200],
+            'very high': [150, 200, 200, 200],
+        }},
+        'Debt Ratio': {'universe': [0, 100], 'terms': {
+            'very low': [0, 0, 10, 20],
+            'low': [10, 20, 40, 50],
+            'medium': [30, 40, 60, 70],
+            'high': [50, 60, 80, 90],
+            'very high': [80, 90, 100, 100],
+        }},
+        'ROA': {'universe': [-100, 100], 'terms': {
+            'very low': [-100, -100, -75, -25],
+            'low': [-50, -25, 0, 25],
+            'medium': [0, 10, 30, 40],
+            'high': [20, 30, 50, 60],
+            'very high': [50, 60, 100, 100],
+        }},
+        'PRICE VAR [%]': {'universe': [-100, 200], 'terms': {
+            'big decrease': [-100, -100, -75, -75],
+            'decrease': [-75, -60, -40, -10],
+            'stable': [-10, -10, 10, 10],
+            'increase': [10, 40, 60, 80],
+            'big increase': [80, 120, 200, 200],
+        }},
+    },
+    # (Profit Margin, Debt Ratio, ROA) -> PRICE VAR [%]
+    'rules': [
+        # Profit Margin: Very Low
+        ('very low', 'very low', 'very low', 'big decrease'),
+        ('very low', 'very low', 'low', 'big decrease'),
+        ('very low', 'very low', 'medium', 'big decrease'),
+        ('very low', 'very low', 'high', 'big decrease'),
+        ('very low', 'very low', 'very high', 'decrease'),
+
+        ('very low', 'low', 'very low', 'big decrease'),
+        ('very low', 'low', 'low', 'big decrease'),
+        ('very low', 'low', 'medium', 'big decrease'),
+        ('very low', 'low', 'high', 'big decrease'),
+        ('very low', 'low', 'very high', 'decrease'),
+
+        ('very low', 'medium', 'very low', 'big decrease'),
+        ('very low', 'medium', 'low', 'big decrease'),
+        ('very low', 'medium', 'medium', 'big decrease'),
+        ('very low', 'medium', 'high', 'big decrease'),
+        ('very low', 'medium', 'very high', 'decrease'),
+
+        ('very low', 'high', 'very low', 'big decrease'),
+        ('very low', 'high', 'low', 'big decrease'),
+        ('very low', 'high', 'medium', 'big decrease'),
+        ('very low', 'high', 'high', 'big decrease'),
+        ('very low', 'high', 'very high', 'decrease'),
+
+        ('very low', 'very high', 'very low', 'big decrease'),
+        ('very low', 'very high', 'low', 'big decrease'),
+        ('very low', 'very high', 'medium', 'big decrease'),
+        ('very low', 'very high', 'high', 'big decrease'),
+        ('very low', 'very high', 'very high', 'big decrease'),
+
+        # Profit Margin: Low
+        ('low', 'very low', 'very low', 'decrease'),
+        ('low', 'very low', 'low', 'decrease'),
+        ('low', 'very low', 'medium', 'decrease'),
+        ('low', 'very low', 'high', 'stable'),
+        ('low', 'very low', 'very high', 'stable'),
+
+        ('low', 'low', 'very low', 'decrease'),
+        ('low', 'low', 'low', 'decrease'),
+        ('low', 'low', 'medium', 'decrease'),
+        ('low', 'low', 'high', 'stable'),
+        ('low', 'low', 'very high', 'stable'),
+
+        ('low', 'medium', 'very low', 'decrease'),
+        ('low', 'medium', 'low', 'decrease'),
+        ('low', 'medium', 'medium', 'stable'),
+        ('low', 'medium', 'high', 'stable'),
+        ('low', 'medium', 'very high', 'stable'),
+
+        ('low', 'high', 'very low', 'decrease'),
+        ('low', 'high', 'low', 'decrease'),
+        ('low', 'high', 'medium', 'decrease'),
+        ('low', 'high', 'high', 'decrease'),
+        ('low', 'high', 'very high', 'stable'),
+
+        ('low', 'very high', 'very low', 'big decrease'),
+        ('low', 'very high', 'low', 'big decrease'),
+        ('low', 'very high', 'medium', 'big decrease'),
+        ('low', 'very high', 'high', 'decrease'),
+        ('low', 'very high', 'very high', 'stable'),
+
+        # Profit Margin: Medium
+        ('medium', 'very low', 'very low', 'stable'),
+        ('medium', 'very low', 'low', 'stable'),
+        ('medium', 'very low', 'medium', 'increase'),
+        ('medium', 'very low', 'high', 'increase'),
+        ('medium', 'very low', 'very high', 'increase'),
+
+        ('medium', 'low', 'very low', 'decrease'),
+        ('medium', 'low', 'low', 'stable'),
+        ('medium', 'low', 'medium', 'stable'),
+        ('medium', 'low', 'high', 'increase'),
+        ('medium', 'low', 'very high', 'increase'),
+
+        ('medium', 'medium', 'very low', 'decrease'),
+        ('medium', 'medium', 'low', 'decrease'),
+        ('medium', 'medium', 'medium', 'stable'),
+        ('medium', 'medium', 'high', 'stable'),
+        ('medium', 'medium', 'very high', 'stable'),
+
+        ('medium', 'high', 'very low', 'decrease'),
+        ('medium', 'high', 'low', 'decrease'),
+        ('medium', 'high', 'medium', 'decrease'),
+        ('medium', 'high', 'high', 'decrease'),
+        ('medium', 'high', 'very high', 'decrease'),
+
+        ('medium', 'very high', 'very low', 'big decrease'),
+        ('medium', 'very high', 'low', 'big decrease'),
+        ('medium', 'very high', 'medium', 'big decrease'),
+        ('medium', 'very high', 'high', 'decrease'),
+        ('medium', 'very high', 'very high', 'decrease'),
+
+        # Profit Margin: High
+        ('high', 'very low', 'very low', 'stable'),
+        ('high', 'very low', 'low', 'increase'),
+        ('high', 'very low', 'medium', 'increase'),
+        ('high', 'very low', 'high', 'big increase'),
+        ('high', 'very low', 'very high', 'big increase'),
+
+        ('high', 'low', 'very low', 'stable'),
+        ('high', 'low', 'low', 'increase'),
+        ('high', 'low', 'medium', 'increase'),
+        ('high', 'low', 'high', 'increase'),
+        ('high', 'low', 'very high', 'big increase'),
+
+        ('high', 'medium', 'very low', 'increase'),
+        ('high', 'medium', 'low', 'increase'),
+        ('high', 'medium', 'medium', 'increase'),
+        ('high', 'medium', 'high', 'increase'),
+        ('high', 'medium', 'very high', 'increase'),
+
+        ('high', 'high', 'very low', 'decrease'),
+        ('high', 'high', 'low', 'decrease'),
+        ('high', 'high', 'medium', 'stable'),
+        ('high', 'high', 'high', 'stable'),
+        ('high', 'high', 'very high', 'stable'),
+
+        ('high', 'very high', 'very low', 'decrease'),
+        ('high', 'very high', 'low', 'decrease'),
+        ('high', 'very high', 'medium', 'stable'),
+        ('high', 'very high', 'high', 'stable'),
+        ('high', 'very high', 'very high', 'stable'),
+
+        # Profit Margin: Very High
+        ('very high', 'very low', 'very low', 'big increase'),
+        ('very high', 'very low', 'low', 'big increase'),
+        ('very high', 'very low', 'medium', 'big increase'),
+        ('very high', 'very low', 'high', 'big increase'),
+        ('very high', 'very low', 'very high', 'big increase'),
+
+        ('very high', 'low', 'very low', 'increase'),
+        ('very high', 'low', 'low', 'increase'),
+        ('very high', 'low', 'medium', 'big increase'),
+        ('very high', 'low', 'high', 'big increase'),
+        ('very high', 'low', 'very high', 'big increase'),
+
+        ('very high', 'medium', 'very low', 'stable'),
+        ('very high', 'medium', 'low', 'stable'),
+        ('very high', 'medium', 'medium', 'increase'),
+        ('very high', 'medium', 'high', 'big increase'),
+        ('very high', 'medium', 'very high', 'big increase'),
+
+        ('very high', 'high', 'very low', 'decrease'),
+        ('very high', 'high', 'low', 'decrease'),
+        ('very high', 'high', 'medium', 'decrease'),
+        ('very high', 'high', 'high', 'stable'),
+        ('very high', 'high', 'very high', 'increase'),
+
+        ('very high', 'very high', 'very low', 'decrease'),
+        ('very high', 'very high', 'low', 'decrease'),
+        ('very high', 'very high', 'medium', 'stable'),
+        ('very high', 'very high', 'high', 'increase'),
+        ('very high', 'very high', 'very high', 'increase'),
+    ],
+}
+
+
+class StockModel(object):
+    """The fuzzy variables and rule base, plus lazily built control objects."""
+
+    def __init__(self, profit_margin_fuzz, debt_ratio_fuzz, roa_fuzz, price_var_fuzz, rules):
+        self.profit_margin_fuzz = profit_margin_fuzz
+        self.debt_ratio_fuzz = debt_ratio_fuzz
+        self.roa_fuzz = roa_fuzz
+        self.price_var_fuzz = price_var_fuzz
+        self.rules = rules
+
+    @functools.cached_property
+    def control_system(self):
+        from skfuzzy import control as ctrl
+        return ctrl.ControlSystem(self.rules)
+
+    def simulation(self):
+        """Return a fresh ControlSystemSimulation ready to take inputs."""
+        from skfuzzy import control as ctrl
+        return ctrl.ControlSystemSimulation(self.control_system)
+
+    @functools.cached_property
+    def engine(self):
+        from batch_engine import BatchEngine
+        return BatchEngine(self.control_system)
+
+
+def _membership(universe, points):
+    import skfuzzy as fuzz
+    if len(points) == 3:
+        return fuzz.trimf(universe, points)
+    return fuzz.trapmf(universe, points)
+
+
+def _universe(spec):
+    low, high = spec['universe']
+    return np.arange(low, high + 1, 1)
+
+
+def build_model(config=None):
+    """Create the fuzzy variables, membership functions and the 125 rules."""
+    from skfuzzy import control as ctrl
+
+    config = config or DEFAULT_CONFIG
+    variables = config['variables']
+
+    #fuzzy variables
+    profit_margin_fuzz = ctrl.Antecedent(_universe(variables['Profit Margin']), 'Profit Margin')
+    debt_ratio_fuzz = ctrl.Antecedent(_universe(variables['Debt Ratio']), 'Debt Ratio')
+    roa_fuzz = ctrl.Antecedent(_universe(variables['ROA']), 'ROA')
+    price_var_fuzz = ctrl.Consequent(_universe(variables['PRICE VAR [%]']), 'PRICE VAR [%]')
+
+    for variable in (profit_margin_fuzz, debt_ratio_fuzz, roa_fuzz, price_var_fuzz):
+        for term, points in variables[variable.label]['terms'].items():
+            variable[term] = _membership(variable.universe, points)
+
+    rules = [ctrl.Rule(profit_margin_fuzz[pm] & debt_ratio_fuzz[dr] & roa_fuzz[roa], price_var_fuzz[out])
+             for pm, dr, roa, out in config['rules']]
+
+    return StockModel(profit_margin_fuzz, debt_ratio_fuzz, roa_fuzz, price_var_fuzz, rules)
+
+
+def load_config(path):
+    """Read a model file written by ``save_config``."""
+    import json
+    with open(path) as f:
+        config = json.load(f)
+    if config.get('format') != MODEL_FORMAT or config.get('version') != MODEL_VERSION:
+        raise ValueError("{} is not a version {} stock model file".format(path, MODEL_VERSION))
+    return config
+
+
+def save_config(config, path, **metadata):
+    """Write ``config`` as a JSON model file; ``metadata`` (scores etc.) is stored alongside."""
+    import json
+    document = {'format': MODEL_FORMAT, 'version': MODEL_VERSION,
+                'variables': config['variables'], 'rules': [list(r) for r in config['rules']]}
+    document.update(metadata)
+    tmp = '{}.{}.{}.tmp'.format(path, os.getpid(), threading.get_ident())
+    with open(tmp, 'w') as f:
+        json.dump(document, f, indent=1)
+    os.replace(tmp, path)
+
+
+def current_config():
+    """The model file named by ``STOCK_MODEL_FILE``, or the built-in rule base."""
+    path = os.environ.get('STOCK_MODEL_FILE')
+    return load_config(path) if path else DEFAULT_CONFIG
+
+
+@functools.lru_cache(maxsize=None)
+def get_model():
+    """The stock model, built once per process."""
+    return build_model(current_config())
+
+
+def config_key(config):
+    """Canonical JSON of the parts of ``config`` that define the model."""
+    import json
+    return json.dumps({'variables': config['variables'], 'rules': [list(r) for r in config['rules']]},
+                      sort_keys=True)
+
+
+@functools.lru_cache(maxsize=None)
+def _engine_code_key():
+    # The model source, the engine format and scikit-fuzzy's version: editing
+    # any of them invalidates every cached engine
+    digest = hashlib.sha256()
+    here = os.path.dirname(os.path.abspath(__file__))
+    for name in ('StockPrediction.py', 'batch_engine.py'):
+        with open(os.path.join(here, name), 'rb') as f:
+            digest.update(f.read())
+    digest.update(metadata.version('scikit-fuzzy').encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+def _engine_cache_path(config):
+    digest = hashlib.sha256(config_key(config).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(CACHE_DIR, 'stock-engine-{}-{}.pkl'.format(_engine_code_key(), digest))
+
+
+def _prune_engine_cache():
+    """Remove engines pickled from other versions of the code; they can never be loaded again."""
+    current = 'stock-engine-{}-'.format(_engine_code_key())
+    for name in os.listdir(CACHE_DIR):
+        if name.startswith('stock-engine-') and name.endswith('.pkl') and not name.startswith(current):
+            try:
+                os.remove(os.path.join(CACHE_DIR, name))
+            except OSError:
+                pass
+
+
+def tuned_engine(base, config):
+    """
+    ``base`` retuned to the breakpoints and consequents of ``config``.
+
+    ``config`` must use the same variables, universes and term names as the
+    rule base ``base`` was compiled from; only shapes and rule outputs change.
+    This takes milliseconds, against seconds for a new ControlSystem.
+    """
+    shapes = {}
+    for spec in base.inputs + base.outputs:
+        variable = config['variables'][spec['label']]
+        if list(variable['terms']) != spec['terms'] or \
+                not np.array_equal(_universe(variable), spec['universe']):
+            raise ValueError("{} does not match the compiled model".format(spec['label']))
+        shapes[spec['label']] = {term: _membership(spec['universe'], points)
+                                 for term, points in variable['terms'].items()}
+    if base.rule_index is None:
+        raise ValueError("the compiled model is not a complete rule table")
+    consequents = [None] * len(base.rules)
+    for rule in config['rules']:
+        key = tuple(spec['terms'].index(term) for spec, term in zip(base.inputs, rule[:3]))
+        consequents[base.rule_index['table'][key]] = [(base.output_column(OUTPUT_LABEL, rule[3]), 1.)]
+    if any(c is None for c in consequents):
+        raise ValueError("config must give one rule per antecedent combination")
+    return base.retuned(mfs=shapes, consequents=consequents)
+
+
+def load_engine(config):
+    """Compiled BatchEngine for ``config``, from ``.cache/`` or built and saved there."""
+    path = _engine_cache_path(config)
+    try:
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+        pass
+    if config_key(config) == config_key(DEFAULT_CONFIG):
+        engine = build_model(config).engine
+    else:
+        engine = tuned_engine(load_engine(DEFAULT_CONFIG), config)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp = '{}.{}.{}.tmp'.format(path, os.getpid(), threading.get_ident())
+    with open(tmp, 'wb') as f:
+        pickle.dump(engine, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
+    _prune_engine_cache()
+    return engine
+
+
+@functools.lru_cache(maxsize=None)
+def get_engine():
+    """
+    Compiled BatchEngine for the stock model.
+
+    Loaded from ``.cache/`` when available, which needs neither scikit-fuzzy
+    nor rule construction; otherwise compiled (a model file is retuned from
+    the compiled built-in rule base) and saved.
+    """
+    return load_engine(current_config())
+
+
+def predict(profit_margin, debt_ratio, roa):
+    """Crisp PRICE VAR [%] for one company."""
+    inputs = {'Profit Margin': [profit_margin], 'Debt Ratio': [debt_ratio], 'ROA': [roa]}
+    return float(get_engine().compute(inputs)['PRICE VAR [%]'][0])
+
+
+def explain(profit_margin, debt_ratio, roa):
+    """Rules that fired for one company, as ``(rule, strength)``, strongest first."""
+    engine = get_engine()
+    inputs = {'Profit Margin': [profit_margin], 'Debt Ratio': [debt_ratio], 'ROA': [roa]}
+    return [(engine.rules[i]['label'], strength)
+            for i, strength in engine.fired_rules(inputs)[0]]
+
+
+def __getattr__(name):
+    # Keep `from StockPrediction import profit_margin_fuzz, ...` working
+    if name in ('profit_margin_fuzz', 'debt_ratio_fuzz', 'roa_fuzz', 'price_var_fuzz', 'rules'):
+        return getattr(get_model(), name)
+    if name == 'stock_ctrl':
+        return get_model().control_system
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+
+# ------------ Entry points ------------
+def plot_memberships():
+    """Show the membership functions of each variable."""
+    import matplotlib.pyplot as plt
+
+    model = get_model()
+    # Plotting membership functions for each variable
+    model.profit_margin_fuzz.view()
+    plt.title('Profit Margin Membership Functions')
+    plt.show()
+
+    model.debt_ratio_fuzz.view()
+    plt.title('Debt Ratio Membership Functions')
+    plt.show()
+
+    model.roa_fuzz.view()
+    plt.title('ROA Membership Functions')
+    plt.show()
+
+    model.price_var_fuzz.view()
+    plt.title('PRICE VAR [%] Membership Functions')
+    plt.show()
+
+
+def backtest(data_file=DATA_FILE, plot=True, check_rows=25, workers=None,
+             chunk_size=None, engine='batch', profile=False):
+    """
+    Score every row of ``data_file`` and report MAE/MSE against 2019 PRICE VAR [%].
+
+    With ``profile``, also print where inference time went and which rules
+    never fired, never decided an output, or fire the most.
+    """
+    from backtest import TARGET_COLUMN, run_backtest
+    from batch_engine import TOLERANCE, max_deviation
+    from columnar import load_frame
+
+    # Only the inputs and the target: text columns would be copied out of the cache
+    data = load_frame(data_file, list(INPUT_LABELS) + [TARGET_COLUMN])
+
+    inputs = {label: data[label].to_numpy() for label in INPUT_LABELS}
+    profiler = None
+    if profile:
+        from profiler import InferenceProfiler
+        profiler = InferenceProfiler(len(get_engine().rules))
+    predictions, errors, rate = run_backtest(inputs, data[TARGET_COLUMN].to_numpy(),
+                                             workers=workers, chunk_size=chunk_size, engine=engine,
+                                             profiler=profiler)
+    data['Predicted PRICE VAR [%]'] = predictions
+    print(f"Scored {len(data)} rows at {rate:,.0f} rows/s ({engine} engine)")
+    if profiler is not None:
+        print(profiler.format(get_engine()))
+
+    if check_rows and engine == 'batch':
+        # Spot-check the batch results against the (slow) scalar simulation,
+        # on complete rows: the engine leaves rows with a missing input NaN
+        complete = np.flatnonzero(np.all([np.isfinite(v) for v in inputs.values()], axis=0))
+        sample = {label: values[complete[:check_rows]] for label, values in inputs.items()}
+        deviation = max_deviation(get_model().control_system, get_engine(), sample)
+        print(f"Max deviation from ControlSystemSimulation: {deviation:.2e} (tolerance {TOLERANCE:.0e})")
+
+    if errors.skipped:
+        print(f"Skipped {errors.skipped} rows with missing values or no firing rule")
+    print(f"Mean Absolute Error: {errors.mae:.2f}")
+    print(f"Mean Squared Error: {errors.mse:.2f}")
+
+    if plot:
+        import matplotlib.pyplot as plt
+        plt.figure(figsize=(10, 5))
+        plt.plot(data[TARGET_COLUMN], label='Actual')
+        plt.plot(data['Predicted PRICE VAR [%]'], label='Predicted')
+        plt.legend()
+        plt.show()
+    return data
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fuzzy stock prediction model")
+    commands = parser.add_subparsers(dest='command')
+    run = commands.add_parser('backtest', help="score the dataset and report MAE/MSE")
+    run.add_argument('--data', default=DATA_FILE)
+    run.add_argument('--no-plot', action='store_true', help="skip the actual vs predicted chart")
+    run.add_argument('--check-rows', type=int, default=25,
+                     help="rows to re-score with ControlSystemSimulation (0 to skip)")
+    run.add_argument('--workers', type=int, default=None, help="processes (default: all cores)")
+    run.add_argument('--chunk-size', type=int, default=None, help="rows per task")
+    run.add_argument('--engine', choices=['batch', 'analytic', 'simulation'], default='batch',
+                     help="compiled batch engine, the same with analytic defuzzification, "
+                          "or one ControlSystemSimulation per worker")
+    run.add_argument('--profile', action='store_true',
+                     help="report time per inference stage and dead/hot rules")
+    run.add_argument('--stream', metavar='OUTPUT',
+                     help="score in bounded memory, writing predictions to OUTPUT as CSV")
+    run.add_argument('--stream-rows', type=int, default=100000, help="rows per streamed chunk")
+    commands.add_parser('plot', help="show the membership functions")
+    parser.add_argument('--model', metavar='FILE',
+                        help="model file from optimizer.py instead of the built-in rule base")
+    args = parser.parse_args(argv)
+    if args.model:
+        # Through the environment so worker processes pick it up as well
+        os.environ['STOCK_MODEL_FILE'] = args.model
+
+    if args.command == 'plot':
+        plot_memberships()
+    elif args.command == 'backtest' and args.stream:
+        from backtest import stream_backtest
+        errors, rate = stream_backtest(args.data, args.stream, chunk_rows=args.stream_rows)
+        print(f"Streamed {errors.count + errors.skipped} rows at {rate:,.0f} rows/s into {args.stream}")
+        if errors.skipped:
+            print(f"Skipped {errors.skipped} rows with missing values or no firing rule")
+        print(f"Mean Absolute Error: {errors.mae:.2f}")
+        print(f"Mean Squared Error: {errors.mse:.2f}")
+    elif args.command == 'backtest':
+        backtest(args.data, plot=not args.no_plot, check_rows=args.check_rows,
+                 workers=args.workers, chunk_size=args.chunk_size, engine=args.engine,
+                 profile=args.profile)
+    else:
+        # Bare `python StockPrediction.py` keeps running the backtest
+        backtest()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,17 +1,36 @@
 
-from flask import Flask, request, render_template, jsonify, session
-import io, base64
+from flask import Flask, request, render_template, jsonify, session, make_response, url_for, Response, stream_with_context
+from markupsafe import Markup
+from jinja2 import TemplateNotFound
+import io, os, csv, json, time, shutil, hashlib, tempfile, threading
 import numpy as np
 import matplotlib
 matplotlib.use('Agg')
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 import skfuzzy as fuzz
 from skfuzzy import control as ctrl
 import pandas as pd
-import yfinance as yf
+from batch_engine import BatchEngine
+from lut import load_surface
+from ticker_index import load_index
+from screener import load_screener
+from sim_pool import SimulationPool
+from price_store import default_store
+from chart_series import RollingSeries, SeriesCache, compact_payload, legacy_payload
+from uncertainty import MAX_SAMPLES, predict_bands
 
 app = Flask(__name__)
 app.secret_key = 'dev-key'  # for session
+# LUT mode: answer /calculate from a precomputed, interpolated response surface
+app.config['LUT_MODE'] = os.environ.get('STOCK_LUT_MODE', '0') == '1'
+app.config['DATA_FILE'] = os.environ.get('STOCK_DATA_FILE', 'sorted_final.csv')
+# Uncertainty bands: input noise (sd, percentage points) and Monte Carlo samples
+app.config['UNCERTAINTY_NOISE'] = float(os.environ.get('STOCK_UNCERTAINTY_NOISE', '5'))
+app.config['UNCERTAINTY_SAMPLES'] = int(os.environ.get('STOCK_UNCERTAINTY_SAMPLES', '10000'))
+# Score the band samples on the LUT (~4ms for 10k, interpolation error up to
+# ~11 points) or with exact inference (~30ms); follows LUT_MODE unless set
+app.config['UNCERTAINTY_LUT'] = os.environ.get(
+    'STOCK_UNCERTAINTY_LUT', os.environ.get('STOCK_LUT_MODE', '0')) == '1'
 
 # ---- Fuzzy Logic Setup ----
 profit_margin = ctrl.Antecedent(np.arange(-200, 201, 1), 'Profit Margin')
@@ -40,19 +59,134 @@ rule2 = ctrl.Rule(profit_margin['medium'] & debt_ratio['medium'] & roa['medium']
 rule3 = ctrl.Rule(profit_margin['low'] | debt_ratio['high'] | roa['low'], price_var['decrease'])
 
 pricing_ctrl = ctrl.ControlSystem([rule1, rule2, rule3])
-pricing = ctrl.ControlSystemSimulation(pricing_ctrl)
+# One simulation per concurrent request; skfuzzy simulations of a shared
+# ControlSystem are not thread-safe (see sim_pool.py)
+pricing_pool = SimulationPool(pricing_ctrl, size=int(os.environ.get('STOCK_SIM_POOL_SIZE', '8')))
+pricing_engine = BatchEngine(pricing_ctrl)
+# Daily bars kept on disk and topped up incrementally (see price_store.py).
+# Top-ups run on the store's own fetch threads, one per ticker and period at
+# a time; a request waits at most FETCH_WAIT seconds before serving the bars
+# already stored, so a slow upstream cannot hold every worker
+FETCH_WAIT = 2.0
+price_store = default_store(wait=FETCH_WAIT)
+# Closes and moving averages per ticker, extended as new bars arrive
+CHART_POINTS = 600
+chart_series = SeriesCache(price_store, period='2y')
+_surface = None
+_surface_lock = threading.Lock()
 
-def plot_memberships(active_label=None):
-    fig, axes = plt.subplots(nrows=4, figsize=(8,8))
-    for ax, antecedent in zip(axes[:3], [profit_margin, debt_ratio, roa]):
-        antecedent.view(ax=ax)
-    price_var.view(ax=axes[3])
+def get_surface():
+    """Response surface for pricing_ctrl, built or memory-mapped on first use."""
+    global _surface
+    if _surface is None:
+        with _surface_lock:
+            if _surface is None:
+                surface = load_surface(pricing_engine)
+                app.logger.info("LUT mode: interpolation error max %.4f, p99 %.4f",
+                                surface.max_error, surface.p99_error)
+                _surface = surface
+    return _surface
+
+# ---- Membership chart ----
+# The membership functions only change with the model, so the chart is
+# rendered once per model version and served as a cacheable PNG; each
+# /calculate response only carries a small SVG overlay marking its values.
+CHART_VARIABLES = [profit_margin, debt_ratio, roa, price_var]
+CHART_STYLE = 1  # bump when plot_memberships() draws differently
+_charts = {}
+_chart_lock = threading.Lock()
+
+class MembershipChart(object):
+    """Rendered PNG plus where each variable's panel sits in it."""
+
+    def __init__(self, png, version, panels, size):
+        self.png = png
+        self.version = version
+        self.etag = version[:16]
+        # label -> (left, top, right, bottom, universe low, universe high), as image fractions
+        self.panels = panels
+        self.width, self.height = size
+
+    def overlay(self, values):
+        """SVG with a marker line at each value (label -> crisp value), to lay over the PNG."""
+        marks = []
+        for label, value in values.items():
+            panel = self.panels.get(label)
+            if panel is None or value is None or not np.isfinite(value):
+                continue
+            left, top, right, bottom, low, high = panel
+            x = left + (min(max(value, low), high) - low) / (high - low) * (right - left)
+            marks.append('<line x1="{0:.1f}" y1="{1:.1f}" x2="{0:.1f}" y2="{2:.1f}"/>'.format(
+                x * self.width, top * self.height, bottom * self.height))
+        return Markup('<svg class="chart-overlay" xmlns="http://www.w3.org/2000/svg" '
+                      'viewBox="0 0 {} {}" preserveAspectRatio="none">'
+                      '<g stroke="#d62728" stroke-width="2" stroke-dasharray="6 3">{}</g></svg>'
+                      .format(self.width, self.height, ''.join(marks)))
+
+def chart_version():
+    """Hash of everything the chart shows."""
+    digest = hashlib.sha256(repr(CHART_STYLE).encode('utf-8'))
+    for var in CHART_VARIABLES:
+        digest.update(var.label.encode('utf-8'))
+        digest.update(np.asarray(var.universe, dtype=np.float64).tobytes())
+        for name, term in var.terms.items():
+            digest.update(name.encode('utf-8'))
+            digest.update(np.asarray(term.mf, dtype=np.float64).tobytes())
+    return digest.hexdigest()
+
+def plot_memberships():
+    """Render the membership functions of every variable to a MembershipChart."""
+    # A bare Figure rather than pyplot: nothing global to close or leak.
+    # FuzzyVariable.view() ignores ax= and opens a new pyplot figure per call.
+    fig = Figure(figsize=(8, 8), dpi=100)
+    axes = fig.subplots(nrows=len(CHART_VARIABLES))
+    for ax, var in zip(axes, CHART_VARIABLES):
+        for name, term in var.terms.items():
+            ax.plot(var.universe, term.mf, linewidth=1.5, label=name)
+        ax.set_title(var.label)
+        ax.set_xlim(var.universe[0], var.universe[-1])
+        ax.set_ylim(-0.05, 1.05)
+        ax.set_ylabel('Membership')
+        ax.legend(loc='center left', bbox_to_anchor=(1.0, 0.5), fontsize='small')
     fig.tight_layout()
     buf = io.BytesIO()
-    plt.savefig(buf, format='png', bbox_inches='tight')
-    plt.close(fig)
-    buf.seek(0)
-    return base64.b64encode(buf.read()).decode('utf-8')
+    # No bbox_inches='tight': the overlay relies on the axes positions below
+    fig.savefig(buf, format='png')
+    panels = {}
+    for ax, var in zip(axes, CHART_VARIABLES):
+        box = ax.get_position()
+        panels[var.label] = (box.x0, 1.0 - box.y1, box.x1, 1.0 - box.y0,
+                             float(var.universe[0]), float(var.universe[-1]))
+    width, height = fig.get_size_inches() * fig.dpi
+    return MembershipChart(buf.getvalue(), chart_version(), panels, (int(width), int(height)))
+
+def membership_chart():
+    """The chart for the current model version, rendered on first use."""
+    version = chart_version()
+    chart = _charts.get(version)
+    if chart is None:
+        with _chart_lock:
+            chart = _charts.get(version)
+            if chart is None:
+                chart = plot_memberships()
+                _charts.clear()
+                _charts[version] = chart
+    return chart
+
+@app.route('/membership-chart.png')
+def membership_chart_png():
+    chart = membership_chart()
+    response = make_response(chart.png)
+    response.mimetype = 'image/png'
+    response.set_etag(chart.etag)
+    response.cache_control.public = True
+    if request.args.get('v') == chart.etag:
+        # Versioned URL: the content behind it never changes
+        response.cache_control.max_age = 365 * 24 * 3600
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return response.make_conditional(request)
 
 @app.route('/', methods=['GET'])
 def index():
@@ -68,17 +202,183 @@ def calculate():
     for name, val in [('Profit Margin', pm), ('Debt Ratio', dr), ('ROA', r)]:
         pass
 
-    pricing.input['Profit Margin'] = pm
-    pricing.input['Debt Ratio']    = dr
-    pricing.input['ROA']           = r
-    pricing.compute()
-    result = pricing.output['PRICE VAR [%]']
+    result = get_surface().predict(pm, dr, r) if app.config['LUT_MODE'] else np.nan
+    if not np.isfinite(result):
+        # Exact inference; also covers grid cells bordering a no-rule-fired region
+        with pricing_pool.simulation() as pricing:
+            pricing.input['Profit Margin'] = pm
+            pricing.input['Debt Ratio']    = dr
+            pricing.input['ROA']           = r
+            pricing.compute()
+            result = pricing.output['PRICE VAR [%]']
 
     session['company_name'] = company_name
     session['price_var'] = result
+    bands = None
+    if request.form.get('uncertainty'):
+        bands = _bands(pm, dr, r)['percentiles']
+        session['price_var_bands'] = bands
+    else:
+        session.pop('price_var_bands', None)
+
+    chart = membership_chart()
+    graph_url = url_for('membership_chart_png', v=chart.etag)
+    graph_overlay = chart.overlay({'Profit Margin': pm, 'Debt Ratio': dr, 'ROA': r,
+                                   'PRICE VAR [%]': result})
+    return render_template('index.html', step='enter_stock_price', company_name=company_name, result=result,
+                           graph_url=graph_url, graph_overlay=graph_overlay, bands=bands)
+
+def _predict_many(inputs, lut=False):
+    """Batched PRICE VAR [%] for ``inputs`` (label -> values), from the LUT or the engine."""
+    if not lut:
+        return pricing_engine.compute(inputs)['PRICE VAR [%]']
+    result = get_surface().compute(inputs)['PRICE VAR [%]']
+    exact = ~np.isfinite(result)
+    if exact.any():
+        # Same fallback as /calculate for grid cells next to no-rule regions
+        result[exact] = pricing_engine.compute(
+            {k: np.asarray(v)[exact] for k, v in inputs.items()})['PRICE VAR [%]']
+    return result
+
+# ---- Uncertainty bands ----
+def _bands(pm, dr, r, noise=None, samples=None):
+    """Monte Carlo percentiles of PRICE VAR [%] under input noise (see UNCERTAINTY_LUT)."""
+    # A fixed seed keeps the bands of a given request stable
+    lut = app.config['UNCERTAINTY_LUT']
+    return predict_bands(lambda inputs: {'PRICE VAR [%]': _predict_many(inputs, lut=lut)},
+                         {'Profit Margin': pm, 'Debt Ratio': dr, 'ROA': r},
+                         noise=app.config['UNCERTAINTY_NOISE'] if noise is None else noise,
+                         samples=app.config['UNCERTAINTY_SAMPLES'] if samples is None else samples,
+                         seed=0)
+
+@app.route('/predict/uncertainty', methods=['GET', 'POST'])
+def predict_uncertainty():
+    """
+    Crisp prediction plus percentile bands, as JSON.
+
+    Parameters (query string, form or JSON object): profit_margin,
+    debt_ratio, roa; optional noise (one sd for every input, or a JSON
+    object of sds by input name) and samples.
+    """
+    params = request.get_json(silent=True) if request.is_json else None
+    params = params if isinstance(params, dict) else request.values
+    try:
+        pm, dr, r = (float(params[name]) for name in ('profit_margin', 'debt_ratio', 'roa'))
+        if not all(np.isfinite([pm, dr, r])):
+            raise ValueError("inputs must be finite")
+        noise = params.get('noise')
+        if isinstance(noise, str):
+            noise = json.loads(noise) if noise.lstrip().startswith('{') else float(noise)
+        samples = params.get('samples')
+        start = time.perf_counter()
+        bands = _bands(pm, dr, r, noise=noise, samples=None if samples is None else int(samples))
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({'error': 'expected numeric profit_margin, debt_ratio and roa, optional '
+                                 'noise and samples (at most {}): {}'.format(MAX_SAMPLES, e)}), 400
+    bands['milliseconds'] = round((time.perf_counter() - start) * 1000, 2)
+    bands['lut'] = app.config['UNCERTAINTY_LUT']
+    prediction = float(_predict_many({'Profit Margin': [pm], 'Debt Ratio': [dr],
+                                      'ROA': [r]}, lut=app.config['LUT_MODE'])[0])
+    # No rule fired: null, as /predict/bulk does, rather than a bare NaN
+    bands['prediction'] = prediction if np.isfinite(prediction) else None
+    return jsonify(bands)
+
+# ---- Bulk scoring ----
+BULK_CHUNK = 1024  # rows per batched inference call
+BULK_COLUMNS = ('company', 'profit_margin', 'debt_ratio', 'roa')
+
+def _bulk_column(name):
+    # 'Profit Margin', 'profit_margin' and 'profit-margin' all name the same column
+    key = '_'.join(str(name).strip().lower().replace('-', ' ').split())
+    return 'company' if key in ('company_name', 'name') else key
+
+def _bulk_csv_rows(stream):
+    """Header check now, then a generator of row lists read lazily from ``stream``."""
+    reader = csv.reader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+    header = [_bulk_column(name) for name in next(reader, [])]
+    missing = [c for c in BULK_COLUMNS if c not in header]
+    if missing:
+        raise ValueError("CSV header is missing: {}".format(', '.join(missing)))
+    positions = [header.index(c) for c in BULK_COLUMNS]
+    return ([row[i] if i < len(row) else None for i in positions] for row in reader if row)
+
+def _bulk_json_rows(data):
+    """Rows of a JSON array of objects or of [company, pm, dr, roa] lists."""
+    if not isinstance(data, list):
+        raise ValueError("JSON body must be an array of rows")
+    return ([{_bulk_column(k): v for k, v in item.items()}.get(c) for c in BULK_COLUMNS]
+            if isinstance(item, dict) else item for item in data)
+
+def _score_chunk(chunk):
+    """NDJSON lines for one chunk of ``(row number, fields)``, in row order, and the error count."""
+    parsed = []
+    for n, fields in chunk:
+        try:
+            company, pm, dr, r = fields
+            parsed.append((n, str(company or '').strip(), float(pm), float(dr), float(r)))
+        except (TypeError, ValueError):
+            parsed.append((n, None, None, None, None))
+    ok = [p for p in parsed if p[1] is not None]
+    values = {}
+    if ok:
+        inputs = {'Profit Margin': [p[2] for p in ok], 'Debt Ratio': [p[3] for p in ok],
+                  'ROA': [p[4] for p in ok]}
+        result = _predict_many(inputs, lut=app.config['LUT_MODE'])
+        values = {p[0]: float(v) for p, v in zip(ok, result)}
+    lines = []
+    errors = 0
+    for n, company, *_ in parsed:
+        if company is None:
+            line = {'row': n, 'error': 'expected company, profit_margin, debt_ratio, roa as numbers'}
+            errors += 1
+        else:
+            value = values[n]
+            line = {'row': n, 'company': company, 'price_var': value if np.isfinite(value) else None}
+        lines.append(json.dumps(line) + '\n')
+    return ''.join(lines), errors
+
+@app.route('/predict/bulk', methods=['POST'])
+def predict_bulk():
+    """
+    Score many companies in one request, streamed back as NDJSON.
+
+    Body: CSV with a header naming company, profit_margin, debt_ratio and
+    roa (the dataset's column names work too), as ``text/csv`` or a
+    ``file`` upload; or a JSON array of objects or 4-item lists.  CSV is
+    read as results are sent.  One line per row, then a summary line.
+    """
+    try:
+        if 'file' in request.files:
+            # Flask closes uploaded files when the view returns, before the
+            # response has streamed, so read from a copy we own
+            upload = tempfile.TemporaryFile()
+            shutil.copyfileobj(request.files['file'].stream, upload)
+            upload.seek(0)
+            rows = _bulk_csv_rows(upload)
+        elif request.mimetype == 'application/json':
+            rows = _bulk_json_rows(request.get_json(silent=True))
+        else:
+            rows = _bulk_csv_rows(request.stream)
+    except (ValueError, UnicodeDecodeError) as e:
+        return jsonify({'error': str(e)}), 400
+
+    def generate():
+        chunk, count, errors = [], 0, 0
+        for fields in rows:
+            chunk.append((count, fields))
+            count += 1
+            if len(chunk) == BULK_CHUNK:
+                lines, failed = _score_chunk(chunk)
+                errors += failed
+                yield lines
+                chunk = []
+        if chunk:
+            lines, failed = _score_chunk(chunk)
+            errors += failed
+            yield lines
+        yield json.dumps({'summary': {'rows': count, 'errors': errors}}) + '\n'
 
-    graph_data = plot_memberships()
-    return render_template('index.html', step='enter_stock_price', company_name=company_name, result=result, graph_data=graph_data)
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
 
 @app.route('/predict_price', methods=['POST'])
 def predict_price():
@@ -94,44 +394,77 @@ def predict_price():
 
 @app.route('/realtime-graph-data')
 def realtime_graph_data():
+    # ?format=compact for the columnar payload; ?since=<date> for only the bars after it
     ticker = request.args.get('ticker') or session.get('company_name') or 'AAPL'
-    period = '2y'
+    since = request.args.get('since') or None
     try:
-        df = yf.download(ticker, period=period, interval='1d', auto_adjust=True, progress=False)
-    except Exception as e:
-        df = None
-
-    import pandas as pd
-    import numpy as np
+        series = chart_series.get(ticker)
+    except Exception:
+        app.logger.warning("No price history for %s", ticker, exc_info=True)
+        series = None
 
-    # Fallback if yfinance fails or no rows
-    if df is None or getattr(df, 'empty', True):
-        # synth data (fallback) - ensures the chart renders offline
+    # Fallback if there is no price history - ensures the chart renders offline
+    if series is None or not len(series):
         idx = pd.date_range(end=pd.Timestamp.today(), periods=500, freq='B')
-        close = pd.Series(1000, index=idx).cumsum() * 0.0 + 1000
         # random walk uptrend
-        np.random.seed(0)
-        close = 1000 + np.cumsum(np.random.normal(1, 10, size=len(idx)))
-        df = pd.DataFrame({'Close': close}, index=idx)
-
-    df = df.dropna()
-    df = df.tail(600)
-    ma5 = df['Close'].rolling(5).mean()
-    ma42 = df['Close'].rolling(42).mean()
-    ma252 = df['Close'].rolling(252).mean()
+        close = 1000 + np.cumsum(np.random.default_rng(0).normal(1, 10, size=len(idx)))
+        series = RollingSeries.from_frame(pd.DataFrame({'Close': close}, index=idx))
 
+    try:
+        rows = series.after(since, limit=CHART_POINTS)
+    except ValueError:
+        return jsonify({'error': 'since must be a date (YYYY-MM-DD)'}), 400
     fuzz_pct = float(session.get('price_var', 0.0))
-    predicted = df['Close'] * (1.0 + fuzz_pct/100.0)
-
-    payload = {
-        'labels': [d.isoformat() for d in df.index],
-        'close': [round(float(v), 2) for v in df['Close'].values.tolist()],
-        'ma5': [None if pd.isna(v) else round(float(v),2) for v in ma5.values.tolist()],
-        'ma42': [None if pd.isna(v) else round(float(v),2) for v in ma42.values.tolist()],
-        'ma252': [None if pd.isna(v) else round(float(v),2) for v in ma252.values.tolist()],
-        'predicted': [round(float(v),2) for v in predicted.values.tolist()]
-    }
-    return jsonify(payload)
+    bands = session.get('price_var_bands')
+    if request.args.get('format') == 'compact':
+        return jsonify(compact_payload(series, rows, fuzz_pct, bands=bands))
+    return jsonify(legacy_payload(series, rows, fuzz_pct, bands=bands))
+
+@app.route('/autocomplete')
+def autocomplete():
+    # Suggestions for the company_name field, served from the persisted index
+    query = request.args.get('q', '')
+    limit = min(request.args.get('limit', 10, type=int), 50)
+    try:
+        index = load_index(app.config['DATA_FILE'])
+    except FileNotFoundError:
+        return jsonify({'suggestions': []})
+    suggestions = index.suggest(query, limit=limit)
+    return jsonify({'suggestions': [{'company': c, 'ticker': t} for c, t in suggestions]})
+
+SCREENER_LIMIT = 500
+
+@app.route('/screener')
+def screener():
+    """
+    Companies in the dataset ranked by the stock model's predicted PRICE VAR [%].
+
+    ``?top=k`` or ``?bottom=k``; otherwise ``?min=&max=`` (either may be
+    left out) with ``limit`` and ``order=asc|desc``.  At most SCREENER_LIMIT
+    rows are returned.
+    """
+    try:
+        index = load_screener(app.config['DATA_FILE'])
+    except FileNotFoundError:
+        return jsonify({'error': 'no dataset at {}'.format(app.config['DATA_FILE'])}), 404
+    def arg(name, convert):
+        value = request.args.get(name, '')
+        return convert(value) if value else None
+    try:
+        top, bottom, limit = arg('top', int), arg('bottom', int), arg('limit', int)
+        low, high = arg('min', float), arg('max', float)
+    except ValueError:
+        return jsonify({'error': 'top, bottom and limit must be integers, min and max numbers'}), 400
+    clamp = lambda k: max(0, min(k, SCREENER_LIMIT))
+    if top is not None:
+        results = index.top(clamp(top))
+    elif bottom is not None:
+        results = index.bottom(clamp(bottom))
+    else:
+        results = index.between(low, high, limit=clamp(SCREENER_LIMIT if limit is None else limit),
+                                ascending=request.args.get('order') == 'asc')
+    return jsonify({'results': results, 'matches': index.count(low, high) if top is None and bottom is None
+                    else len(results), 'universe': len(index), 'skipped': index.skipped})
 
 @app.route('/fuzzy-graph-data')
 def fuzzy_graph_data():
@@ -139,5 +472,48 @@ def fuzzy_graph_data():
     fuzz_pct = float(session.get('price_var', 0.0))
     return jsonify({'labels': ['Var'], 'values': [fuzz_pct]})
 
+# ---- Warm-up ----
+# Everything a worker would otherwise build on its first requests.  Run in
+# the server's parent process before it forks (see gunicorn.conf.py), the
+# workers start with all of it and share the pages copy-on-write.
+_ready = threading.Event()
+_warm_up_seconds = None
+
+def warm_up():
+    """Fill the simulation pool, render the chart and load the LUT, index and templates."""
+    global _warm_up_seconds
+    start = time.perf_counter()
+    pricing_pool.fill()
+    pricing_engine.compute({'Profit Margin': [0.], 'Debt Ratio': [50.], 'ROA': [0.]})
+    membership_chart()
+    if app.config['LUT_MODE'] or app.config['UNCERTAINTY_LUT']:
+        get_surface()
+    try:
+        load_index(app.config['DATA_FILE'])
+        load_screener(app.config['DATA_FILE'])
+    except FileNotFoundError:
+        pass
+    try:
+        app.jinja_env.get_template('index.html')
+    except TemplateNotFound:
+        pass
+    try:
+        import yfinance  # imported lazily by price_store; slow enough to do once here
+    except ImportError:
+        pass
+    _warm_up_seconds = time.perf_counter() - start
+    _ready.set()
+
+@app.route('/healthz')
+def healthz():
+    # Ready only after warm_up(), so a load balancer never routes to a cold worker
+    if not _ready.is_set():
+        return jsonify({'status': 'warming up'}), 503
+    return jsonify({'status': 'ready', 'pid': os.getpid(),
+                    'warm_up_seconds': round(_warm_up_seconds, 3),
+                    'simulations': pricing_pool.created,
+                    'lut': _surface is not None})
+
 if __name__ == '__main__':
+    warm_up()
     app.run(debug=True)
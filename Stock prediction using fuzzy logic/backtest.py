@@ -0,0 +1,229 @@
+"""
+Parallel backtest runner for the stock model.
+
+The dataset is split into contiguous chunks that are scored in a
+``ProcessPoolExecutor``.  Each worker sets up its scorer once (a
+``ControlSystemSimulation`` or the compiled ``BatchEngine``) and reuses it for
+every row it receives.  Predictions are written back in original row order,
+and MAE/MSE are merged from per-chunk partial sums.
+
+``stream_backtest`` is the bounded-memory variant for files too large to
+load: it reads only the needed columns in chunks and writes predictions out
+as it goes.
+"""
+import copy
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+INPUT_LABELS = ('Profit Margin', 'Debt Ratio', 'ROA')
+OUTPUT_LABEL = 'PRICE VAR [%]'
+TARGET_COLUMN = '2019 PRICE VAR [%]'
+ENGINES = ('batch', 'analytic', 'simulation')
+STREAM_CHUNK_ROWS = 100000
+
+
+class ErrorAccumulator(object):
+    """Running sums for MAE/MSE that can be merged across chunks."""
+
+    def __init__(self):
+        self.count = 0
+        self.skipped = 0
+        self.abs_sum = 0.
+        self.sq_sum = 0.
+
+    def add(self, actual, predicted):
+        """Fold in one chunk; rows with a NaN on either side are skipped."""
+        actual = np.asarray(actual, dtype=np.float64)
+        predicted = np.asarray(predicted, dtype=np.float64)
+        valid = np.isfinite(actual) & np.isfinite(predicted)
+        error = predicted[valid] - actual[valid]
+        self.count += int(valid.sum())
+        self.skipped += int((~valid).sum())
+        self.abs_sum += float(np.abs(error).sum())
+        self.sq_sum += float((error * error).sum())
+        return self
+
+    def as_dict(self):
+        return {'count': self.count, 'skipped': self.skipped,
+                'abs_sum': self.abs_sum, 'sq_sum': self.sq_sum}
+
+    @classmethod
+    def from_dict(cls, sums):
+        errors = cls()
+        errors.count, errors.skipped = int(sums['count']), int(sums['skipped'])
+        errors.abs_sum, errors.sq_sum = float(sums['abs_sum']), float(sums['sq_sum'])
+        return errors
+
+    def merge(self, other):
+        self.count += other.count
+        self.skipped += other.skipped
+        self.abs_sum += other.abs_sum
+        self.sq_sum += other.sq_sum
+        return self
+
+    @property
+    def mae(self):
+        return self.abs_sum / self.count if self.count else float('nan')
+
+    @property
+    def mse(self):
+        return self.sq_sum / self.count if self.count else float('nan')
+
+
+# ------------ Worker side ------------
+_scorer = None
+_profiler = None
+
+
+def _make_scorer(engine, profile=False):
+    from StockPrediction import get_engine, get_model
+
+    if engine in ('batch', 'analytic'):
+        batch = get_engine()
+        if engine == 'analytic' or profile:
+            batch = copy.copy(batch)
+        if engine == 'analytic':
+            batch.defuzz_mode = 'analytic'
+        if profile:
+            from profiler import InferenceProfiler
+            batch.profiler = InferenceProfiler(len(batch.rules))
+        return lambda inputs: batch.compute(inputs)[OUTPUT_LABEL], batch.profiler
+    if profile:
+        raise ValueError("profiling needs the batch or analytic engine")
+
+    simulation = get_model().simulation()
+
+    def score(inputs):
+        out = np.empty(len(inputs[INPUT_LABELS[0]]))
+        for i in range(len(out)):
+            for label in INPUT_LABELS:
+                simulation.input[label] = float(inputs[label][i])
+            simulation.compute()
+            out[i] = simulation.output.get(OUTPUT_LABEL, np.nan)
+        return out
+    return score, None
+
+
+def _init_worker(engine, profile=False):
+    global _scorer, _profiler
+    _scorer, _profiler = _make_scorer(engine, profile)
+
+
+def _score_chunk(start, inputs, actual):
+    predicted = _scorer(inputs)
+    profile = None
+    if _profiler is not None:
+        # Hand back this chunk's share only; the driver merges them
+        profile = copy.deepcopy(_profiler)
+        _profiler.reset()
+    return start, predicted, ErrorAccumulator().add(actual, predicted), profile
+
+
+# ------------ Driver ------------
+def run_backtest(inputs, actual, workers=None, chunk_size=None, engine='batch', profiler=None):
+    """
+    Score ``inputs`` against ``actual`` on ``workers`` processes.
+
+    Parameters
+    ----------
+    inputs : dict
+        Maps 'Profit Margin', 'Debt Ratio' and 'ROA' to equal-length arrays.
+    actual : array-like
+        Observed price variation for each row.
+    workers : int, optional
+        Process count; defaults to ``os.cpu_count()``.  1 runs in-process.
+    chunk_size : int, optional
+        Rows per task; defaults to about four tasks per worker.
+    engine : {'batch', 'analytic', 'simulation'}
+        Score with the compiled engine (sampled or analytic
+        defuzzification) or with one ControlSystemSimulation per worker.
+    profiler : profiler.InferenceProfiler, optional
+        Collects stage timings and rule statistics from every worker
+        (batch and analytic engines only).
+
+    Returns
+    -------
+    predictions : ndarray
+    errors : ErrorAccumulator
+    rows_per_second : float
+    """
+    if engine not in ENGINES:
+        raise ValueError("engine must be one of {}".format(ENGINES))
+    if profiler is not None and engine == 'simulation':
+        raise ValueError("profiling needs the batch or analytic engine")
+    inputs = {label: np.asarray(inputs[label], dtype=np.float64) for label in INPUT_LABELS}
+    actual = np.asarray(actual, dtype=np.float64)
+    n = len(actual)
+    workers = workers or os.cpu_count() or 1
+    chunk_size = chunk_size or max(1, math.ceil(n / (workers * 4)))
+
+    # Build the model before forking so workers inherit it instead of each
+    # paying for rule construction
+    from StockPrediction import get_engine, get_model
+    if engine != 'simulation':
+        get_engine()
+    else:
+        get_model().control_system
+
+    predictions = np.empty(n)
+    errors = ErrorAccumulator()
+    start_time = time.perf_counter()
+    chunks = [(start, {label: values[start:start + chunk_size] for label, values in inputs.items()},
+               actual[start:start + chunk_size])
+              for start in range(0, n, chunk_size)]
+    profile = profiler is not None
+    if workers == 1:
+        _init_worker(engine, profile)
+        results = [_score_chunk(*chunk) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(engine, profile)) as pool:
+            results = [f.result() for f in [pool.submit(_score_chunk, *chunk) for chunk in chunks]]
+    for start, predicted, partial, chunk_profile in results:
+        predictions[start:start + len(predicted)] = predicted
+        errors.merge(partial)
+        if profile:
+            profiler.merge(chunk_profile)
+    elapsed = time.perf_counter() - start_time
+    return predictions, errors, n / elapsed if elapsed > 0 else float('inf')
+
+
+def stream_backtest(data_file, output_file, chunk_rows=STREAM_CHUNK_ROWS):
+    """
+    Score ``data_file`` chunk by chunk with constant memory.
+
+    Only the three inputs and the target column are parsed, as float32.
+    Each chunk's predictions are appended to ``output_file`` (CSV, one line
+    per input row) before the next chunk is read, and MAE/MSE are kept as
+    running sums.
+
+    Returns
+    -------
+    errors : ErrorAccumulator
+    rows_per_second : float
+        Over every row read, skipped ones included, as for ``run_backtest``.
+    """
+    import pandas as pd
+    from StockPrediction import get_engine
+
+    engine = get_engine()
+    columns = list(INPUT_LABELS) + [TARGET_COLUMN]
+    reader = pd.read_csv(data_file, usecols=columns, dtype={c: np.float32 for c in columns},
+                         chunksize=chunk_rows)
+    errors = ErrorAccumulator()
+    start_time = time.perf_counter()
+    with open(output_file, 'w') as out:
+        out.write('{},Predicted {}\n'.format(TARGET_COLUMN, OUTPUT_LABEL))
+        for chunk in reader:
+            inputs = {label: chunk[label].to_numpy() for label in INPUT_LABELS}
+            actual = chunk[TARGET_COLUMN].to_numpy()
+            predicted = engine.compute(inputs)[OUTPUT_LABEL]
+            errors.add(actual, predicted)
+            np.savetxt(out, np.column_stack([actual, predicted]), fmt='%.6g', delimiter=',')
+    elapsed = time.perf_counter() - start_time
+    rows = errors.count + errors.skipped
+    return errors, rows / elapsed if elapsed > 0 else float('inf')
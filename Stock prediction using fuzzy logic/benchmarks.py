@@ -0,0 +1,412 @@
+"""
+Reproducible performance benchmarks for the stock project.
+
+Covers one ``ControlSystemSimulation.compute()`` from each rule base
+(``StockPrediction``, ``fuzzy_model.make_simulation`` and ``app``), backtest
+throughput, membership-chart rendering, and the ``/calculate``,
+``/realtime-graph-data`` and ``/predict/bulk`` endpoints through Flask's
+test client.  Nothing touches the network: the app's price store reads a
+seeded price fixture, and the backtest runs on a seeded synthetic dataset
+unless ``--data`` points at a real one.
+
+Each run is appended to ``benchmark_history.json`` together with the git
+commit and library versions; ``compare`` checks the latest run against an
+earlier one and exits non-zero when something got slower::
+
+    python benchmarks.py run
+    python benchmarks.py compare --threshold 0.15
+"""
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+from importlib import metadata
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+HISTORY_FILE = os.path.join(HERE, 'benchmark_history.json')
+DEFAULT_THRESHOLD = 0.15
+FIXTURE_ROWS = 5000
+SEED = 0
+
+
+# ------------ Fixtures ------------
+def sample_inputs(count, seed=SEED):
+    """
+    Seeded (profit margin, debt ratio, ROA) triples over the input universes.
+
+    Every call gets fresh values: ``ControlSystemSimulation`` caches results
+    per input, so repeating a few points would only time the cache.
+    """
+    rng = np.random.default_rng(seed)
+    return iter(zip(rng.uniform(-200, 200, count).tolist(), rng.uniform(0, 100, count).tolist(),
+                    rng.uniform(-100, 100, count).tolist()))
+
+
+def fixture_prices(ticker, days=1260):
+    """Seeded daily OHLCV random walk per ticker, up to today (for ``FixtureFetcher``)."""
+    import pandas as pd
+    rng = np.random.default_rng(zlib.crc32(ticker.encode('utf-8')))
+    index = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=days)
+    close = 100. * np.exp(np.cumsum(rng.normal(0.0003, 0.015, days)))
+    spread = np.abs(rng.normal(0, 0.01, days)) * close
+    return pd.DataFrame({'Open': close + rng.normal(0, 0.3, days), 'High': close + spread,
+                         'Low': close - spread, 'Close': close,
+                         'Volume': rng.integers(10 ** 5, 10 ** 7, days)}, index=index)
+
+
+def fixture_dataset(path, rows=FIXTURE_ROWS, seed=SEED):
+    """Write a synthetic ``sorted_final.csv`` with the real column layout."""
+    import pandas as pd
+    rng = np.random.default_rng(seed)
+    pd.DataFrame({
+        'Company': ['Company {:05d}'.format(i) for i in range(rows)],
+        'Ticker': ['T{:04d}'.format(i) for i in range(rows)],
+        'Profit Margin': rng.normal(5, 40, rows).round(3),
+        'Debt Ratio': rng.uniform(0, 100, rows).round(3),
+        'ROA': rng.normal(3, 20, rows).round(3),
+        '2019 PRICE VAR [%]': rng.normal(10, 60, rows).round(3),
+        'Sector': rng.choice(['Technology', 'Health', 'Energy', 'Utilities'], rows),
+    }).to_csv(path, index=False)
+    return path
+
+
+# Minimal page so the endpoints render even without the templates folder
+FIXTURE_TEMPLATE = ("{{ step }} {{ company_name }} {{ result }} "
+                    "{% if graph_url %}<div class=\"chart\"><img src=\"{{ graph_url }}\">"
+                    "{{ graph_overlay }}</div>{% endif %}")
+
+
+@contextlib.contextmanager
+def stubbed_app(latency=0., ttl=None):
+    """Import ``app`` with its price store reading ``fixture_prices``, ``latency`` seconds a call."""
+    import app as app_module
+    from jinja2 import ChoiceLoader, DictLoader
+    from chart_series import SeriesCache
+    from price_store import FixtureFetcher, PriceStore
+    original = app_module.price_store, app_module.chart_series
+    with tempfile.TemporaryDirectory() as tmp:
+        app_module.price_store = PriceStore(tmp, FixtureFetcher(fixture_prices, latency=latency),
+                                            ttl=original[0].ttl if ttl is None else ttl,
+                                            flights=original[0].flights, wait=original[0].wait)
+        app_module.chart_series = SeriesCache(app_module.price_store, period=original[1].period)
+        flask_app = app_module.app
+        flask_app.config['TESTING'] = True
+        flask_app.jinja_loader = ChoiceLoader([flask_app.jinja_loader,
+                                               DictLoader({'index.html': FIXTURE_TEMPLATE})])
+        try:
+            yield app_module
+        finally:
+            app_module.price_store, app_module.chart_series = original
+
+
+# ------------ Measurement ------------
+def measure(fn, repeat=50, warmup=3):
+    """Latency statistics of ``fn()`` in milliseconds."""
+    for _ in range(warmup):
+        fn()
+    samples = np.empty(repeat)
+    for i in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples[i] = time.perf_counter() - start
+    samples *= 1000.
+    return {'value': float(np.median(samples)), 'unit': 'ms', 'lower_is_better': True,
+            'p95': float(np.percentile(samples, 95)), 'min': float(samples.min()),
+            'mean': float(samples.mean()), 'runs': repeat}
+
+
+def _simulation_latency(simulation, repeat):
+    inputs = sample_inputs(repeat + 10)
+
+    def step():
+        pm, dr, roa = next(inputs)
+        simulation.input['Profit Margin'] = pm
+        simulation.input['Debt Ratio'] = dr
+        simulation.input['ROA'] = roa
+        simulation.compute()
+    return measure(step, repeat)
+
+
+# ------------ Benchmarks ------------
+def bench_simulation_stock(options):
+    from StockPrediction import get_model
+    return _simulation_latency(get_model().simulation(), options.repeat)
+
+
+def bench_simulation_fuzzy_model(options):
+    from fuzzy_model import make_simulation
+    return _simulation_latency(make_simulation(), options.repeat)
+
+
+def bench_simulation_app(options):
+    with stubbed_app() as app_module, app_module.pricing_pool.simulation() as simulation:
+        return _simulation_latency(simulation, options.repeat)
+
+
+def bench_backtest_throughput(options):
+    from backtest import INPUT_LABELS, TARGET_COLUMN, run_backtest
+    from columnar import load_columns
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_file = options.data or fixture_dataset(os.path.join(tmp, 'fixture.csv'))
+        columns = load_columns(data_file, list(INPUT_LABELS) + [TARGET_COLUMN], mmap=False)
+    inputs = {label: columns[label] for label in INPUT_LABELS}
+    actual = columns[TARGET_COLUMN]
+    run_backtest(inputs, actual, workers=options.workers)  # warm-up: engine load, pool start
+    rates = [run_backtest(inputs, actual, workers=options.workers)[2] for _ in range(3)]
+    return {'value': float(np.median(rates)), 'unit': 'rows/s', 'lower_is_better': False,
+            'rows': len(actual), 'workers': options.workers,
+            'data': os.path.basename(options.data) if options.data else 'fixture'}
+
+
+def bench_plot_memberships_stock(options):
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    from StockPrediction import plot_memberships
+
+    def render():
+        plot_memberships()
+        plt.close('all')
+    return measure(render, max(3, options.repeat // 10), warmup=1)
+
+
+def bench_plot_memberships_app(options):
+    with stubbed_app() as app_module:
+        return measure(app_module.plot_memberships, max(3, options.repeat // 10), warmup=1)
+
+
+def bench_calculate_endpoint(options):
+    with stubbed_app() as app_module:
+        client = app_module.app.test_client()
+        inputs = sample_inputs(options.repeat + 10)
+
+        sizes = []
+
+        def post():
+            pm, dr, roa = next(inputs)
+            response = client.post('/calculate', data={'company_name': 'Fixture Corp',
+                                                       'profit_margin': pm, 'debt_ratio': dr,
+                                                       'roa': roa})
+            assert response.status_code == 200, response.status_code
+            sizes.append(len(response.data))
+        result = measure(post, max(5, options.repeat // 5), warmup=2)
+        result['response_bytes'] = int(np.median(sizes))
+        return result
+
+
+def bench_bulk_endpoint(options):
+    rows = sample_inputs(FIXTURE_ROWS)
+    body = 'company,profit_margin,debt_ratio,roa\n' + ''.join(
+        'Company {},{!r},{!r},{!r}\n'.format(i, pm, dr, roa) for i, (pm, dr, roa) in enumerate(rows))
+    with stubbed_app() as app_module:
+        client = app_module.app.test_client()
+
+        def post():
+            response = client.post('/predict/bulk', data=body, content_type='text/csv')
+            assert response.status_code == 200, response.status_code
+            return response.data.count(b'\n') - 1
+        post()
+        rates = []
+        for _ in range(5):
+            start = time.perf_counter()
+            scored = post()
+            rates.append(scored / (time.perf_counter() - start))
+    return {'value': float(np.median(rates)), 'unit': 'rows/s', 'lower_is_better': False,
+            'rows': FIXTURE_ROWS}
+
+
+def _uncertainty(options, lut):
+    with stubbed_app() as app_module:
+        client = app_module.app.test_client()
+        config = app_module.app.config
+        previous = config['UNCERTAINTY_LUT']
+        config['UNCERTAINTY_LUT'] = lut
+        if lut:
+            app_module.get_surface()  # built once per model, not per request
+        inputs = sample_inputs(options.repeat + 10)
+
+        def get():
+            pm, dr, roa = next(inputs)
+            response = client.get('/predict/uncertainty', query_string={
+                'profit_margin': pm, 'debt_ratio': dr, 'roa': roa, 'samples': 10000})
+            assert response.status_code == 200, response.status_code
+        try:
+            result = measure(get, options.repeat)
+        finally:
+            config['UNCERTAINTY_LUT'] = previous
+        result.update(samples=10000, lut=lut)
+        return result
+
+
+def bench_uncertainty_endpoint(options):
+    """Bands scored on the LUT (``STOCK_UNCERTAINTY_LUT=1``)."""
+    return _uncertainty(options, lut=True)
+
+
+def bench_uncertainty_endpoint_exact(options):
+    """Bands scored with exact inference, the default configuration."""
+    return _uncertainty(options, lut=False)
+
+
+def _realtime_graph(options, query):
+    with stubbed_app() as app_module:
+        client = app_module.app.test_client()
+        with client.session_transaction() as session:
+            session['price_var'] = 4.2
+
+        def get():
+            response = client.get('/realtime-graph-data?ticker=FIXT' + query)
+            assert response.status_code == 200, response.status_code
+        return measure(get, options.repeat)
+
+
+def bench_realtime_graph_endpoint(options):
+    return _realtime_graph(options, '')
+
+
+def bench_realtime_graph_compact(options):
+    return _realtime_graph(options, '&format=compact')
+
+
+BENCHMARKS = {
+    'simulation_stock': bench_simulation_stock,
+    'simulation_fuzzy_model': bench_simulation_fuzzy_model,
+    'simulation_app': bench_simulation_app,
+    'backtest_throughput': bench_backtest_throughput,
+    'plot_memberships_stock': bench_plot_memberships_stock,
+    'plot_memberships_app': bench_plot_memberships_app,
+    'calculate_endpoint': bench_calculate_endpoint,
+    'realtime_graph_endpoint': bench_realtime_graph_endpoint,
+    'realtime_graph_compact': bench_realtime_graph_compact,
+    'bulk_endpoint': bench_bulk_endpoint,
+    'uncertainty_endpoint': bench_uncertainty_endpoint,
+    'uncertainty_endpoint_exact': bench_uncertainty_endpoint_exact,
+}
+
+
+# ------------ History ------------
+def _environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=HERE,
+                                capture_output=True, text=True, timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        commit = ''
+    versions = {}
+    for package in ('numpy', 'scikit-fuzzy', 'pandas', 'matplotlib', 'Flask'):
+        try:
+            versions[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            versions[package] = None
+    return {'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+            'commit': commit or None, 'python': platform.python_version(),
+            'machine': platform.machine(), 'cpus': os.cpu_count(), 'versions': versions}
+
+
+def load_history(path=HISTORY_FILE):
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_run(run, path=HISTORY_FILE):
+    history = load_history(path)
+    history.append(run)
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(history, f, indent=1)
+    os.replace(tmp, path)
+
+
+def compare(current, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    ``(name, baseline, current, relative change, regressed)`` per shared benchmark.
+
+    The change is signed so that positive always means slower.
+    """
+    rows = []
+    for name, result in current['results'].items():
+        before = baseline['results'].get(name)
+        if not before or not before['value'] or not result['value']:
+            continue
+        if result['lower_is_better']:
+            change = result['value'] / before['value'] - 1.
+        else:
+            change = before['value'] / result['value'] - 1.
+        rows.append((name, before, result, change, change > threshold))
+    return rows
+
+
+def run_benchmarks(options):
+    names = options.only or list(BENCHMARKS)
+    results = {}
+    for name in names:
+        print(f"{name} ...", end=' ', flush=True)
+        result = BENCHMARKS[name](options)
+        results[name] = result
+        print(f"{result['value']:,.3f} {result['unit']}")
+    return dict(_environment(), results=results)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stock project benchmarks")
+    parser.add_argument('--history', default=HISTORY_FILE)
+    commands = parser.add_subparsers(dest='command', required=True)
+    run = commands.add_parser('run', help="run the benchmarks and append them to the history")
+    run.add_argument('--only', nargs='+', choices=list(BENCHMARKS), metavar='NAME')
+    run.add_argument('--repeat', type=int, default=50, help="timed calls per latency benchmark")
+    run.add_argument('--data', help="backtest on this CSV instead of the synthetic fixture")
+    run.add_argument('--workers', type=int, default=1,
+                     help="backtest processes (default 1, so results do not depend on core count)")
+    run.add_argument('--no-save', action='store_true', help="print only, do not record the run")
+    check = commands.add_parser('compare', help="compare the latest run with an earlier one")
+    check.add_argument('--against', type=int, default=-2,
+                       help="history index of the baseline run (default: the one before last)")
+    check.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                       help="relative slowdown that counts as a regression")
+    commands.add_parser('list', help="list benchmark names")
+    args = parser.parse_args(argv)
+
+    if args.command == 'list':
+        print('\n'.join(BENCHMARKS))
+        return 0
+    if args.command == 'run':
+        os.chdir(HERE)  # app.py and the models resolve files relative to the project
+        result = run_benchmarks(args)
+        if not args.no_save:
+            save_run(result, args.history)
+            print(f"Recorded run in {args.history}")
+        return 0
+
+    history = load_history(args.history)
+    if len(history) < 2:
+        print("Need at least two recorded runs to compare")
+        return 2
+    current, baseline = history[-1], history[args.against]
+    print(f"{baseline['timestamp']} ({baseline.get('commit')}) -> "
+          f"{current['timestamp']} ({current.get('commit')})")
+    print("(change: + is slower)")
+    regressions = 0
+    for name, before, after, change, regressed in compare(current, baseline, args.threshold):
+        flag = 'REGRESSION' if regressed else ''
+        regressions += regressed
+        print(f"{name:26s} {before['value']:>12,.3f} -> {after['value']:>12,.3f} {after['unit']:7s}"
+              f" {change:+7.1%}  {flag}")
+    if regressions:
+        print(f"{regressions} benchmark(s) slower than {args.threshold:.0%}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,185 @@
+"""
+Close prices and moving averages for the real-time chart, kept per ticker.
+
+``RollingSeries`` holds the closes of one ticker with their moving averages
+and extends them bar by bar: a new bar only costs one window's worth of
+arithmetic per average, instead of re-rolling the whole history.
+``SeriesCache`` keeps one series per ticker in sync with a ``PriceStore``,
+asking it only for the bars from the last complete cached bar on.
+
+``compact_payload`` encodes a series for the browser: dates as day gaps
+from a start date and each column as base64 little-endian float32, rounded
+to one shared precision (NaN where an average is not defined yet)::
+
+    const bytes = Uint8Array.from(atob(payload.columns.close), c => c.charCodeAt(0));
+    const close = new Float32Array(bytes.buffer);
+"""
+import base64
+import datetime
+import threading
+
+import numpy as np
+
+WINDOWS = (5, 42, 252)
+PRECISION = 2
+
+
+class RollingSeries(object):
+    """Dates, closes and trailing means over ``windows``, grown in place."""
+
+    def __init__(self, windows=WINDOWS):
+        self.windows = tuple(windows)
+        self.dates = np.empty(0, dtype='datetime64[D]')
+        self.close = np.empty(0, dtype=np.float64)
+        self.means = {w: np.empty(0, dtype=np.float64) for w in self.windows}
+
+    def __len__(self):
+        return len(self.close)
+
+    @classmethod
+    def from_frame(cls, frame, windows=WINDOWS):
+        series = cls(windows)
+        series.extend(frame.index.values, frame['Close'].to_numpy())
+        return series
+
+    def extend(self, dates, closes):
+        """Append bars after the last one, filling in the averages of the new rows only."""
+        dates = np.asarray(dates).astype('datetime64[D]')
+        closes = np.asarray(closes, dtype=np.float64)
+        if not len(closes):
+            return
+        start = len(self.close)
+        self.dates = np.concatenate([self.dates, dates])
+        self.close = np.concatenate([self.close, closes])
+        for w in self.windows:
+            # Window sums for rows start.. need the w - 1 closes before them
+            lo = max(start - w + 1, 0)
+            tail = self.close[lo:]
+            means = np.full(len(closes), np.nan)
+            if len(tail) >= w:
+                sums = np.convolve(tail, np.ones(w), mode='valid') / w
+                means[len(means) - len(sums):] = sums
+            self.means[w] = np.concatenate([self.means[w], means])
+
+    def copy(self):
+        """A series sharing these arrays; growing either one leaves the other as it was."""
+        other = RollingSeries(self.windows)
+        other.dates, other.close, other.means = self.dates, self.close, dict(self.means)
+        return other
+
+    def truncate(self, n):
+        """Keep only the first ``n`` bars."""
+        self.dates = self.dates[:n]
+        self.close = self.close[:n]
+        for w in self.windows:
+            self.means[w] = self.means[w][:n]
+
+    def after(self, since=None, limit=None):
+        """Row slice of the bars dated after ``since``, at most the last ``limit``."""
+        lo = 0 if since is None else int(np.searchsorted(self.dates, np.datetime64(since, 'D'),
+                                                         side='right'))
+        if limit is not None:
+            lo = max(lo, len(self.close) - limit)
+        return slice(lo, len(self.close))
+
+
+class SeriesCache(object):
+    """
+    One ``RollingSeries`` per ticker, kept in sync with a ``PriceStore``.
+
+    Each call reads the store from the second-to-last cached bar.  That bar
+    is complete, so if its close changed the store re-adjusted the history
+    and the series is rebuilt; otherwise the last (possibly partial) bar is
+    replaced and newer bars are appended.
+
+    The store is read without holding any lock, so requests never queue
+    behind each other's fetches, and an update builds a new series instead
+    of changing the one earlier callers may still be reading.
+    """
+
+    def __init__(self, store, period='2y', windows=WINDOWS):
+        self.store = store
+        self.period = period
+        self.windows = windows
+        self.rebuilds = 0
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def _install(self, ticker, previous, series):
+        with self._lock:
+            # Unless another caller got there first with a newer series
+            if self._series.get(ticker) is previous and len(series):
+                self._series[ticker] = series
+
+    def get(self, ticker):
+        ticker = ticker.upper()
+        with self._lock:
+            cached = self._series.get(ticker)
+        if cached is not None and len(cached) >= 2:
+            anchor = cached.dates[-2].astype(datetime.date)
+            frame = self.store.history(ticker, start=anchor)
+            if (len(frame) and frame.index[0].date() == anchor
+                    and frame['Close'].iloc[0] == cached.close[-2]):
+                series = cached.copy()
+                series.truncate(len(series) - 1)
+                series.extend(frame.index.values[1:], frame['Close'].to_numpy()[1:])
+                self._install(ticker, cached, series)
+                return series
+        frame = self.store.history(ticker, period=self.period).dropna(subset=['Close'])
+        series = RollingSeries.from_frame(frame, self.windows)
+        with self._lock:
+            self.rebuilds += 1
+        self._install(ticker, cached, series)
+        return series
+
+
+def _encode(values, precision=PRECISION):
+    values = np.round(np.asarray(values, dtype=np.float64), precision).astype('<f4')
+    return base64.b64encode(values.tobytes()).decode('ascii')
+
+
+def compact_payload(series, rows, predicted_pct=0.0, precision=PRECISION, bands=None):
+    """
+    Columnar payload of ``series[rows]``.
+
+    ``days`` are gaps in days between consecutive bars, the first one
+    counted from ``start``; ``last`` is the date to pass as ``since`` on the
+    next poll.  The prediction is the single ``predicted_pct``: the client
+    scales ``close`` by ``1 + predicted_pct / 100``.  ``bands`` (percentile
+    name -> percent, see uncertainty.py) are sent the same way, as
+    ``predicted_bands``.
+    """
+    dates = series.dates[rows]
+    payload = {'format': 'compact', 'encoding': 'f32-base64', 'precision': precision,
+               'count': len(dates), 'predicted_pct': round(float(predicted_pct), precision)}
+    if len(dates):
+        payload['start'] = str(dates[0])
+        payload['last'] = str(dates[-1])
+        payload['days'] = np.diff(dates.astype(np.int64), prepend=dates[0].astype(np.int64)).tolist()
+    else:
+        payload['days'] = []
+    columns = {'close': series.close[rows]}
+    for w in series.windows:
+        columns['ma{}'.format(w)] = series.means[w][rows]
+    payload['columns'] = {name: _encode(values, precision) for name, values in columns.items()}
+    if bands:
+        payload['predicted_bands'] = {name: None if pct is None else round(float(pct), precision)
+                                      for name, pct in bands.items()}
+    return payload
+
+
+def legacy_payload(series, rows, predicted_pct=0.0, bands=None):
+    """The original list-of-values payload, built from whole arrays; ``predicted_<band>`` lines with ``bands``."""
+    def column(values):
+        values = np.round(values, 2)
+        return [None if v != v else v for v in values.tolist()]
+    dates = series.dates[rows].astype('datetime64[s]').astype(str)
+    payload = {'labels': dates.tolist(),
+               'close': column(series.close[rows])}
+    for w in series.windows:
+        payload['ma{}'.format(w)] = column(series.means[w][rows])
+    payload['predicted'] = column(series.close[rows] * (1.0 + predicted_pct / 100.0))
+    for name, pct in (bands or {}).items():
+        if pct is not None:
+            payload['predicted_' + name] = column(series.close[rows] * (1.0 + pct / 100.0))
+    return payload
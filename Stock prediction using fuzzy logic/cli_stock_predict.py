@@ -1,43 +1,77 @@
+import argparse
+import sys
 
-import yfinance as yf
-import matplotlib.pyplot as plt
-from StockPrediction import profit_margin_fuzz, debt_ratio_fuzz, roa_fuzz, price_var_fuzz, ctrl
 import numpy as np
 
-def get_financial_ratios(ticker):
-    stock = yf.Ticker(ticker)
+from StockPrediction import INPUT_LABELS, OUTPUT_LABEL, explain, get_engine, predict
+from fundamentals import DEFAULT_REFRESH, DEFAULT_WORKERS, FundamentalsCache, StubProvider, ratios, read_watchlist
 
-    # Get financial data
-    fin = stock.financials
-    bs = stock.balance_sheet
+def get_financial_ratios(ticker, cache=None):
+    # Profit Margin, Debt Ratio and ROA (%) from the latest annual statements,
+    # which are cached on disk between runs (see fundamentals.py)
+    cache = cache if cache is not None else FundamentalsCache()
+    return ratios(cache.get(ticker))
 
-    # Profit Margin = Net Income / Total Revenue * 100
-    net_income = fin.loc["Net Income"].iloc[0]
-    total_revenue = fin.loc["Total Revenue"].iloc[0]
-    profit_margin = (net_income / total_revenue) * 100
+def predict_price_change(pm, dr, roa):
+    # Compiled engine is cached on disk, so this does not rebuild the rules
+    return predict(pm, dr, roa)
 
-    # Debt Ratio = Total Liabilities / Total Assets * 100
-    total_liabilities = bs.loc["Total Liabilities"].iloc[0]
-    total_assets = bs.loc["Total Assets"].iloc[0]
-    debt_ratio = (total_liabilities / total_assets) * 100
+def rank_watchlist(tickers, cache, workers=DEFAULT_WORKERS):
+    """
+    Predicted price change for every ticker, best first.
 
-    # ROA = Net Income / Total Assets * 100
-    roa = (net_income / total_assets) * 100
+    Statements are fetched concurrently; the predictions are one batched
+    engine call.  Returns ``(ranked rows, failures)`` where a row is
+    ``(ticker, predicted %, pm, dr, roa)`` and a failure ``(ticker, reason)``.
+    """
+    rows, failures = [], []
+    for ticker, statements in cache.fetch_many(tickers, workers=workers).items():
+        if isinstance(statements, Exception):
+            failures.append((ticker, str(statements) or type(statements).__name__))
+            continue
+        try:
+            rows.append((ticker,) + ratios(statements))
+        except (KeyError, TypeError, ZeroDivisionError) as e:
+            failures.append((ticker, 'incomplete statements: {}'.format(e.args[0] if e.args else e)))
+    if rows:
+        values = np.array([row[1:] for row in rows], dtype=np.float64)
+        predicted = get_engine().compute(dict(zip(INPUT_LABELS, values.T)))[OUTPUT_LABEL]
+        rows = [(row[0], float(p)) + row[1:] for row, p in zip(rows, predicted)]
+    # No rule fired (NaN) sorts last
+    rows.sort(key=lambda row: np.inf if np.isnan(row[1]) else -row[1])
+    return rows, failures
 
-    return profit_margin, debt_ratio, roa
+def watchlist(argv):
+    parser = argparse.ArgumentParser(prog='cli_stock_predict.py watchlist',
+                                     description="Rank a watchlist by predicted price change")
+    parser.add_argument('file', help="tickers, separated by whitespace or commas; # starts a comment")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help="concurrent fetches")
+    parser.add_argument('--refresh-days', type=float, default=DEFAULT_REFRESH / 86400.,
+                        help="re-fetch cached statements older than this")
+    parser.add_argument('--stub', metavar='DIR',
+                        help="read <TICKER>.json statements from DIR instead of Yahoo Finance")
+    parser.add_argument('--top', type=int, default=None, help="only print the best N")
+    args = parser.parse_args(argv)
 
-def predict_price_change(pm, dr, roa):
-    # Create control system
-    system_ctrl = ctrl.ControlSystemSimulation(ctrl.ControlSystem(
-        [rule for rule in price_var_fuzz.terms.values() if rule]  # Not actually correct but placeholder
-    ))
-    system_ctrl.input['Profit Margin'] = pm
-    system_ctrl.input['Debt Ratio'] = dr
-    system_ctrl.input['ROA'] = roa
-    system_ctrl.compute()
-    return system_ctrl.output['PRICE VAR [%]']
+    tickers = read_watchlist(args.file)
+    cache = FundamentalsCache(provider=StubProvider(args.stub) if args.stub else None,
+                              refresh=args.refresh_days * 86400.)
+    rows, failures = rank_watchlist(tickers, cache, workers=args.workers)
+    print(f"{'#':>4}  {'Ticker':<8} {'Pred %':>8} {'PM %':>9} {'Debt %':>8} {'ROA %':>8}")
+    for rank, (ticker, predicted, pm, dr, roa) in enumerate(rows[:args.top], 1):
+        shown = 'n/a' if np.isnan(predicted) else f"{predicted:+.2f}"
+        print(f"{rank:>4}  {ticker:<8} {shown:>8} {pm:>9.2f} {dr:>8.2f} {roa:>8.2f}")
+    for ticker, reason in failures:
+        print(f"  skipped {ticker}: {reason}", file=sys.stderr)
+    return 0 if rows else 1
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] == 'watchlist':
+        return watchlist(argv[1:])
+    if argv:
+        sys.exit("usage: cli_stock_predict.py [watchlist FILE [options]]")
 
-def main():
     ticker = input("Enter stock ticker (e.g., AAPL): ").upper()
     period = input("Enter time range (e.g., 1y, 6mo, 5y, max): ")
 
@@ -47,12 +81,16 @@ def main():
     # Predict
     predicted_change = predict_price_change(pm, dr, roa)
     print(f"Predicted Price Change: {predicted_change:.2f}%")
+    for rule, strength in explain(pm, dr, roa):
+        print(f"  {strength:.2f}  {rule}")
 
-    # Get historical data
-    hist = yf.download(ticker, period=period)
+    # Get historical data, from the local store when it is fresh
+    import matplotlib.pyplot as plt
+    from price_store import default_store
+    hist = default_store().history(ticker, period=period)
     plt.figure(figsize=(10,6))
     plt.plot(hist.index, hist['Close'], label="Historical Close Price")
-    future_price = hist['Close'][-1] * (1 + predicted_change / 100)
+    future_price = hist['Close'].iloc[-1] * (1 + predicted_change / 100)
     plt.axhline(y=future_price, color='r', linestyle='--', label=f"Predicted Future Price: {future_price:.2f}")
 
     plt.title(f"{ticker} Price History and Prediction")
@@ -62,4 +100,4 @@ def main():
     plt.show()
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,187 @@
+"""
+Typed, memory-mapped column cache for ``sorted_final.csv``.
+
+The first load parses the CSV once and writes every column as its own
+``.npy`` file in a directory next to it (``sorted_final.csv.columns/``):
+numbers as ``float64``/``int64``/``bool``, text as fixed-width unicode.
+Later loads open only the requested columns with ``mmap_mode='r'``, so
+nothing is parsed and pages are read only when touched.
+
+The cache is rebuilt when the CSV changes, checked the same way as the
+company index: size and mtime first, then the content hash if those moved::
+
+    columns = load_columns('sorted_final.csv', ['Profit Margin', 'ROA'])
+    frame = load_frame('sorted_final.csv')            # all columns, as a DataFrame
+"""
+import argparse
+import json
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+
+from filestamp import file_hash, signature
+
+CACHE_SUFFIX = '.columns'
+CACHE_VERSION = 1
+MANIFEST = 'manifest.json'
+
+
+def _column_array(series):
+    """Typed array for one parsed column; text becomes fixed-width unicode ('' for missing)."""
+    import pandas as pd
+    if pd.api.types.is_bool_dtype(series.dtype) or pd.api.types.is_numeric_dtype(series.dtype):
+        return series.to_numpy()
+    return series.fillna('').astype(str).to_numpy(dtype=np.str_)
+
+
+def ingest(csv_path, cache_dir=None, content_hash=None):
+    """Parse ``csv_path`` and write its column cache; returns the manifest."""
+    import pandas as pd
+    cache_dir = cache_dir or csv_path + CACHE_SUFFIX
+    stamp = signature(csv_path)
+    content_hash = content_hash or file_hash(csv_path)
+    data = pd.read_csv(csv_path)
+
+    tmp = '{}.tmp-{}-{}'.format(cache_dir, os.getpid(), threading.get_ident())
+    os.makedirs(tmp)
+    columns = []
+    for i, name in enumerate(data.columns):
+        values = _column_array(data[name])
+        filename = '{:04d}.npy'.format(i)
+        np.save(os.path.join(tmp, filename), values)
+        columns.append({'name': str(name), 'file': filename, 'dtype': values.dtype.str})
+    manifest = {'version': CACHE_VERSION, 'signature': stamp, 'hash': content_hash,
+                'rows': len(data), 'columns': columns}
+    with open(os.path.join(tmp, MANIFEST), 'w') as f:
+        json.dump(manifest, f)
+
+    # Swap the finished directory in; readers see the old or the new one
+    old = '{}.old-{}-{}'.format(cache_dir, os.getpid(), threading.get_ident())
+    if os.path.exists(cache_dir):
+        os.replace(cache_dir, old)
+    os.replace(tmp, cache_dir)
+    shutil.rmtree(old, ignore_errors=True)
+    return manifest
+
+
+# ------------ Loading ------------
+_manifests = {}
+_lock = threading.Lock()
+
+
+def _read_manifest(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, MANIFEST)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return manifest if manifest.get('version') == CACHE_VERSION else None
+
+
+def manifest(csv_path):
+    """
+    Manifest of an up-to-date cache for ``csv_path``, ingesting if needed.
+
+    A changed size/mtime triggers a hash check and a rebuild only if the
+    hash differs; otherwise the stored signature is just refreshed.
+    """
+    csv_path = os.path.abspath(csv_path)
+    cache_dir = csv_path + CACHE_SUFFIX
+    stamp = signature(csv_path)
+    with _lock:
+        cached = _manifests.get(csv_path)
+        if cached and cached['signature'] == stamp:
+            return cached
+        current = _read_manifest(cache_dir)
+        if current is None or current['signature'] != stamp:
+            content_hash = file_hash(csv_path)
+            if current is not None and current['hash'] == content_hash:
+                current['signature'] = stamp
+                tmp = os.path.join(cache_dir, MANIFEST + '.tmp')
+                with open(tmp, 'w') as f:
+                    json.dump(current, f)
+                os.replace(tmp, os.path.join(cache_dir, MANIFEST))
+            else:
+                current = ingest(csv_path, cache_dir, content_hash)
+        _manifests[csv_path] = current
+        return current
+
+
+def load_columns(csv_path, columns=None, mmap=True):
+    """
+    ``{name: array}`` for ``columns`` (default: all), memory-mapped read-only.
+
+    Raises KeyError for a column the CSV does not have.
+    """
+    info = manifest(csv_path)
+    cache_dir = os.path.abspath(csv_path) + CACHE_SUFFIX
+    by_name = {c['name']: c for c in info['columns']}
+    names = list(by_name) if columns is None else list(columns)
+    missing = [name for name in names if name not in by_name]
+    if missing:
+        raise KeyError("{} has no column(s) {}".format(csv_path, ', '.join(missing)))
+    mode = 'r' if mmap else None
+    return {name: np.load(os.path.join(cache_dir, by_name[name]['file']), mmap_mode=mode)
+            for name in names}
+
+
+def load_frame(csv_path, columns=None):
+    """``load_columns`` as a DataFrame; numeric columns stay memory-mapped where pandas allows."""
+    import pandas as pd
+    arrays = load_columns(csv_path, columns)
+    return pd.DataFrame({name: values if values.dtype.kind != 'U' else values.astype(object)
+                         for name, values in arrays.items()}, copy=False)
+
+
+# ------------ Command line ------------
+def _rss_mb():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024.
+    except OSError:
+        pass
+    return float('nan')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Column cache for sorted_final.csv")
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('ingest', help="(re)build the cache now")
+    build.add_argument('csv', nargs='?', default='sorted_final.csv')
+    compare = commands.add_parser('compare', help="time pandas.read_csv against the cache")
+    compare.add_argument('csv', nargs='?', default='sorted_final.csv')
+    compare.add_argument('--columns', nargs='+', default=None, help="only these columns")
+    args = parser.parse_args(argv)
+
+    if args.command == 'ingest':
+        start = time.perf_counter()
+        info = ingest(os.path.abspath(args.csv))
+        print(f"Cached {info['rows']} rows x {len(info['columns'])} columns in "
+              f"{time.perf_counter() - start:.2f}s")
+        return
+
+    import pandas as pd
+    manifest(args.csv)
+    # The cache first: memory read_csv allocates is not always handed back
+    before = _rss_mb()
+    start = time.perf_counter()
+    columns = load_columns(args.csv, args.columns)
+    cache_time = time.perf_counter() - start
+    cache_rss = _rss_mb() - before
+    before = _rss_mb()
+    start = time.perf_counter()
+    frame = pd.read_csv(args.csv, usecols=args.columns)
+    csv_time = time.perf_counter() - start
+    csv_rss = _rss_mb() - before
+    print(f"read_csv:      {csv_time * 1000:8.1f}ms  +{csv_rss:.1f}MB resident")
+    print(f"column cache:  {cache_time * 1000:8.1f}ms  +{cache_rss:.1f}MB resident "
+          f"({len(columns)} memory-mapped columns)")
+
+
+if __name__ == '__main__':
+    main()
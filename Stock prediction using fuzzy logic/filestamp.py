@@ -0,0 +1,27 @@
+"""
+Change detection for data files, shared by the on-disk caches.
+
+``signature`` is the cheap check (size and mtime); ``file_hash`` is the
+content hash consulted when the signature moved, so touching or copying a
+file does not invalidate anything built from it::
+
+    if stored['signature'] != signature(path) and stored['hash'] != file_hash(path):
+        rebuild()
+"""
+import hashlib
+import os
+
+
+def signature(path):
+    """``[size, mtime_ns]`` of ``path``, as a JSON-friendly list."""
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def file_hash(path):
+    """SHA-256 hex digest of the content of ``path``, read in 1 MiB blocks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
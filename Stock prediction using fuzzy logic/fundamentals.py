@@ -0,0 +1,209 @@
+"""
+Financial statements per ticker, fetched concurrently and cached on disk.
+
+A provider is any object with ``statements(ticker)`` returning the raw
+annual statements as ``{'financials': {line: {date: value}},
+'balance_sheet': {line: {date: value}}}``.  ``YFinanceProvider`` is the
+default; ``StubProvider`` reads ``<TICKER>.json`` files in that shape (or a
+dict of them) with no network, and is picked up from
+``STOCK_FUNDAMENTALS_FIXTURES``.
+
+``FundamentalsCache`` keeps each ticker's statements in
+``.cache/fundamentals/<TICKER>.json`` and only asks the provider again
+once they are older than ``refresh`` seconds.  ``fetch_many`` runs the
+provider calls on a bounded thread pool, so a watchlist costs roughly the
+slowest call per batch of ``workers`` instead of the sum of all of them::
+
+    cache = FundamentalsCache()
+    results = cache.fetch_many(['AAPL', 'MSFT', 'NVDA'])   # ticker -> statements or exception
+    pm, dr, roa = ratios(results['AAPL'])
+"""
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'fundamentals')
+DEFAULT_REFRESH = 7 * 24 * 3600  # annual statements change a few times a year at most
+DEFAULT_WORKERS = 16
+CACHE_VERSION = 1
+
+# Line items used by ``ratios``; yfinance renamed some of them over time
+NET_INCOME = ('Net Income', 'Net Income Common Stockholders')
+TOTAL_REVENUE = ('Total Revenue', 'Operating Revenue')
+TOTAL_LIABILITIES = ('Total Liabilities', 'Total Liabilities Net Minority Interest')
+TOTAL_ASSETS = ('Total Assets',)
+
+
+def _latest(statement, names):
+    """Most recent non-missing value of the first line item in ``names`` present."""
+    for name in names:
+        values = statement.get(name)
+        if not values:
+            continue
+        for date in sorted(values, reverse=True):
+            value = values[date]
+            if value is not None and value == value:
+                return float(value)
+    raise KeyError("statement has none of {}".format(', '.join(names)))
+
+
+def ratios(statements):
+    """Profit margin, debt ratio and ROA in percent, from the latest annual statements."""
+    fin, bs = statements['financials'], statements['balance_sheet']
+    net_income = _latest(fin, NET_INCOME)
+    total_revenue = _latest(fin, TOTAL_REVENUE)
+    total_liabilities = _latest(bs, TOTAL_LIABILITIES)
+    total_assets = _latest(bs, TOTAL_ASSETS)
+    profit_margin = (net_income / total_revenue) * 100
+    debt_ratio = (total_liabilities / total_assets) * 100
+    roa = (net_income / total_assets) * 100
+    return profit_margin, debt_ratio, roa
+
+
+def _statement(frame):
+    """DataFrame of line items x period end dates -> plain nested dict."""
+    if frame is None or frame.empty:
+        return {}
+    out = {}
+    for line, row in frame.iterrows():
+        out[str(line)] = {str(date.date()) if hasattr(date, 'date') else str(date):
+                          None if value is None or value != value else float(value)
+                          for date, value in row.items()}
+    return out
+
+
+# ------------ Providers ------------
+class YFinanceProvider(object):
+    """Annual income statement and balance sheet from Yahoo Finance."""
+
+    def statements(self, ticker):
+        import yfinance as yf
+        stock = yf.Ticker(ticker)
+        statements = {'financials': _statement(stock.financials),
+                      'balance_sheet': _statement(stock.balance_sheet)}
+        if not statements['financials'] or not statements['balance_sheet']:
+            raise LookupError("no statements for {}".format(ticker))
+        return statements
+
+
+class StubProvider(object):
+    """
+    Statements from local data, for tests and offline runs.
+
+    Parameters
+    ----------
+    source : str or dict
+        A directory of ``<TICKER>.json`` files, or ``{ticker: statements}``.
+    latency : float, optional
+        Seconds to sleep per call, to stand in for a network round trip.
+    """
+
+    def __init__(self, source, latency=0.):
+        self.source = source
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def statements(self, ticker):
+        with self._lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if isinstance(self.source, dict):
+            if ticker not in self.source:
+                raise LookupError("no statements for {}".format(ticker))
+            return self.source[ticker]
+        path = os.path.join(self.source, '{}.json'.format(ticker))
+        if not os.path.exists(path):
+            raise LookupError("no statements for {}".format(ticker))
+        with open(path) as f:
+            return json.load(f)
+
+
+def default_provider():
+    fixtures = os.environ.get('STOCK_FUNDAMENTALS_FIXTURES')
+    return StubProvider(fixtures) if fixtures else YFinanceProvider()
+
+
+# ------------ Cache ------------
+class FundamentalsCache(object):
+    """
+    Raw statements per ticker on disk, refreshed after ``refresh`` seconds.
+
+    Parameters
+    ----------
+    root : str, optional
+        Directory for the ``<TICKER>.json`` cache files.
+    provider : object, optional
+        Anything with ``statements(ticker)``; defaults to ``default_provider()``.
+    refresh : float, optional
+        Age in seconds after which cached statements are fetched again.
+        If that fetch fails, the old statements are still returned.
+    """
+
+    def __init__(self, root=DEFAULT_DIR, provider=None, refresh=DEFAULT_REFRESH, clock=time.time):
+        self.root = root
+        self.provider = provider if provider is not None else default_provider()
+        self.refresh = refresh
+        self.clock = clock
+
+    def path(self, ticker):
+        safe = re.sub(r'[^A-Za-z0-9._^=-]', '_', ticker.upper())
+        return os.path.join(self.root, '{}.json'.format(safe))
+
+    def _read(self, ticker):
+        try:
+            with open(self.path(ticker)) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return entry if entry.get('version') == CACHE_VERSION else None
+
+    def _write(self, ticker, statements):
+        os.makedirs(self.root, exist_ok=True)
+        path = self.path(ticker)
+        tmp = '{}.{}.tmp'.format(path, threading.get_ident())
+        with open(tmp, 'w') as f:
+            json.dump({'version': CACHE_VERSION, 'ticker': ticker, 'fetched_at': self.clock(),
+                       'statements': statements}, f)
+        os.replace(tmp, path)
+
+    def get(self, ticker):
+        """Statements for ``ticker``, from disk while fresh, otherwise from the provider."""
+        ticker = ticker.upper()
+        entry = self._read(ticker)
+        if entry is not None and self.clock() - entry['fetched_at'] < self.refresh:
+            return entry['statements']
+        try:
+            statements = self.provider.statements(ticker)
+        except Exception:
+            if entry is None:
+                raise
+            return entry['statements']  # stale beats nothing
+        self._write(ticker, statements)
+        return statements
+
+    def fetch_many(self, tickers, workers=DEFAULT_WORKERS):
+        """``{ticker: statements or the exception raised}``, fetched on ``workers`` threads."""
+        tickers = list(dict.fromkeys(t.upper() for t in tickers))
+
+        def fetch(ticker):
+            try:
+                return self.get(ticker)
+            except Exception as e:
+                return e
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(tickers) or 1))) as pool:
+            return dict(zip(tickers, pool.map(fetch, tickers)))
+
+
+def read_watchlist(path):
+    """Tickers from a file: whitespace- or comma-separated, ``#`` starts a comment."""
+    tickers = []
+    with open(path) as f:
+        for line in f:
+            line = line.split('#', 1)[0]
+            tickers.extend(t.upper() for t in re.split(r'[\s,;]+', line) if t)
+    return list(dict.fromkeys(tickers))
@@ -1,8 +1,15 @@
 
+import collections
+import functools
+import os
+import threading
+
 import numpy as np
 import skfuzzy as fuzz
 from skfuzzy import control as ctrl
 
+from sim_pool import SimulationPool
+
 # ------------ Universes ------------
 # Keep ranges consistent with your project
 PM_UNI  = np.arange(-200, 201, 1)   # Profit Margin (%)
@@ -64,32 +71,123 @@ rules = [
     ctrl.Rule( (debt_ratio['very high']) & (profit_margin['high'] | roa['high']), price_var['stable'] ),
 ]
 
+# ------------ Compiled models ------------
+def _calculate_rules():
+    # The rule pair used by calculate(); its consequents are the nearest
+    # existing terms ('high'/'low' were never defined on price_var)
+    return [
+        ctrl.Rule(profit_margin['high'] & debt_ratio['low'] & roa['high'], price_var['increase']),
+        ctrl.Rule(profit_margin['low'] & debt_ratio['high'] & roa['low'], price_var['decrease']),
+        # Add more rules here as per your original setup...
+    ]
+
+RULE_SETS = {
+    'default': lambda: rules,
+    'calculate': _calculate_rules,
+}
+
+@functools.lru_cache(maxsize=None)
+def get_system(rule_set='default'):
+    """ControlSystem for a named rule set, compiled once per process."""
+    return ctrl.ControlSystem(RULE_SETS[rule_set]())
+
+@functools.lru_cache(maxsize=None)
+def get_pool(rule_set='default'):
+    """Simulations over private copies of ``get_system(rule_set)``, safe to use from threads."""
+    return SimulationPool(get_system(rule_set), size=int(os.environ.get('STOCK_SIM_POOL_SIZE', '8')))
+
 def make_simulation():
-    """Return a fresh ControlSystemSimulation ready to take inputs."""
-    system = ctrl.ControlSystem(rules)
-    return ctrl.ControlSystemSimulation(system)
+    """
+    Return a fresh ControlSystemSimulation ready to take inputs.
+
+    The compiled system is shared between the simulations this returns, so
+    use them from one thread; ``get_pool()`` hands out isolated ones.
+    """
+    return ctrl.ControlSystemSimulation(get_system())
+
+
+# ------------ Result cache ------------
+class ResultCache(object):
+    """
+    Bounded LRU of crisp results keyed by inputs rounded to ``precision`` decimals.
+
+    The model is evaluated at the rounded inputs, so a cached value is
+    exactly what a fresh computation for the same key would return.
+    """
+
+    def __init__(self, maxsize=4096, precision=2):
+        self.maxsize = maxsize
+        self.precision = precision
+        self.hits = 0
+        self.misses = 0
+        self._results = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def key(self, *values):
+        return tuple(round(float(v), self.precision) + 0. for v in values)  # + 0. folds -0.0
+
+    def get(self, key):
+        with self._lock:
+            try:
+                self._results.move_to_end(key)
+            except KeyError:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return self._results[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._results[key] = value
+            self._results.move_to_end(key)
+            while len(self._results) > self.maxsize:
+                self._results.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._results),
+                    'maxsize': self.maxsize, 'precision': self.precision,
+                    'hit_rate': self.hits / lookups if lookups else 0.}
+
+_result_cache = None
+
+def configure_cache(maxsize=4096, precision=2):
+    """Turn the result cache on (or resize it); ``maxsize=0`` turns it off."""
+    global _result_cache
+    _result_cache = ResultCache(maxsize, precision) if maxsize else None
+    return _result_cache
+
+def cache_stats():
+    """Hit/miss counts of the result cache, or None when it is off."""
+    return _result_cache.stats() if _result_cache is not None else None
+
+if os.environ.get('STOCK_RESULT_CACHE_SIZE'):
+    configure_cache(int(os.environ['STOCK_RESULT_CACHE_SIZE']),
+                    int(os.environ.get('STOCK_RESULT_CACHE_PRECISION', '2')))
 
 
 # ------------------- Fuzzy Calculation Function -------------------
 def calculate(pm_value, dr_value, roa_value):
-    # Create control system rules
-    rule1 = ctrl.Rule(profit_margin['high'] & debt_ratio['low'] & roa['high'], price_var['high'])
-    rule2 = ctrl.Rule(profit_margin['low'] & debt_ratio['high'] & roa['low'], price_var['low'])
-    # Add more rules here as per your original setup...
-
-    # Create control system
-    pricing_ctrl = ctrl.ControlSystem([rule1, rule2])
-    pricing = ctrl.ControlSystemSimulation(pricing_ctrl)
-
-    # Pass inputs
-    pricing.input['Profit Margin'] = pm_value
-    pricing.input['Debt Ratio'] = dr_value
-    pricing.input['ROA'] = roa_value
-
-    # Compute
-    pricing.compute()
-
-    return pricing.output['PRICE VAR [%]']
+    """Crisp PRICE VAR [%] from the ``calculate`` rule set; NaN when no rule fires."""
+    cache = _result_cache
+    if cache is not None:
+        key = cache.key(pm_value, dr_value, roa_value)
+        result = cache.get(key)
+        if result is not None:
+            return result
+        pm_value, dr_value, roa_value = key
+
+    result = get_pool('calculate').compute({'Profit Margin': pm_value, 'Debt Ratio': dr_value,
+                                            'ROA': roa_value}, 'PRICE VAR [%]')
+    if cache is not None:
+        cache.put(key, result)
+    return result
 
 
 def run_fuzzy_model():
@@ -0,0 +1,30 @@
+"""
+gunicorn settings for app.py::
+
+    gunicorn -c gunicorn.conf.py app:app
+
+The app is imported and warmed up once in the master (``preload_app`` and
+``when_ready``), then frozen out of the garbage collector so that workers
+forked from it do not dirty the shared pages by walking them.  Each worker
+starts with the compiled model, simulation pool, membership chart, company
+index and LUT already built and answers ``/healthz`` as ready at once.
+"""
+import gc
+import multiprocessing
+import os
+
+bind = os.environ.get('STOCK_BIND', '127.0.0.1:8000')
+workers = int(os.environ.get('STOCK_WORKERS', multiprocessing.cpu_count()))
+threads = int(os.environ.get('STOCK_THREADS', 4))
+worker_class = 'gthread'
+preload_app = True
+
+
+def when_ready(server):
+    import app
+    app.warm_up()
+    server.log.info("warmed up in %.2fs", app._warm_up_seconds)
+    # Move everything built so far out of the collector's reach; collections
+    # in the workers would otherwise touch (and so copy) every shared object
+    gc.collect()
+    gc.freeze()
@@ -0,0 +1,289 @@
+"""
+Concurrent load test for ``/calculate``.
+
+Starts ``app`` on a threaded local server, then for each thread count sends
+a fixed number of POSTs from that many client threads and reports
+requests/second.  Every response is checked against a single-threaded
+reference run for the same inputs, so any cross-talk between concurrent
+simulations shows up as mismatches.  yfinance is stubbed and the page
+template is replaced by one that only prints the result::
+
+    python load_test.py --threads 1 2 4 8 --requests 200
+    python load_test.py --shared    # the old single shared simulation, for comparison
+
+``--poll`` load-tests ``/realtime-graph-data`` instead: bursts of clients
+ask for the same tickers at once while the fixture upstream takes
+``--latency`` seconds per fetch, and each burst reports how many upstream
+fetches it caused and the slowest response::
+
+    python load_test.py --poll --clients 32 --latency 0.5
+    python load_test.py --poll --latency 5 --ttl 0    # upstream slower than FETCH_WAIT
+
+``--prefork N`` forks N workers the way a pre-forking server does and
+reports, per worker, the time from fork to its first ``/calculate``
+response and its private and proportional memory after a few requests:
+importing the app in each worker, importing it once in the parent, and
+importing plus ``app.warm_up()`` and ``gc.freeze()`` in the parent (what
+``gunicorn.conf.py`` does)::
+
+    python load_test.py --prefork 4
+"""
+import argparse
+import contextlib
+import copy
+import gc
+import logging
+import os
+import threading
+import time
+import urllib.parse
+import urllib.request
+
+import numpy as np
+
+from benchmarks import sample_inputs, stubbed_app
+
+
+class SharedSimulation(object):
+    """Stand-in for ``SimulationPool`` that hands every caller the same simulation."""
+
+    def __init__(self, control_system):
+        from skfuzzy import control as ctrl
+        self._simulation = ctrl.ControlSystemSimulation(control_system)
+
+    @contextlib.contextmanager
+    def simulation(self, timeout=None):
+        yield self._simulation
+
+
+def reference_results(control_system, inputs):
+    """Expected outputs, from a private simulation in this thread."""
+    from skfuzzy import control as ctrl
+    simulation = ctrl.ControlSystemSimulation(copy.deepcopy(control_system))
+    expected = []
+    for pm, dr, roa in inputs:
+        simulation.input['Profit Margin'] = pm
+        simulation.input['Debt Ratio'] = dr
+        simulation.input['ROA'] = roa
+        simulation.compute()
+        expected.append(simulation.output['PRICE VAR [%]'])
+    return expected
+
+
+def run_load(url, inputs, expected, threads):
+    """Send every input once from ``threads`` client threads; return (req/s, errors, mismatches)."""
+    cursor = iter(range(len(inputs)))
+    lock = threading.Lock()
+    counts = {'errors': 0, 'mismatches': 0}
+
+    def client():
+        while True:
+            with lock:
+                i = next(cursor, None)
+            if i is None:
+                return
+            pm, dr, roa = inputs[i]
+            body = urllib.parse.urlencode({'company_name': 'Load Test', 'profit_margin': repr(pm),
+                                           'debt_ratio': repr(dr), 'roa': repr(roa)}).encode()
+            try:
+                with urllib.request.urlopen(url, data=body, timeout=60) as response:
+                    result = float(response.read().decode())
+            except Exception:
+                with lock:
+                    counts['errors'] += 1
+                continue
+            if not np.isclose(result, expected[i], rtol=0, atol=1e-9):
+                with lock:
+                    counts['mismatches'] += 1
+
+    workers = [threading.Thread(target=client) for _ in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+    return len(inputs) / elapsed, counts['errors'], counts['mismatches']
+
+
+def run_polls(url, tickers, clients):
+    """``clients`` concurrent GETs spread over ``tickers``; return (seconds, slowest, errors)."""
+    slowest = [0.]
+    errors = [0]
+    lock = threading.Lock()
+
+    def client(ticker):
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen('{}?format=compact&ticker={}'.format(url, ticker),
+                                        timeout=60) as response:
+                response.read()
+        except Exception:
+            with lock:
+                errors[0] += 1
+        with lock:
+            slowest[0] = max(slowest[0], time.perf_counter() - start)
+
+    workers = [threading.Thread(target=client, args=(tickers[i % len(tickers)],))
+               for i in range(clients)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return time.perf_counter() - start, slowest[0], errors[0]
+
+
+def poll_test(args):
+    from werkzeug.serving import make_server
+
+    with stubbed_app(latency=args.latency, ttl=args.ttl) as app_module:
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)
+        logging.getLogger('price_store').setLevel(logging.WARNING)
+        server = make_server('127.0.0.1', 0, app_module.app, threaded=True)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        url = 'http://127.0.0.1:{}/realtime-graph-data'.format(server.server_port)
+        store = app_module.price_store
+        print(f"upstream latency {args.latency}s, fetch wait {store.wait}s, "
+              f"{store.flights.workers} fetch threads")
+        print(f"{'burst':>5} {'clients':>7} {'tickers':>7} {'seconds':>8} {'slowest':>8} "
+              f"{'fetches':>7} {'errors':>6}")
+        try:
+            for burst in range(args.bursts):
+                calls = len(store.fetcher.calls)
+                seconds, slowest, errors = run_polls(url, args.tickers, args.clients)
+                print(f"{burst + 1:>5} {args.clients:>7} {len(args.tickers):>7} {seconds:>8.2f} "
+                      f"{slowest:>8.2f} {len(store.fetcher.calls) - calls:>7} {errors:>6}")
+        finally:
+            server.shutdown()
+        print(f"Fetches started: {store.flights.started}, requests that joined one in flight: "
+              f"{store.flights.joined}")
+
+
+def _memory_mb(pid):
+    """(private, proportional) resident MB of process ``pid``."""
+    fields = {}
+    with open('/proc/{}/smaps_rollup'.format(pid)) as f:
+        for line in f:
+            name, _, value = line.partition(':')
+            if value.strip().endswith('kB'):
+                fields[name] = int(value.split()[0]) / 1024.
+    return fields['Private_Clean'] + fields['Private_Dirty'], fields['Pss']
+
+
+def _serve_in_child(import_app, requests, report, done):
+    """Body of a forked worker: answer ``requests`` POSTs, report, wait to be measured."""
+    start = time.perf_counter()
+    if import_app:
+        stubbed = stubbed_app()
+        stubbed.__enter__()
+    import app as app_module
+    client = app_module.app.test_client()
+    first = None
+    for pm, dr, roa in sample_inputs(requests, seed=7):
+        client.post('/calculate', data={'company_name': 'Prefork', 'profit_margin': repr(pm),
+                                        'debt_ratio': repr(dr), 'roa': repr(roa)})
+        if first is None:
+            first = time.perf_counter() - start
+    os.write(report, repr(first).encode() + b'\n')
+    os.read(done, 1)
+    os._exit(0)
+
+
+def prefork(workers, requests, import_app):
+    """Fork ``workers`` children; return [(first response s, private MB, PSS MB)]."""
+    children = []
+    for _ in range(workers):
+        report_r, report_w = os.pipe()
+        done_r, done_w = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            try:
+                _serve_in_child(import_app, requests, report_w, done_r)
+            finally:
+                os._exit(1)
+        children.append((pid, report_r, done_w))
+    results = []
+    for pid, report_r, _ in children:
+        with os.fdopen(report_r) as f:
+            results.append([float(f.readline())])
+    # Measure while every worker is still alive, so shared pages are split between them
+    for (pid, _, _), result in zip(children, results):
+        result.extend(_memory_mb(pid))
+    for pid, _, done_w in children:
+        os.write(done_w, b'x')
+        os.close(done_w)
+        os.waitpid(pid, 0)
+    return results
+
+
+def prefork_test(args):
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    label = '{} workers, mean per worker'.format(args.prefork)
+    print(f"{label:<34} {'first response':>14} {'private MB':>10} {'PSS MB':>8}")
+
+    def show(label, results):
+        first, private, pss = np.mean(results, axis=0)
+        print(f"{label:<34} {first * 1000:>12.0f}ms {private:>10.1f} {pss:>8.1f}")
+    show('import in each worker', prefork(args.prefork, args.requests, import_app=True))
+    with stubbed_app() as app_module:
+        show('import in parent', prefork(args.prefork, args.requests, import_app=False))
+        app_module.warm_up()
+        gc.collect()
+        gc.freeze()
+        show('import + warm_up + gc.freeze', prefork(args.prefork, args.requests, import_app=False))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrent /calculate load test")
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--requests', type=int, default=200, help="requests per thread count")
+    parser.add_argument('--shared', action='store_true',
+                        help="serve from one shared simulation (the pre-pool behaviour)")
+    parser.add_argument('--poll', action='store_true', help="load-test /realtime-graph-data instead")
+    parser.add_argument('--clients', type=int, default=32, help="concurrent clients per burst (--poll)")
+    parser.add_argument('--tickers', nargs='+', default=['AAPL'], help="tickers to poll (--poll)")
+    parser.add_argument('--bursts', type=int, default=3, help="bursts of clients (--poll)")
+    parser.add_argument('--latency', type=float, default=0.5, help="seconds per upstream fetch (--poll)")
+    parser.add_argument('--ttl', type=float, default=None,
+                        help="seconds stored bars count as current (--poll; 0 refetches every time)")
+    parser.add_argument('--prefork', type=int, metavar='N',
+                        help="compare cold and warmed-up forked workers instead")
+    args = parser.parse_args(argv)
+    if args.poll:
+        return poll_test(args)
+    if args.prefork:
+        return prefork_test(args)
+
+    from jinja2 import DictLoader
+    from werkzeug.serving import make_server
+
+    with stubbed_app() as app_module:
+        flask_app = app_module.app
+        flask_app.config['LUT_MODE'] = False
+        flask_app.jinja_loader = DictLoader({'index.html': '{{ result }}'})
+        if args.shared:
+            app_module.pricing_pool = SharedSimulation(app_module.pricing_ctrl)
+
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)  # no per-request access log
+        server = make_server('127.0.0.1', 0, flask_app, threaded=True)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        url = 'http://127.0.0.1:{}/calculate'.format(server.server_port)
+        try:
+            print(f"{'threads':>7} {'req/s':>9} {'errors':>7} {'mismatches':>10}")
+            for n, threads in enumerate(args.threads):
+                inputs = list(sample_inputs(args.requests, seed=n + 1))
+                expected = reference_results(app_module.pricing_ctrl, inputs)
+                rate, errors, mismatches = run_load(url, inputs, expected, threads)
+                print(f"{threads:>7} {rate:>9.1f} {errors:>7} {mismatches:>10}")
+        finally:
+            server.shutdown()
+        pool = app_module.pricing_pool
+        if hasattr(pool, 'created'):
+            print(f"Simulations created by the pool: {pool.created} (size {pool.size})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,221 @@
+"""
+Precomputed response surface ("LUT mode") for three-input fuzzy models.
+
+The crisp output of a rule base only depends on its bounded inputs, so it can
+be evaluated once on a regular grid over the antecedent universes and then
+served by trilinear interpolation.  Grids are stored under ``.cache/`` as
+``.npy`` files keyed by the model fingerprint and grid steps, and loaded
+memory-mapped, so a prediction is a handful of array reads.
+"""
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache')
+
+# Grid spacing per input, in multiples of the universe step
+DEFAULT_STEP = 2
+
+
+class ResponseSurface(object):
+    """
+    Crisp model output sampled on a regular grid.
+
+    Parameters
+    ----------
+    grid : ndarray
+        Output values, one axis per input (may be a read-only memmap).
+    axes : list of ndarray
+        Evenly spaced sample points of each input, in ``input_labels`` order.
+    input_labels : list of str
+    output_label : str
+    max_error, p99_error : float, optional
+        Largest and 99th percentile absolute difference from exact inference
+        seen when the grid was validated; ``None`` if it was never checked.
+    """
+
+    def __init__(self, grid, axes, input_labels, output_label,
+                 max_error=None, p99_error=None):
+        self.grid = grid
+        self.axes = [np.asarray(a, dtype=np.float64) for a in axes]
+        self.input_labels = list(input_labels)
+        self.output_label = output_label
+        self.max_error = max_error
+        self.p99_error = p99_error
+        self._origin = np.array([a[0] for a in self.axes])
+        self._step = np.array([a[1] - a[0] for a in self.axes])
+        self._upper = np.array([len(a) - 1 for a in self.axes])
+
+    def compute(self, inputs):
+        """Same contract as ``BatchEngine.compute``, answered from the grid."""
+        points = np.column_stack([np.atleast_1d(np.asarray(inputs[label], dtype=np.float64))
+                                  for label in self.input_labels])
+        # Position in grid units, clipped to the grid like skfuzzy clips inputs
+        position = np.clip((points - self._origin) / self._step, 0, self._upper)
+        lower = np.minimum(np.floor(position).astype(np.intp), self._upper - 1)
+        frac = position - lower
+
+        result = np.zeros(len(points))
+        ndim = len(self.axes)
+        for corner in range(1 << ndim):
+            index = []
+            weight = np.ones(len(points))
+            for d in range(ndim):
+                if corner >> d & 1:
+                    index.append(lower[:, d] + 1)
+                    weight *= frac[:, d]
+                else:
+                    index.append(lower[:, d])
+                    weight *= 1. - frac[:, d]
+            result += weight * self.grid[tuple(index)]
+        return {self.output_label: result}
+
+    def predict(self, *values):
+        """Single crisp prediction, inputs in ``input_labels`` order."""
+        # Plain-float version of compute(); avoids array setup for one row
+        lower, frac = [], []
+        for value, origin, step, upper in zip(values, self._origin, self._step, self._upper):
+            position = min(max((float(value) - origin) / step, 0.), float(upper))
+            i = min(int(position), int(upper) - 1)
+            lower.append(i)
+            frac.append(position - i)
+        (i, j, k), (fi, fj, fk) = lower, frac
+        cell = self.grid[i:i + 2, j:j + 2, k:k + 2].tolist()
+        result = 0.
+        for a, wa in ((0, 1. - fi), (1, fi)):
+            for b, wb in ((0, 1. - fj), (1, fj)):
+                for c, wc in ((0, 1. - fk), (1, fk)):
+                    result += wa * wb * wc * cell[a][b][c]
+        return result
+
+
+# ------------ Building & caching ------------
+def grid_axes(engine, step=DEFAULT_STEP):
+    """Sample points for every input: every ``step``-th universe point."""
+    axes = []
+    for spec in engine.inputs:
+        universe = spec['universe']
+        axis = universe[::step]
+        if axis[-1] != universe[-1]:
+            axis = np.append(axis, universe[-1])
+        axes.append(axis)
+    return axes
+
+
+def interpolation_error(surface, engine, samples=20000, seed=0):
+    """
+    Max and 99th percentile of |surface - exact| over uniform random inputs.
+
+    The max is usually set by a few steep spots where every rule is barely
+    firing and the centroid swings quickly; the percentile shows the
+    typical case.
+    """
+    rng = np.random.default_rng(seed)
+    inputs = {spec['label']: rng.uniform(spec['universe'][0], spec['universe'][-1], samples)
+              for spec in engine.inputs}
+    exact = engine.compute(inputs)[surface.output_label]
+    approx = surface.compute(inputs)[surface.output_label]
+    both = np.isfinite(exact) & np.isfinite(approx)
+    if not both.any():
+        return 0., 0.
+    error = np.abs(exact[both] - approx[both])
+    return float(error.max()), float(np.percentile(error, 99))
+
+
+def build_surface(engine, path, step=DEFAULT_STEP, output_label=None):
+    """Evaluate ``engine`` on the grid and write it to ``path`` (.npy)."""
+    output_label = output_label or engine.output_labels[0]
+    axes = grid_axes(engine, step)
+    labels = engine.input_labels
+    # Per process and thread, so concurrent first builds never share a file
+    tmp = '{}.{}.{}.tmp'.format(path, os.getpid(), threading.get_ident())
+    grid = np.lib.format.open_memmap(tmp, mode='w+', dtype=np.float32,
+                                     shape=tuple(len(a) for a in axes))
+    # One slab per value of the first input keeps memory bounded
+    rest = np.meshgrid(*axes[1:], indexing='ij')
+    for i, value in enumerate(axes[0]):
+        inputs = {labels[0]: np.full(rest[0].size, value)}
+        for label, mesh in zip(labels[1:], rest):
+            inputs[label] = mesh.ravel()
+        grid[i] = engine.compute(inputs)[output_label].reshape(rest[0].shape)
+    grid.flush()
+    del grid
+    os.replace(tmp, path)
+    return axes
+
+
+def load_surface(engine, step=DEFAULT_STEP, cache_dir=CACHE_DIR, validate=True):
+    """
+    Memory-map the cached grid for ``engine``, building it on first use.
+
+    The cache key covers the model fingerprint and the grid step, so editing
+    the universes, terms or rules produces a new grid.
+    """
+    if len(engine.inputs) != 3:
+        raise ValueError("LUT mode expects exactly three inputs")
+    output_label = engine.output_labels[0]
+    os.makedirs(cache_dir, exist_ok=True)
+    key = '{}-s{}'.format(engine.fingerprint()[:16], step)
+    path = os.path.join(cache_dir, 'lut-{}.npy'.format(key))
+    meta_path = os.path.join(cache_dir, 'lut-{}.json'.format(key))
+
+    if not (os.path.exists(path) and os.path.exists(meta_path)):
+        start = time.perf_counter()
+        axes = build_surface(engine, path, step, output_label)
+        meta = {'fingerprint': engine.fingerprint(), 'step': step,
+                'input_labels': engine.input_labels, 'output_label': output_label,
+                'axes': [[float(a[0]), float(a[-1]), len(a)] for a in axes],
+                'build_seconds': round(time.perf_counter() - start, 3),
+                'max_error': None, 'p99_error': None}
+        if validate:
+            surface = ResponseSurface(np.load(path, mmap_mode='r'), axes,
+                                      engine.input_labels, output_label)
+            meta['max_error'], meta['p99_error'] = interpolation_error(surface, engine)
+        tmp = '{}.{}.{}.tmp'.format(meta_path, os.getpid(), threading.get_ident())
+        with open(tmp, 'w') as f:
+            json.dump(meta, f, indent=2)
+        os.replace(tmp, meta_path)
+
+    with open(meta_path) as f:
+        meta = json.load(f)
+    axes = [np.linspace(lo, hi, n) for lo, hi, n in meta['axes']]
+    return ResponseSurface(np.load(path, mmap_mode='r'), axes,
+                           meta['input_labels'], meta['output_label'],
+                           max_error=meta['max_error'], p99_error=meta['p99_error'])
+
+
+if __name__ == '__main__':
+    import argparse
+    from skfuzzy import control as ctrl
+    from batch_engine import BatchEngine
+
+    parser = argparse.ArgumentParser(description="Build and check the LUT for a rule base")
+    parser.add_argument('model', choices=['stock', 'app', 'fuzzy_model'])
+    parser.add_argument('--step', type=int, default=DEFAULT_STEP)
+    args = parser.parse_args()
+
+    if args.model == 'stock':
+        from StockPrediction import get_engine
+        engine = get_engine()
+    elif args.model == 'app':
+        from app import pricing_engine as engine
+    else:
+        from fuzzy_model import rules
+        engine = BatchEngine(ctrl.ControlSystem(rules))
+
+    start = time.perf_counter()
+    surface = load_surface(engine, step=args.step)
+    print(f"Loaded {surface.grid.shape} grid in {time.perf_counter() - start:.2f}s")
+    print(f"Interpolation error vs exact inference: max {surface.max_error:.4f}, "
+          f"p99 {surface.p99_error:.4f}")
+
+    n = 100000
+    rng = np.random.default_rng(1)
+    inputs = {spec['label']: rng.uniform(spec['universe'][0], spec['universe'][-1], n)
+              for spec in engine.inputs}
+    start = time.perf_counter()
+    surface.compute(inputs)
+    print(f"Lookup: {n / (time.perf_counter() - start):,.0f} predictions/s")
@@ -0,0 +1,277 @@
+"""
+Tune the stock model's term breakpoints and rule consequents for lower MAE.
+
+Candidates are plain model configurations (see ``StockPrediction.DEFAULT_CONFIG``).
+Each one is scored by retuning the compiled engine, which takes milliseconds,
+and predicting a train and a validation split of ``sorted_final.csv``;
+candidates are scored in parallel worker processes.  Search minimises train
+MAE and the winner is picked by validation MAE among the best few, so a
+model that only memorised the training rows does not get exported.
+
+Scores are kept in ``.cache/optimizer-scores.jsonl``, keyed by the data, the
+split and the candidate, so re-running a search (or resuming from a saved
+model) does not re-score anything it has already seen.  The winner is
+written as a model file for ``StockPrediction.py --model``::
+
+    python optimizer.py --method genetic --generations 30 --output tuned_model.json
+    python StockPrediction.py --model tuned_model.json backtest
+"""
+import argparse
+import copy
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from backtest import TARGET_COLUMN
+from StockPrediction import (CACHE_DIR, DATA_FILE, DEFAULT_CONFIG, INPUT_LABELS, OUTPUT_LABEL,
+                             config_key, load_config, load_engine, save_config, tuned_engine)
+
+METHODS = ('random', 'genetic')
+SCORE_CACHE = os.path.join(CACHE_DIR, 'optimizer-scores.jsonl')
+
+
+def candidate_key(config):
+    return hashlib.sha256(config_key(config).encode('utf-8')).hexdigest()
+
+
+class ScoreCache(object):
+    """Append-only JSON-lines store of candidate scores."""
+
+    def __init__(self, path=SCORE_CACHE):
+        self.path = path
+        self.scores = {}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # torn write from an interrupted run
+                    self.scores[entry.pop('key')] = entry
+        self.hits = 0
+
+    def get(self, key):
+        scores = self.scores.get(key)
+        if scores is not None:
+            self.hits += 1
+        return scores
+
+    def put(self, key, scores):
+        self.scores[key] = scores
+        if self.path:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(dict(scores, key=key)) + '\n')
+
+
+# ------------ Data ------------
+def load_data(data_file=DATA_FILE):
+    """Inputs and target of every complete row, as float64 arrays."""
+    from columnar import load_columns
+    columns = load_columns(data_file, list(INPUT_LABELS) + [TARGET_COLUMN])
+    values = np.column_stack([columns[name].astype(np.float64) for name in columns])
+    complete = ~np.isnan(values).any(axis=1)
+    inputs = {label: values[complete, i] for i, label in enumerate(INPUT_LABELS)}
+    return inputs, values[complete, -1]
+
+
+def split_rows(n, val_fraction=0.2, seed=0):
+    """Shuffled train/validation row indices."""
+    order = np.random.default_rng(seed).permutation(n)
+    n_val = int(round(n * val_fraction))
+    return np.sort(order[n_val:]), np.sort(order[:n_val])
+
+
+def _data_key(data_file, val_fraction, seed):
+    from columnar import manifest
+    # The column cache already holds the file's content hash
+    digest = hashlib.sha256(manifest(data_file)['hash'].encode('utf-8'))
+    digest.update(repr((val_fraction, seed)).encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+# ------------ Worker side ------------
+_state = {}
+
+
+def _init_worker(inputs, actual, train, val):
+    _state.update(base=load_engine(DEFAULT_CONFIG), inputs=inputs, actual=actual,
+                  train=train, val=val)
+
+
+def _score(config):
+    engine = tuned_engine(_state['base'], config)
+    predicted = engine.compute(_state['inputs'])[OUTPUT_LABEL]
+    no_fire = np.isnan(predicted)
+    # A row where no rule fires counts as a 0% prediction rather than being
+    # dropped, so the search cannot win by switching rules off
+    error = np.abs(np.where(no_fire, 0., predicted) - _state['actual'])
+    return {'train_mae': float(error[_state['train']].mean()),
+            'val_mae': float(error[_state['val']].mean()),
+            'no_fire': float(no_fire.mean())}
+
+
+# ------------ Candidate moves ------------
+def mutate(config, rng, scale=0.05, term_rate=0.3, rule_rate=0.03):
+    """
+    Jitter some breakpoints and shift some rule consequents by one term.
+
+    Breakpoints move by a normal step of ``scale`` times the universe width,
+    stay integers, stay sorted and inside the universe; points sitting on a
+    universe bound (the open shoulders) stay there.
+    """
+    new = copy.deepcopy(config)
+    for spec in new['variables'].values():
+        low, high = spec['universe']
+        for term, points in spec['terms'].items():
+            if rng.random() >= term_rate:
+                continue
+            points = np.array(points, dtype=np.float64)
+            pinned = (points == low) | (points == high)
+            moved = points + rng.normal(0., scale * (high - low), len(points))
+            moved = np.clip(np.round(moved), low, high)
+            spec['terms'][term] = sorted(int(p) for p in np.where(pinned, points, moved))
+    outputs = list(new['variables'][OUTPUT_LABEL]['terms'])
+    rules = []
+    for rule in new['rules']:
+        rule = list(rule)
+        if rng.random() < rule_rate:
+            i = outputs.index(rule[3]) + rng.choice((-1, 1))
+            rule[3] = outputs[min(max(i, 0), len(outputs) - 1)]
+        rules.append(rule)
+    new['rules'] = rules
+    return new
+
+
+def crossover(a, b, rng):
+    """Each term shape and each rule consequent from one parent or the other."""
+    child = copy.deepcopy(a)
+    for label, spec in child['variables'].items():
+        for term in spec['terms']:
+            if rng.random() < 0.5:
+                spec['terms'][term] = list(b['variables'][label]['terms'][term])
+    child['rules'] = [list(ra if rng.random() < 0.5 else rb)
+                      for ra, rb in zip(a['rules'], b['rules'])]
+    return child
+
+
+# ------------ Search ------------
+class Evaluator(object):
+    """Scores candidates through the cache and a pool of worker processes."""
+
+    def __init__(self, data_file, val_fraction=0.2, seed=0, workers=None, cache=None):
+        inputs, actual = load_data(data_file)
+        train, val = split_rows(len(actual), val_fraction, seed)
+        self.prefix = _data_key(data_file, val_fraction, seed)
+        self.cache = cache if cache is not None else ScoreCache()
+        self.evaluated = {}
+        self.workers = workers or os.cpu_count() or 1
+        args = (inputs, actual, train, val)
+        # Compile the built-in engine once before forking
+        load_engine(DEFAULT_CONFIG)
+        if self.workers == 1:
+            _init_worker(*args)
+            self.pool = None
+        else:
+            self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                            initargs=args)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+
+    def __call__(self, configs):
+        """Scores for ``configs``, in order."""
+        keys = ['{}-{}'.format(self.prefix, candidate_key(c)) for c in configs]
+        todo = {}
+        for key, config in zip(keys, configs):
+            if self.cache.get(key) is None and key not in todo:
+                todo[key] = config
+        if todo:
+            run = self.pool.map if self.pool is not None else map
+            for key, scores in zip(todo, run(_score, todo.values())):
+                self.cache.put(key, scores)
+        for key, config in zip(keys, configs):
+            self.evaluated[key] = (config, self.cache.scores[key])
+        return [self.cache.scores[key] for key in keys]
+
+
+def optimize(evaluate, start=DEFAULT_CONFIG, method='genetic', generations=20, population=24,
+             seed=0, finalists=5, log=print):
+    """
+    Search from ``start`` and return ``(winner, winner scores, start scores)``.
+
+    ``random`` samples mutations of the best candidate so far; ``genetic``
+    keeps a population with two elites, tournament selection, uniform
+    crossover and mutation.  Either way every candidate is ranked by train
+    MAE and the winner is the finalist with the lowest validation MAE.
+    """
+    if method not in METHODS:
+        raise ValueError("method must be one of {}".format(METHODS))
+    rng = np.random.default_rng(seed)
+    baseline = evaluate([start])[0]
+    log(f"start: train MAE {baseline['train_mae']:.3f}, val MAE {baseline['val_mae']:.3f}")
+
+    pool = [start] + [mutate(start, rng) for _ in range(population - 1)]
+    ranked = []
+    for generation in range(generations):
+        begin = time.perf_counter()
+        scores = evaluate(pool)
+        ranked = sorted(zip(pool, scores), key=lambda pair: pair[1]['train_mae'])
+        best = ranked[0][1]
+        log(f"generation {generation + 1}/{generations}: best train MAE {best['train_mae']:.3f} "
+            f"(val {best['val_mae']:.3f}) in {time.perf_counter() - begin:.1f}s")
+        if method == 'random':
+            pool = [ranked[0][0]] + [mutate(ranked[0][0], rng) for _ in range(population - 1)]
+            continue
+        parents = [config for config, _ in ranked]
+
+        def pick():
+            contenders = rng.choice(len(parents), size=min(3, len(parents)), replace=False)
+            return parents[min(contenders)]  # ranked, so the lowest index wins
+        pool = parents[:2] + [mutate(crossover(pick(), pick(), rng), rng)
+                              for _ in range(population - 2)]
+
+    everything = sorted(evaluate.evaluated.values(), key=lambda pair: pair[1]['train_mae'])
+    winner, scores = min(everything[:finalists], key=lambda pair: pair[1]['val_mae'])
+    return winner, scores, baseline
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tune the stock model against historical price variation")
+    parser.add_argument('--data', default=DATA_FILE)
+    parser.add_argument('--method', choices=METHODS, default='genetic')
+    parser.add_argument('--generations', type=int, default=20)
+    parser.add_argument('--population', type=int, default=24)
+    parser.add_argument('--workers', type=int, default=None, help="processes (default: all cores)")
+    parser.add_argument('--val-fraction', type=float, default=0.2)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--start', metavar='FILE', help="model file to start from (default: built-in)")
+    parser.add_argument('--output', default='tuned_model.json', help="where to write the winning model")
+    args = parser.parse_args(argv)
+
+    start = load_config(args.start) if args.start else DEFAULT_CONFIG
+    evaluate = Evaluator(args.data, val_fraction=args.val_fraction, seed=args.seed,
+                         workers=args.workers)
+    try:
+        winner, scores, baseline = optimize(evaluate, start, method=args.method,
+                                            generations=args.generations,
+                                            population=args.population, seed=args.seed)
+    finally:
+        evaluate.close()
+    print(f"Scored {len(evaluate.evaluated)} candidates ({evaluate.cache.hits} from cache)")
+    print(f"Winner: train MAE {scores['train_mae']:.3f}, val MAE {scores['val_mae']:.3f} "
+          f"(start: {baseline['train_mae']:.3f} / {baseline['val_mae']:.3f})")
+    save_config(winner, args.output, scores=scores, baseline=baseline,
+                search={'method': args.method, 'generations': args.generations,
+                        'population': args.population, 'seed': args.seed,
+                        'val_fraction': args.val_fraction, 'data': os.path.basename(args.data)})
+    print(f"Saved model to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
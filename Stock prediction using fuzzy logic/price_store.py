@@ -0,0 +1,384 @@
+"""
+Local store of daily OHLCV bars, one SQLite file per ticker.
+
+``PriceStore.history(ticker, period)`` answers from disk and only goes to the
+fetcher for what is missing: bars after the last stored date, or older bars
+when a longer period is asked for than was ever fetched.  The newest bar of
+the day keeps changing while the market is open, so stored data is treated
+as current for ``ttl`` seconds after a fetch and then topped up.  If a fetch
+fails, whatever is on disk is served.
+
+Prices come back auto-adjusted, so a dividend or split rewrites history.
+Every top-up re-fetches the last complete stored bar as well; if its close
+no longer matches, the ticker's history is dropped and fetched again.
+
+The fetcher is any callable ``fetch(ticker, start, end)`` returning a
+DataFrame of ``Open/High/Low/Close/Volume`` indexed by date, for dates
+``start <= date < end`` (``None`` means unbounded).  ``YFinanceFetcher`` is
+the default; ``FixtureFetcher`` serves CSV files or a generator with no
+network, and is picked up from ``STOCK_PRICE_FIXTURES``::
+
+    store = PriceStore()
+    closes = store.history('AAPL', period='2y')['Close']
+
+Top-ups run on a small ``SingleFlight`` thread pool: concurrent requests
+for the same ticker and period share one in-flight fetch, and with
+``wait`` set a caller gives up after that many seconds and gets the stored
+bars while the fetch finishes in the background.  That keeps a slow
+upstream from tying up every web worker.
+"""
+import datetime
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+import numpy as np
+
+COLUMNS = ('Open', 'High', 'Low', 'Close', 'Volume')
+DEFAULT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'prices')
+DEFAULT_TTL = 15 * 60
+DEFAULT_FETCH_WORKERS = 4
+STORE_VERSION = 1
+
+log = logging.getLogger(__name__)
+
+
+def period_start(period, today=None):
+    """
+    First date covered by a yfinance-style period (``5d``, ``6mo``, ``2y``,
+    ``ytd``, ``max``); ``None`` for ``max``.
+    """
+    import pandas as pd
+    today = pd.Timestamp(today or datetime.date.today()).normalize()
+    period = period.strip().lower()
+    if period == 'max':
+        return None
+    if period == 'ytd':
+        return today.replace(month=1, day=1).date()
+    match = re.fullmatch(r'(\d+)\s*(d|wk|mo|y)', period)
+    if not match:
+        raise ValueError("unrecognised period {!r}".format(period))
+    n, unit = int(match.group(1)), match.group(2)
+    offset = {'d': pd.DateOffset(days=n), 'wk': pd.DateOffset(weeks=n),
+              'mo': pd.DateOffset(months=n), 'y': pd.DateOffset(years=n)}[unit]
+    return (today - offset).date()
+
+
+def _clean(frame):
+    """Daily OHLCV frame with a naive, normalised DatetimeIndex and float columns."""
+    import pandas as pd
+    if frame is None or len(frame) == 0:
+        return pd.DataFrame(columns=list(COLUMNS), index=pd.DatetimeIndex([], name='Date'),
+                            dtype=np.float64)
+    frame = frame.copy()
+    if isinstance(frame.columns, pd.MultiIndex):
+        # yfinance >= 0.2 returns (field, ticker) columns even for one ticker
+        frame.columns = frame.columns.get_level_values(0)
+    index = pd.DatetimeIndex(frame.index)
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    frame.index = index.normalize().rename('Date')
+    frame = frame[[c for c in COLUMNS if c in frame.columns]].astype(np.float64)
+    frame = frame.reindex(columns=list(COLUMNS))
+    frame = frame[~frame.index.duplicated(keep='last')].sort_index()
+    return frame.dropna(subset=['Close'])
+
+
+# ------------ Fetchers ------------
+class YFinanceFetcher(object):
+    """Daily auto-adjusted bars from Yahoo Finance."""
+
+    def __call__(self, ticker, start, end):
+        import yfinance as yf
+        if start is None:
+            frame = yf.download(ticker, period='max', interval='1d', auto_adjust=True,
+                                progress=False)
+        else:
+            frame = yf.download(ticker, start=start, end=end, interval='1d', auto_adjust=True,
+                                progress=False)
+        return _clean(frame)
+
+
+class FixtureFetcher(object):
+    """
+    Bars from local data, for tests and offline use.
+
+    Parameters
+    ----------
+    source : str or callable
+        A directory of ``<TICKER>.csv`` files (a date column first, then
+        OHLCV), or a callable ``ticker -> DataFrame`` with the full history.
+    latency : float, optional
+        Seconds to sleep per call, to stand in for a slow upstream.
+    """
+
+    def __init__(self, source, latency=0.):
+        self.source = source
+        self.latency = latency
+        self.calls = []
+
+    def _frame(self, ticker):
+        import pandas as pd
+        if callable(self.source):
+            return self.source(ticker)
+        path = os.path.join(self.source, '{}.csv'.format(ticker))
+        if not os.path.exists(path):
+            return None
+        return pd.read_csv(path, index_col=0, parse_dates=True)
+
+    def __call__(self, ticker, start, end):
+        import pandas as pd
+        self.calls.append((ticker, start, end))
+        if self.latency:
+            time.sleep(self.latency)
+        frame = _clean(self._frame(ticker))
+        if start is not None:
+            frame = frame[frame.index >= pd.Timestamp(start)]
+        if end is not None:
+            frame = frame[frame.index < pd.Timestamp(end)]
+        return frame
+
+
+def default_fetcher():
+    fixtures = os.environ.get('STOCK_PRICE_FIXTURES')
+    if fixtures:
+        return FixtureFetcher(fixtures, latency=float(os.environ.get('STOCK_PRICE_LATENCY', 0)))
+    return YFinanceFetcher()
+
+
+class SingleFlight(object):
+    """
+    Runs calls on a bounded thread pool, at most one per key at a time.
+
+    ``submit(key, fn, *args)`` while a call for ``key`` is still running
+    returns that call's future instead of starting another one.
+    """
+
+    def __init__(self, workers=DEFAULT_FETCH_WORKERS):
+        self.workers = workers
+        self.started = 0
+        self.joined = 0
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='price-fetch')
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def submit(self, key, fn, *args):
+        with self._lock:
+            future = self._flights.get(key)
+            if future is not None:
+                self.joined += 1
+                return future
+            future = self._flights[key] = self._executor.submit(fn, *args)
+            self.started += 1
+        future.add_done_callback(lambda done: self._land(key, done))
+        return future
+
+    def _land(self, key, future):
+        with self._lock:
+            if self._flights.get(key) is future:
+                del self._flights[key]
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._flights)
+
+
+# ------------ Store ------------
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS bars (
+    date TEXT PRIMARY KEY, open REAL, high REAL, low REAL, close REAL, volume REAL
+);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+
+class PriceStore(object):
+    """
+    Per-ticker SQLite files of daily bars, topped up incrementally.
+
+    Parameters
+    ----------
+    root : str, optional
+        Directory holding ``<TICKER>.sqlite`` files.
+    fetcher : callable, optional
+        ``fetch(ticker, start, end) -> DataFrame``; see the module docstring.
+        Defaults to ``default_fetcher()``.
+    ttl : float, optional
+        Seconds after a fetch during which stored bars are served as they are.
+    flights : SingleFlight, optional
+        Pool the top-ups run on.  ``None`` fetches on the calling thread,
+        without coalescing.
+    wait : float, optional
+        With ``flights``, seconds to wait for a top-up before serving the
+        stored bars anyway; ``None`` waits for it to finish.
+    """
+
+    def __init__(self, root=DEFAULT_DIR, fetcher=None, ttl=DEFAULT_TTL, clock=time.time,
+                 flights=None, wait=None):
+        self.root = root
+        self.fetcher = fetcher if fetcher is not None else default_fetcher()
+        self.ttl = ttl
+        self.clock = clock
+        self.flights = flights
+        self.wait = wait
+        self.fetches = 0
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+    def path(self, ticker):
+        safe = re.sub(r'[^A-Za-z0-9._^=-]', '_', ticker.upper())
+        return os.path.join(self.root, '{}.sqlite'.format(safe))
+
+    def _lock(self, ticker):
+        with self._locks_guard:
+            return self._locks.setdefault(ticker.upper(), threading.Lock())
+
+    def _connect(self, ticker):
+        os.makedirs(self.root, exist_ok=True)
+        db = sqlite3.connect(self.path(ticker), timeout=30)
+        db.executescript(_SCHEMA)
+        version = db.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        if version is None or int(version[0]) != STORE_VERSION:
+            db.execute("DELETE FROM bars")
+            db.execute("DELETE FROM meta")
+            db.execute("INSERT INTO meta VALUES ('version', ?)", (str(STORE_VERSION),))
+            db.commit()
+        return db
+
+    @staticmethod
+    def _meta(db):
+        return dict(db.execute("SELECT key, value FROM meta"))
+
+    @staticmethod
+    def _write(db, frame, **meta):
+        rows = [(d.strftime('%Y-%m-%d'),) + tuple(None if np.isnan(v) else float(v) for v in values)
+                for d, values in zip(frame.index, frame[list(COLUMNS)].to_numpy())]
+        with db:
+            db.executemany("INSERT OR REPLACE INTO bars VALUES (?, ?, ?, ?, ?, ?)", rows)
+            db.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)",
+                           [(k, str(v)) for k, v in meta.items()])
+
+    @staticmethod
+    def _read(db, start):
+        import pandas as pd
+        if start is None:
+            rows = db.execute("SELECT * FROM bars ORDER BY date").fetchall()
+        else:
+            rows = db.execute("SELECT * FROM bars WHERE date >= ? ORDER BY date",
+                              (start.isoformat(),)).fetchall()
+        index = pd.DatetimeIndex([r[0] for r in rows], name='Date')
+        values = np.array([r[1:] for r in rows], dtype=np.float64).reshape(len(rows), len(COLUMNS))
+        return pd.DataFrame(values, index=index, columns=list(COLUMNS))
+
+    def _fetch(self, ticker, start, end=None):
+        self.fetches += 1
+        return _clean(self.fetcher(ticker, start, end))
+
+    @staticmethod
+    def _uncovered(meta, start):
+        covered = meta.get('covered_from')  # '' = full history
+        return covered is None or bool(covered and (start is None or start.isoformat() < covered))
+
+    def _stale(self, db, start):
+        meta = self._meta(db)
+        return (self._uncovered(meta, start)
+                or self.clock() - float(meta.get('fetched_at', 0)) >= self.ttl)
+
+    def _update(self, db, ticker, start):
+        """Fetch whatever ``start`` onwards is missing or stale."""
+        meta = self._meta(db)
+        now = self.clock()
+        covered = meta.get('covered_from')
+        if self._uncovered(meta, start):
+            # Never fetched, or a longer period than ever before: fetch it all
+            self._write(db, self._fetch(ticker, start), fetched_at=now,
+                        covered_from='' if start is None else start.isoformat())
+            return
+        if now - float(meta.get('fetched_at', 0)) < self.ttl:
+            return
+        last = db.execute("SELECT date, close FROM bars ORDER BY date DESC LIMIT 2").fetchall()
+        if len(last) < 2:
+            self._write(db, self._fetch(ticker, start), fetched_at=now)
+            return
+        # Re-fetch the last complete bar to notice adjustments, then everything newer
+        check_date, check_close = last[1]
+        check_date = datetime.date.fromisoformat(check_date)
+        fresh = self._fetch(ticker, check_date)
+        if (len(fresh) and fresh.index[0].date() == check_date
+                and not np.isclose(fresh['Close'].iloc[0], check_close, rtol=1e-6, atol=0)):
+            log.info("%s: prices were re-adjusted, refetching history", ticker)
+            with db:
+                db.execute("DELETE FROM bars")
+            fresh = self._fetch(ticker, None if not covered else datetime.date.fromisoformat(covered))
+        self._write(db, fresh, fetched_at=now)
+
+    def history(self, ticker, period='2y', start=None):
+        """
+        Daily bars of ``ticker`` for ``period`` (or from ``start``), oldest first.
+
+        Columns are ``Open/High/Low/Close/Volume`` on a ``Date`` index.
+        """
+        ticker = ticker.upper()
+        if start is None:
+            start = period_start(period)
+        if self.flights is None:
+            with self._lock(ticker):
+                db = self._connect(ticker)
+                try:
+                    self._top_up(db, ticker, start, lambda: self._update(db, ticker, start))
+                    return self._read(db, start)
+                finally:
+                    db.close()
+
+        db = self._connect(ticker)
+        try:
+            if self._stale(db, start):
+                future = self.flights.submit((ticker, start), self._refresh, ticker, start)
+                self._top_up(db, ticker, start, lambda: future.result(timeout=self.wait))
+            return self._read(db, start)
+        finally:
+            db.close()
+
+    def _top_up(self, db, ticker, start, update):
+        try:
+            update()
+        except FutureTimeout:
+            log.info("%s: fetch still running after %.1fs, serving stored bars", ticker, self.wait)
+        except Exception:
+            if not db.execute("SELECT 1 FROM bars LIMIT 1").fetchone():
+                raise
+            log.warning("%s: fetch failed, serving stored bars", ticker, exc_info=True)
+
+    def _refresh(self, ticker, start):
+        """``_update`` on a connection of its own, for the fetch pool."""
+        with self._lock(ticker):
+            db = self._connect(ticker)
+            try:
+                self._update(db, ticker, start)
+            finally:
+                db.close()
+
+    def clear(self, ticker):
+        """Forget everything stored for ``ticker``."""
+        with self._lock(ticker):
+            try:
+                os.remove(self.path(ticker))
+            except FileNotFoundError:
+                pass
+
+
+def default_store(wait=None):
+    """
+    Store configured from ``STOCK_PRICE_DIR``, ``STOCK_PRICE_TTL``,
+    ``STOCK_FETCH_WORKERS`` and ``STOCK_FETCH_WAIT`` (which overrides ``wait``).
+    """
+    if os.environ.get('STOCK_FETCH_WAIT'):
+        wait = float(os.environ['STOCK_FETCH_WAIT'])
+    flights = SingleFlight(int(os.environ.get('STOCK_FETCH_WORKERS', DEFAULT_FETCH_WORKERS)))
+    return PriceStore(os.environ.get('STOCK_PRICE_DIR', DEFAULT_DIR),
+                      ttl=float(os.environ.get('STOCK_PRICE_TTL', DEFAULT_TTL)),
+                      flights=flights, wait=wait)
@@ -0,0 +1,213 @@
+"""
+Market-wide screener: every company in ``sorted_final.csv`` ranked by the model.
+
+``load_screener`` scores the whole dataset with the stock model in one
+batched call and stores the result sorted by predicted price variation, as
+memory-mapped ``.npy`` files under ``.cache/screener-<key>/``.  The key
+covers the dataset content (through the column cache) and the model
+fingerprint, so editing either produces a new index on the next query and
+nothing else does.  Queries are slices and binary searches over the sorted
+predictions, so they cost the same for 5k or 5M companies::
+
+    screener = load_screener('sorted_final.csv')
+    screener.top(10)                  # highest predicted PRICE VAR [%] first
+    screener.bottom(10)
+    screener.between(5, 20, limit=50) # 5 <= predicted <= 20, highest first
+
+Companies for which no rule fires have no prediction and are left out of
+the index; ``skipped`` counts them.
+"""
+import argparse
+import json
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+
+from columnar import load_columns, manifest
+from StockPrediction import CACHE_DIR, DATA_FILE, INPUT_LABELS, OUTPUT_LABEL
+
+SCREENER_VERSION = 1
+FIELDS = ('company', 'ticker', 'predicted', 'profit_margin', 'debt_ratio', 'roa')
+
+
+class Screener(object):
+    """
+    Companies sorted by predicted price variation.
+
+    Parameters
+    ----------
+    predicted : ndarray
+        Predictions in ascending order.
+    companies, tickers : ndarray
+        Aligned with ``predicted``.
+    inputs : ndarray
+        Profit margin, debt ratio and ROA per company, shape (n, 3).
+    skipped : int
+        Companies left out because no rule fired.
+    """
+
+    def __init__(self, predicted, companies, tickers, inputs, skipped=0):
+        self.predicted = predicted
+        self.companies = companies
+        self.tickers = tickers
+        self.inputs = inputs
+        self.skipped = skipped
+
+    def __len__(self):
+        return len(self.predicted)
+
+    def _rows(self, positions):
+        """Result dicts for ascending-order ``positions``, with rank 1 = highest prediction."""
+        n = len(self.predicted)
+        return [{'rank': n - int(i), 'company': str(self.companies[i]), 'ticker': str(self.tickers[i]),
+                 'predicted': float(self.predicted[i]), 'profit_margin': float(self.inputs[i, 0]),
+                 'debt_ratio': float(self.inputs[i, 1]), 'roa': float(self.inputs[i, 2])}
+                for i in positions]
+
+    def top(self, k=10):
+        """The ``k`` highest predictions, highest first."""
+        n = len(self.predicted)
+        return self._rows(range(n - 1, max(n - k, 0) - 1, -1))
+
+    def bottom(self, k=10):
+        """The ``k`` lowest predictions, lowest first."""
+        return self._rows(range(min(k, len(self.predicted))))
+
+    def span(self, low=None, high=None):
+        """Ascending-order slice of the predictions in ``[low, high]`` (``None`` = unbounded)."""
+        start = 0 if low is None else int(np.searchsorted(self.predicted, low, side='left'))
+        stop = len(self.predicted) if high is None else int(np.searchsorted(self.predicted, high,
+                                                                           side='right'))
+        return slice(start, max(start, stop))
+
+    def count(self, low=None, high=None):
+        rows = self.span(low, high)
+        return rows.stop - rows.start
+
+    def between(self, low=None, high=None, limit=None, ascending=False):
+        """Companies predicted in ``[low, high]``, highest first unless ``ascending``."""
+        rows = self.span(low, high)
+        positions = range(rows.start, rows.stop) if ascending else range(rows.stop - 1, rows.start - 1, -1)
+        if limit is not None:
+            positions = positions[:limit]
+        return self._rows(positions)
+
+
+# ------------ Building & caching ------------
+def build_screener(csv_path, path, engine):
+    """Score every row of ``csv_path`` with ``engine`` and write the sorted index to ``path``."""
+    columns = load_columns(csv_path, ['Company', 'Ticker'] + list(INPUT_LABELS))
+    inputs = np.column_stack([np.asarray(columns[label], dtype=np.float64) for label in INPUT_LABELS])
+    predicted = engine.compute({label: inputs[:, i] for i, label in enumerate(INPUT_LABELS)})[OUTPUT_LABEL]
+    scored = np.flatnonzero(np.isfinite(predicted))
+    order = scored[np.argsort(predicted[scored], kind='stable')]
+
+    tmp = '{}.tmp-{}-{}'.format(path, os.getpid(), threading.get_ident())
+    os.makedirs(tmp)
+    np.save(os.path.join(tmp, 'predicted.npy'), predicted[order])
+    np.save(os.path.join(tmp, 'companies.npy'), np.asarray(columns['Company'])[order])
+    np.save(os.path.join(tmp, 'tickers.npy'), np.asarray(columns['Ticker'])[order])
+    np.save(os.path.join(tmp, 'inputs.npy'), inputs[order])
+    with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+        json.dump({'version': SCREENER_VERSION, 'rows': len(predicted), 'skipped': len(predicted) - len(order),
+                   'fingerprint': engine.fingerprint()}, f)
+    old = '{}.old-{}-{}'.format(path, os.getpid(), threading.get_ident())
+    if os.path.exists(path):
+        os.replace(path, old)
+    os.replace(tmp, path)
+    shutil.rmtree(old, ignore_errors=True)
+
+
+def _open(path):
+    with open(os.path.join(path, 'meta.json')) as f:
+        meta = json.load(f)
+    if meta.get('version') != SCREENER_VERSION:
+        raise ValueError("screener index {} is version {}".format(path, meta.get('version')))
+    arrays = [np.load(os.path.join(path, name + '.npy'), mmap_mode='r')
+              for name in ('predicted', 'companies', 'tickers', 'inputs')]
+    return Screener(*arrays, skipped=meta['skipped'])
+
+
+_loaded = {}
+_lock = threading.Lock()
+
+
+def load_screener(csv_path=DATA_FILE, engine=None, cache_dir=CACHE_DIR):
+    """
+    Screener for ``csv_path`` scored by ``engine`` (default: the stock model).
+
+    Served from memory while neither the CSV nor the model changed, else
+    memory-mapped from ``cache_dir``, else built there first.
+    """
+    if engine is None:
+        from StockPrediction import get_engine
+        engine = get_engine()
+    csv_path = os.path.abspath(csv_path)
+    data = manifest(csv_path)
+    with _lock:
+        cached = _loaded.get(csv_path)
+        if cached is not None and cached[0] is data and cached[1] is engine:
+            return cached[2]
+        key = '{}-{}'.format(data['hash'][:16], engine.fingerprint()[:16])
+        path = os.path.join(cache_dir, 'screener-{}'.format(key))
+        try:
+            screener = _open(path)
+        except (OSError, ValueError):
+            build_screener(csv_path, path, engine)
+            screener = _open(path)
+        _loaded[csv_path] = (data, engine, screener)
+        return screener
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rank every company in the dataset by predicted price variation")
+    parser.add_argument('--data', default=DATA_FILE)
+    parser.add_argument('--model', metavar='FILE',
+                        help="model file from optimizer.py instead of the built-in rule base")
+    parser.add_argument('--json', action='store_true', help="print results as JSON lines")
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('build', help="(re)build the index if the data or model changed")
+    for name in ('top', 'bottom'):
+        command = commands.add_parser(name, help="the {} k companies".format('highest' if name == 'top' else 'lowest'))
+        command.add_argument('k', type=int, nargs='?', default=10)
+    between = commands.add_parser('between', help="companies with a prediction in [--min, --max]")
+    between.add_argument('--min', type=float, default=None)
+    between.add_argument('--max', type=float, default=None)
+    between.add_argument('--limit', type=int, default=None)
+    between.add_argument('--ascending', action='store_true', help="lowest first")
+    args = parser.parse_args(argv)
+    if args.model:
+        os.environ['STOCK_MODEL_FILE'] = args.model
+
+    start = time.perf_counter()
+    screener = load_screener(args.data)
+    loaded = time.perf_counter() - start
+    if args.command == 'build':
+        print(f"{len(screener)} companies ranked ({screener.skipped} without a prediction) "
+              f"in {loaded:.2f}s")
+        return
+    start = time.perf_counter()
+    if args.command == 'top':
+        rows = screener.top(args.k)
+    elif args.command == 'bottom':
+        rows = screener.bottom(args.k)
+    else:
+        rows = screener.between(args.min, args.max, limit=args.limit, ascending=args.ascending)
+    queried = time.perf_counter() - start
+    if args.json:
+        for row in rows:
+            print(json.dumps(row))
+        return
+    print(f"{'rank':>6} {'ticker':<8} {'company':<32} {'predicted':>9} {'PM':>8} {'DR':>8} {'ROA':>8}")
+    for row in rows:
+        print(f"{row['rank']:>6} {row['ticker']:<8} {row['company'][:32]:<32} {row['predicted']:>9.2f} "
+              f"{row['profit_margin']:>8.2f} {row['debt_ratio']:>8.2f} {row['roa']:>8.2f}")
+    print(f"{len(rows)} of {len(screener)} companies; index {loaded * 1000:.1f}ms, "
+          f"query {queried * 1000:.2f}ms")
+
+
+if __name__ == '__main__':
+    main()
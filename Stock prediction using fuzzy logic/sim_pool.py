@@ -0,0 +1,118 @@
+"""
+Pool of ``ControlSystemSimulation`` objects for concurrent requests.
+
+scikit-fuzzy keeps simulation state on the rule base itself: term
+memberships, cuts and rule firing strengths are stored on the shared
+``Term``/``Rule`` objects, keyed by the control system's id and the inputs,
+and ``Term._cut`` is a plain attribute written during defuzzification.  Two
+simulations of the same ``ControlSystem`` running in different threads can
+therefore read each other's intermediate values, and a periodic flush in
+one clears the other's.
+
+The pool compiles the control system once and gives every slot its own deep
+copy, so no term or rule object is ever shared between threads.  A request
+checks a slot out, uses it exclusively and returns it; at most ``size``
+copies exist, however many requests come in.
+"""
+import contextlib
+import copy
+import queue
+import threading
+
+
+class SimulationPool(object):
+    """
+    Checked-out simulations over private copies of one control system.
+
+    Parameters
+    ----------
+    control_system : skfuzzy.control.ControlSystem
+        The compiled system.  It is only used as a template and is never
+        simulated directly.
+    size : int, optional
+        Most simulations alive at once; callers beyond that wait.
+    **simulation_kwargs
+        Passed to every ``ControlSystemSimulation`` (``cache``,
+        ``flush_after_run``, ...).
+    """
+
+    def __init__(self, control_system, size=8, **simulation_kwargs):
+        if size < 1:
+            raise ValueError("size must be at least 1")
+        self.control_system = control_system
+        self.size = size
+        self.simulation_kwargs = simulation_kwargs
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    @property
+    def created(self):
+        return self._created
+
+    def _new_simulation(self):
+        from skfuzzy import control as ctrl
+        return ctrl.ControlSystemSimulation(copy.deepcopy(self.control_system),
+                                            **self.simulation_kwargs)
+
+    def acquire(self, timeout=None):
+        """Take an idle simulation, creating one if the pool is not full yet."""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            grow = self._created < self.size
+            if grow:
+                self._created += 1
+        if grow:
+            try:
+                return self._new_simulation()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        try:
+            return self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError("no simulation free after {}s".format(timeout))
+
+    def release(self, simulation):
+        self._idle.put(simulation)
+
+    def fill(self):
+        """Create every simulation the pool may hold now rather than on first use."""
+        with self._lock:
+            missing = self.size - self._created
+            self._created = self.size
+        for built in range(missing):
+            try:
+                simulation = self._new_simulation()
+            except Exception:
+                # Give back the slots that were never filled, as acquire() does
+                with self._lock:
+                    self._created -= missing - built
+                raise
+            self._idle.put(simulation)
+
+    @contextlib.contextmanager
+    def simulation(self, timeout=None):
+        """``with pool.simulation() as sim:`` -- exclusive use of one simulation."""
+        simulation = self.acquire(timeout)
+        try:
+            yield simulation
+        finally:
+            self.release(simulation)
+
+    def compute(self, inputs, output_label, timeout=None):
+        """
+        Crisp ``output_label`` for ``inputs`` (label -> crisp value).
+
+        Returns NaN when no rule fires, where a bare simulation would leave
+        the output unset.
+        """
+        with self.simulation(timeout) as simulation:
+            for label, value in inputs.items():
+                simulation.input[label] = value
+            simulation.compute()
+            return simulation.output.get(output_label, float('nan'))
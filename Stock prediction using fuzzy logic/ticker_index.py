@@ -0,0 +1,160 @@
+"""
+Persistent company-name -> ticker index for ``sorted_final.csv``.
+
+The index is built once and pickled next to the CSV
+(``sorted_final.csv.index.pkl``).  It is rebuilt only when the CSV changes:
+the size and mtime are checked first, and if those moved the content hash
+decides, so touching the file does not force a rebuild.
+
+Lookups are case-folded dictionary hits.  ``suggest`` returns name-prefix
+matches, then word-prefix matches ("micro" -> "Advanced Micro Devices"),
+then typo-tolerant matches found through a trigram index.
+"""
+import bisect
+import difflib
+import os
+import pickle
+import threading
+
+from filestamp import file_hash, signature
+
+INDEX_SUFFIX = '.index.pkl'
+INDEX_VERSION = 1
+
+
+def _key(name):
+    return ' '.join(str(name).casefold().split())
+
+
+def _trigrams(key):
+    padded = '  {} '.format(key)
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class CompanyIndex(object):
+    """Company names and tickers with exact, prefix and fuzzy lookups."""
+
+    def __init__(self, companies, tickers):
+        self.companies = []
+        self.tickers = []
+        self.folded = []
+        self.exact = {}
+        for company, ticker in zip(companies, tickers):
+            key = _key(company)
+            if not key or key in self.exact:
+                continue  # first occurrence wins, like the old DataFrame lookup
+            self.exact[key] = len(self.companies)
+            self.folded.append(key)
+            self.companies.append(str(company))
+            self.tickers.append(str(ticker))
+        self.keys = sorted(self.exact)
+        self.words = sorted((word, self.exact[key])
+                            for key in self.keys for word in key.split()[1:])
+        self.grams = {}
+        for key, i in self.exact.items():
+            for gram in _trigrams(key):
+                self.grams.setdefault(gram, []).append(i)
+
+    def __len__(self):
+        return len(self.companies)
+
+    def lookup(self, company_name):
+        """Ticker for an exact (case-insensitive) company name, or None."""
+        i = self.exact.get(_key(company_name))
+        return None if i is None else self.tickers[i]
+
+    def suggest(self, query, limit=10, cutoff=0.6):
+        """Up to ``limit`` ``(company, ticker)`` pairs for a partial name."""
+        query = _key(query)
+        if not query:
+            return []
+        found = []
+
+        def take(i):
+            if i not in found:
+                found.append(i)
+            return len(found) >= limit
+
+        start = bisect.bisect_left(self.keys, query)
+        for key in self.keys[start:]:
+            if not key.startswith(query) or take(self.exact[key]):
+                break
+        if len(found) < limit:
+            start = bisect.bisect_left(self.words, (query, -1))
+            for word, i in self.words[start:]:
+                if not word.startswith(query) or take(i):
+                    break
+        if len(found) < limit:
+            # Rank names sharing the most trigrams, then confirm with difflib
+            votes = {}
+            for gram in _trigrams(query):
+                for i in self.grams.get(gram, ()):
+                    votes[i] = votes.get(i, 0) + 1
+            shortlist = sorted(votes, key=votes.get, reverse=True)[:limit * 20]
+            scored = []
+            for i in shortlist:
+                key = self.folded[i]
+                # Score against the start of the name too, so partial input still matches
+                ratio = max(difflib.SequenceMatcher(None, query, key[:len(query) + 2]).ratio(),
+                            difflib.SequenceMatcher(None, query, key).ratio())
+                if ratio >= cutoff:
+                    scored.append((ratio, i))
+            for ratio, i in sorted(scored, key=lambda pair: -pair[0]):
+                if take(i):
+                    break
+        return [(self.companies[i], self.tickers[i]) for i in found]
+
+
+# ------------ Persistence ------------
+_loaded = {}
+_lock = threading.Lock()
+
+
+def build_index(csv_path):
+    import pandas as pd
+    df = pd.read_csv(csv_path, usecols=['Company', 'Ticker'], dtype=str)
+    df = df.dropna()
+    return CompanyIndex(df['Company'].tolist(), df['Ticker'].tolist())
+
+
+def load_index(csv_path):
+    """
+    Index for ``csv_path``, from memory, from disk, or freshly built.
+
+    The pickled index stores the CSV's size, mtime and SHA-256; a stale
+    size/mtime triggers a hash check and a rebuild only if the hash differs.
+    """
+    csv_path = os.path.abspath(csv_path)
+    stamp = signature(csv_path)
+    with _lock:
+        cached = _loaded.get(csv_path)
+        if cached and cached[0] == stamp:
+            return cached[1]
+
+        index_path = csv_path + INDEX_SUFFIX
+        stored = None
+        try:
+            with open(index_path, 'rb') as f:
+                stored = pickle.load(f)
+            if stored.get('version') != INDEX_VERSION:
+                stored = None
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+            stored = None
+
+        if stored and stored['signature'] == stamp:
+            index = stored['index']
+        else:
+            content_hash = file_hash(csv_path)
+            if stored and stored['hash'] == content_hash:
+                index = stored['index']
+            else:
+                index = build_index(csv_path)
+            # The lock is per process; other workers may be writing the index too
+            tmp = '{}.{}.{}.tmp'.format(index_path, os.getpid(), threading.get_ident())
+            with open(tmp, 'wb') as f:
+                pickle.dump({'version': INDEX_VERSION, 'signature': stamp,
+                             'hash': content_hash, 'index': index},
+                            f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, index_path)
+        _loaded[csv_path] = (stamp, index)
+        return index
@@ -0,0 +1,94 @@
+"""
+Monte Carlo uncertainty bands around a crisp fuzzy prediction.
+
+Reported ratios are noisy, so a single crisp output overstates how much
+the model knows.  ``predict_bands`` perturbs each input with Gaussian noise
+(a standard deviation in the input's own units, percentage points for the
+stock ratios), scores every sample in one batched ``compute`` call and
+returns percentiles of the outputs.  With a ``lut.ResponseSurface`` 10k
+samples take about 3ms; the ``BatchEngine`` needs about 25ms for the same::
+
+    bands = predict_bands(surface.compute, {'Profit Margin': 12., 'Debt Ratio': 40., 'ROA': 6.},
+                          noise=5.)
+    bands['percentiles']   # {'p5': ..., 'p25': ..., 'p50': ..., 'p75': ..., 'p95': ...}
+
+Samples where no rule fires (NaN outputs) are left out; ``fired`` is the
+share that remained.
+"""
+import numpy as np
+
+DEFAULT_SAMPLES = 10000
+MAX_SAMPLES = 100000
+DEFAULT_NOISE = 5.0
+DEFAULT_PERCENTILES = (5, 25, 50, 75, 95)
+OUTPUT_LABEL = 'PRICE VAR [%]'
+
+
+def noise_scale(labels, noise):
+    """Standard deviation per label, from one number or a ``{label: sd}`` dict (missing = 0)."""
+    if isinstance(noise, dict):
+        scale = [float(noise.get(label, 0.)) for label in labels]
+    else:
+        scale = [float(noise)] * len(labels)
+    if any(not np.isfinite(s) or s < 0 for s in scale):
+        raise ValueError("noise must be finite and non-negative")
+    return np.array(scale)
+
+
+def perturb(values, noise=DEFAULT_NOISE, samples=DEFAULT_SAMPLES, rng=None):
+    """``{label: samples}`` drawn around ``values`` (label -> crisp value)."""
+    labels = list(values)
+    rng = rng if rng is not None else np.random.default_rng()
+    center = np.array([float(values[label]) for label in labels])
+    draws = rng.standard_normal((len(labels), samples))
+    draws *= noise_scale(labels, noise)[:, None]
+    draws += center[:, None]
+    return dict(zip(labels, draws))
+
+
+def summarize(outputs, percentiles=DEFAULT_PERCENTILES):
+    """Percentiles, mean and spread of the finite ``outputs``."""
+    outputs = np.asarray(outputs, dtype=np.float64)
+    valid = outputs[np.isfinite(outputs)]
+    summary = {'samples': len(outputs), 'fired': len(valid) / len(outputs) if len(outputs) else 0.}
+    if not len(valid):
+        summary.update(percentiles={'p{:g}'.format(q): None for q in percentiles},
+                       mean=None, std=None)
+        return summary
+    points = np.percentile(valid, percentiles)
+    summary.update(percentiles={'p{:g}'.format(q): float(v) for q, v in zip(percentiles, points)},
+                   mean=float(valid.mean()), std=float(valid.std()))
+    return summary
+
+
+def predict_bands(compute, values, noise=DEFAULT_NOISE, samples=DEFAULT_SAMPLES,
+                  percentiles=DEFAULT_PERCENTILES, seed=None, output_label=OUTPUT_LABEL):
+    """
+    Output percentiles for ``values`` under input noise.
+
+    Parameters
+    ----------
+    compute : callable
+        ``compute(inputs) -> {output_label: array}``, such as
+        ``ResponseSurface.compute`` or ``BatchEngine.compute``.
+    values : dict
+        Crisp value of every input.
+    noise : float or dict, optional
+        Standard deviation of the noise added to each input.
+    samples : int, optional
+        Between 1 and ``MAX_SAMPLES``.
+    percentiles : sequence of float, optional
+    seed : int, optional
+        Fixes the draws, so the same request always gets the same bands.
+
+    Returns
+    -------
+    dict
+        ``percentiles`` (``{'p5': value, ...}``), ``mean``, ``std``,
+        ``samples`` and ``fired``.
+    """
+    samples = int(samples)
+    if not 1 <= samples <= MAX_SAMPLES:
+        raise ValueError("samples must be between 1 and {}".format(MAX_SAMPLES))
+    inputs = perturb(values, noise, samples, np.random.default_rng(seed))
+    return summarize(compute(inputs)[output_label], percentiles)
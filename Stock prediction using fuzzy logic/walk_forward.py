@@ -0,0 +1,206 @@
+"""
+Walk-forward backtest of the stock model over several fiscal years.
+
+Each fiscal year is scored on its own: the fundamentals of year ``Y``
+against the price variation of ``Y + 1``.  Years come from one or more
+CSV files, in either layout:
+
+* one file per year, with unqualified ``Profit Margin``, ``Debt Ratio``
+  and ``ROA`` columns and a single ``<Y+1> PRICE VAR [%]`` target (the
+  shape of ``sorted_final.csv``);
+* year-partitioned columns, ``Profit Margin <Y>`` ... ``ROA <Y>`` next to
+  ``<Y+1> PRICE VAR [%]``, for any number of years in one file.
+
+Years are scored in parallel processes, and each year's error sums are
+kept in ``.cache/walk-forward.jsonl`` keyed by the model fingerprint, the
+engine and a hash of that year's columns.  After a change to the rule base
+only the model key moves, so re-running re-scores every year once; after
+a change to one year's data, only that year is re-scored::
+
+    python walk_forward.py 2014.csv 2015.csv 2016.csv 2017.csv 2018.csv
+    python walk_forward.py --model tuned_model.json decade.csv
+"""
+import argparse
+import hashlib
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from backtest import ENGINES, INPUT_LABELS, ErrorAccumulator, _make_scorer
+from columnar import load_columns, manifest
+from optimizer import ScoreCache
+from StockPrediction import CACHE_DIR
+
+RESULT_CACHE = os.path.join(CACHE_DIR, 'walk-forward.jsonl')
+TARGET_PATTERN = re.compile(r'^(\d{4}) PRICE VAR \[%\]$')
+
+
+# ------------ Years ------------
+def year_columns(path):
+    """
+    ``{fiscal_year: (input_columns, target_column)}`` found in one file.
+
+    Raises ValueError if a target has no inputs, or if unqualified inputs
+    would have to be shared by several targets.
+    """
+    names = {c['name'] for c in manifest(path)['columns']}
+    targets = sorted((int(m.group(1)), name) for name in names
+                     for m in [TARGET_PATTERN.match(name)] if m)
+    if not targets:
+        raise ValueError("{} has no '<year> PRICE VAR [%]' column".format(path))
+    years = {}
+    for target_year, target in targets:
+        year = target_year - 1
+        qualified = ['{} {}'.format(label, year) for label in INPUT_LABELS]
+        if all(name in names for name in qualified):
+            years[year] = (qualified, target)
+        elif all(label in names for label in INPUT_LABELS) and len(targets) == 1:
+            years[year] = (list(INPUT_LABELS), target)
+        else:
+            raise ValueError("{}: no inputs for {!r} (expected {})".format(
+                path, target, ', '.join(repr(name) for name in qualified)))
+    return years
+
+
+def find_years(sources):
+    """``{fiscal_year: (path, input_columns, target_column)}`` over all ``sources``."""
+    years = {}
+    for path in sources:
+        for year, (inputs, target) in year_columns(path).items():
+            if year in years:
+                raise ValueError("fiscal year {} is in both {} and {}".format(
+                    year, years[year][0], path))
+            years[year] = (path, inputs, target)
+    return dict(sorted(years.items()))
+
+
+def data_hash(path, inputs, target):
+    """Digest of one year's input and target values, independent of other columns."""
+    columns = load_columns(path, list(inputs) + [target])
+    digest = hashlib.sha256()
+    for name in list(inputs) + [target]:
+        values = np.ascontiguousarray(columns[name], dtype=np.float64)
+        digest.update(name.encode('utf-8'))
+        digest.update(values.tobytes())
+    return digest.hexdigest()
+
+
+# ------------ Worker side ------------
+_scorers = {}
+
+
+def _score_year(year, path, inputs, target, engine):
+    if engine not in _scorers:
+        _scorers[engine] = _make_scorer(engine)[0]
+    start = time.perf_counter()
+    columns = load_columns(path, list(inputs) + [target])
+    predicted = _scorers[engine]({label: np.asarray(columns[name], dtype=np.float64)
+                                  for label, name in zip(INPUT_LABELS, inputs)})
+    errors = ErrorAccumulator().add(columns[target], predicted)
+    return year, errors, time.perf_counter() - start
+
+
+# ------------ Driver ------------
+def _model_key(engine):
+    from StockPrediction import get_engine
+    return hashlib.sha256('{}:{}'.format(get_engine().fingerprint(), engine).encode('utf-8')).hexdigest()
+
+
+def walk_forward(sources, workers=None, engine='batch', cache=None):
+    """
+    Score every fiscal year in ``sources``, reusing cached years.
+
+    Parameters
+    ----------
+    sources : list of str
+        CSV files; see the module docstring for the layouts understood.
+    workers : int, optional
+        Processes for the years not in the cache; defaults to
+        ``os.cpu_count()``.  1 runs in-process.
+    engine : {'batch', 'analytic', 'simulation'}
+        As for ``backtest.run_backtest``.
+    cache : optimizer.ScoreCache, optional
+        Where per-year results are kept; defaults to ``RESULT_CACHE``.
+        Pass ``ScoreCache(None)`` to keep nothing.
+
+    Returns
+    -------
+    years : list of dict
+        One entry per fiscal year, oldest first: ``year``, ``source``,
+        ``target``, ``errors`` (an ``ErrorAccumulator``), ``seconds``
+        spent scoring it and whether it came from the cache.
+    total : ErrorAccumulator
+        All years pooled.
+    """
+    if engine not in ENGINES:
+        raise ValueError("engine must be one of {}".format(ENGINES))
+    cache = cache if cache is not None else ScoreCache(RESULT_CACHE)
+    years = find_years(sources)
+
+    # Build the model before forking so workers inherit it
+    from StockPrediction import get_model
+    model_key = _model_key(engine)
+    if engine == 'simulation':
+        get_model().control_system
+
+    results, keys, todo = {}, {}, []
+    for year, (path, inputs, target) in years.items():
+        keys[year] = '{}-{}'.format(model_key[:32], data_hash(path, inputs, target)[:32])
+        entry = cache.get(keys[year])
+        if entry is not None:
+            results[year] = (ErrorAccumulator.from_dict(entry), entry['seconds'], True)
+        else:
+            todo.append((year, path, inputs, target, engine))
+
+    workers = max(1, min(workers or os.cpu_count() or 1, len(todo) or 1))
+    if workers == 1:
+        scored = [_score_year(*task) for task in todo]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            scored = [f.result() for f in [pool.submit(_score_year, *task) for task in todo]]
+    for year, errors, seconds in scored:
+        cache.put(keys[year], dict(errors.as_dict(), year=year, seconds=seconds))
+        results[year] = (errors, seconds, False)
+
+    report, total = [], ErrorAccumulator()
+    for year, (path, inputs, target) in years.items():
+        errors, seconds, cached = results[year]
+        total.merge(errors)
+        report.append({'year': year, 'source': path, 'target': target, 'errors': errors,
+                       'seconds': seconds, 'cached': cached})
+    return report, total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backtest the stock model year by year")
+    parser.add_argument('sources', nargs='+', metavar='CSV',
+                        help="yearly files, or files with year-partitioned columns")
+    parser.add_argument('--workers', type=int, default=None, help="processes (default: all cores)")
+    parser.add_argument('--engine', choices=ENGINES, default='batch')
+    parser.add_argument('--no-cache', action='store_true', help="re-score every year")
+    parser.add_argument('--model', metavar='FILE',
+                        help="model file from optimizer.py instead of the built-in rule base")
+    args = parser.parse_args(argv)
+    if args.model:
+        os.environ['STOCK_MODEL_FILE'] = args.model
+
+    start = time.perf_counter()
+    years, total = walk_forward(args.sources, workers=args.workers, engine=args.engine,
+                                cache=ScoreCache(None) if args.no_cache else None)
+    elapsed = time.perf_counter() - start
+    print(f"{'year':<6} {'target':<20} {'rows':>7} {'skipped':>7} {'MAE':>9} {'MSE':>11}")
+    for entry in years:
+        errors = entry['errors']
+        print(f"{entry['year']:<6} {entry['target']:<20} {errors.count:>7} {errors.skipped:>7} "
+              f"{errors.mae:>9.2f} {errors.mse:>11.2f}{'  (cached)' if entry['cached'] else ''}")
+    print(f"{'all':<6} {'':<20} {total.count:>7} {total.skipped:>7} {total.mae:>9.2f} {total.mse:>11.2f}")
+    if years:
+        print(f"Mean of yearly MAE: {np.mean([e['errors'].mae for e in years]):.2f}")
+    print(f"{len(years)} years, {sum(not e['cached'] for e in years)} scored, in {elapsed:.2f}s")
+
+
+if __name__ == '__main__':
+    main()